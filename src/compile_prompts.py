@@ -0,0 +1,62 @@
+"""Gera src/core/prompts_compiled.py com os módulos de prompt já compactados
+
+Rode de novo sempre que mudar um texto em src/core/prompts/ ou as regras de
+ModularPromptSystem._compress:
+    
+    python src/compile_prompts.py
+
+Na inicialização, ModularPromptSystem usa os textos gerados se o hash dos
+originais bater; senão compacta como antes.
+"""
+import sys
+import os
+import pprint
+
+# Adiciona diretório pai ao path para permitir imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.core.modular_prompt_system import ModularPromptSystem
+
+try:
+    import tiktoken
+except ImportError:  # Sem tiktoken: relata só o tamanho em caracteres
+    tiktoken = None
+
+OUTPUT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "core", "prompts_compiled.py")
+
+# Tokenizadores dos modelos usados (relatório da economia por modelo)
+ENCODINGS = {"gpt-4.1": "o200k_base", "gpt-3.5-turbo": "cl100k_base"}
+
+def compile_prompts(path: str = OUTPUT_PATH):
+    """Compacta cada módulo e grava o resultado como módulo Python"""
+    modules = ModularPromptSystem._build_modules()
+    compiled = {key: ModularPromptSystem._compress(module.content) for key, module in modules.items()}
+    
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("# Gerado por src/compile_prompts.py - não edite à mão\n\n")
+        f.write(f"SOURCE_HASH = {ModularPromptSystem.source_hash(modules)!r}\n\n")
+        f.write(f"MODULES = {pprint.pformat(compiled, width=120, sort_dicts=False)}\n")
+    
+    print(f"Módulos compactados gravados em: {path}")
+    report(modules, compiled)
+
+def report(modules, compiled):
+    """Tamanho de cada modo antes e depois da compactação"""
+    encoders = {}
+    if tiktoken is not None:
+        encoders = {model: tiktoken.get_encoding(name) for model, name in ENCODINGS.items()}
+    
+    original_system = ModularPromptSystem(compress=False)
+    for mode in ("fast", "conservador", "balanceado", "editorial"):
+        before = original_system.build_prompt(original_system.get_prompt_sequence(mode), "")
+        after = before
+        for key, module in modules.items():
+            after = after.replace(module.content, compiled[key])
+        
+        line = f"{mode}: {len(before)} -> {len(after)} caracteres"
+        for model, encoder in encoders.items():
+            line += f" | {model}: {len(encoder.encode(before))} -> {len(encoder.encode(after))} tokens"
+        print(line)
+
+if __name__ == "__main__":
+    compile_prompts()
@@ -1,17 +1,63 @@
 import os
-import json
-import shutil
+import io
+import re
 import logging
-from typing import List, Dict
+import concurrent.futures
+from functools import lru_cache
+from itertools import accumulate
+from typing import List, Dict, Tuple
 from docx import Document
 from docx.shared import RGBColor
+from docx.oxml import OxmlElement
+from docx.oxml.ns import qn
+from lxml import etree
 import difflib
+from ..utils.json_utils import JSONHandler
+
+try:
+    from diff_match_patch import diff_match_patch
+except ImportError:  # Sem diff-match-patch: usa difflib
+    diff_match_patch = None
+
+XML_SPACE = '{http://www.w3.org/XML/1998/namespace}space'
+
+# Palavras, espaços e cada sinal de pontuação separadamente
+WORD_PATTERN = re.compile(r'\w+|\s+|[^\w\s]')
+
+# Tab e quebras viram elementos próprios (como no add_run do python-docx);
+# os demais caracteres de controle não são válidos em XML
+CONTROL_PATTERN = re.compile(r'([\t\n\r])|[\x00-\x08\x0b\x0c\x0e-\x1f]')
 
 class DocumentComparer:
     """Compara documentos detectando ABSOLUTAMENTE TODAS as mudanças"""
     
+    # A partir de quantos parágrafos alterados a análise vai para um pool de processos
+    PARALLEL_MIN_PARAGRAPHS = 100
+    
+    # Trechos alterados maiores que isto são comparados primeiro por palavras
+    LONG_TEXT_CHARS = 500
+    
+    # Cores das marcações (criadas uma vez)
+    RED = RGBColor(0xFF, 0x00, 0x00)
+    GREEN = RGBColor(0x00, 0xFF, 0x00)
+    DARK_BLUE = RGBColor(0x00, 0x00, 0x8B)
+    GRAY = RGBColor(0x80, 0x80, 0x80)
+    
     def __init__(self):
         self.logger = logging.getLogger(__name__)
+        # Um único SequenceMatcher reaproveitado entre parágrafos
+        self._matcher = difflib.SequenceMatcher(autojunk=False)
+        # diff-match-patch (Myers, quase linear) quando disponível
+        self._dmp = diff_match_patch() if diff_match_patch else None
+        if self._dmp is not None:
+            # Sem limite de tempo: com o padrão (1 s) o diff de parágrafos longos
+            # para no meio e sai não mínimo, dependendo da máquina - o mesmo par
+            # de documentos daria relatórios diferentes
+            self._dmp.Diff_Timeout = 0
+        # Memoiza a análise por par (original, revisado) - por instância
+        self._analysis_cache = lru_cache(maxsize=4096)(self._compute_changes)
+        # Textos integrais da comparação atual (texto -> índice no relatório)
+        self._text_pool = {}
     
     def compare_documents(self, original_path: str, revised_path: str, 
                          output_path: str, log_path: str = None) -> str:
@@ -25,63 +71,88 @@ class DocumentComparer:
         try:
             self.logger.info("=== COMPARAÇÃO ULTRA DETALHADA ===")
             
-            # 1. COPIA o documento revisado
+            # 1. Lê o documento revisado UMA vez (a comparação parte dele, em memória)
             os.makedirs(os.path.dirname(output_path), exist_ok=True)
-            shutil.copy2(revised_path, output_path)
+            with open(revised_path, 'rb') as f:
+                revised_bytes = f.read()
             
             # 2. Abre os três documentos
             original_doc = Document(original_path)
-            revised_doc = Document(revised_path)
-            comparison_doc = Document(output_path)
+            revised_doc = Document(io.BytesIO(revised_bytes))
+            comparison_doc = Document(io.BytesIO(revised_bytes))
             
             # 3. ANÁLISE COMPLETA - parágrafo por parágrafo
             all_changes = []
             para_num = 0
-            total_paragraphs = max(len(original_doc.paragraphs), len(revised_doc.paragraphs))
+            self._text_pool = {}
+            
+            # Materializa as listas uma vez (python-docx recria a lista a cada acesso)
+            original_paragraphs = original_doc.paragraphs
+            revised_paragraphs = revised_doc.paragraphs
+            total_paragraphs = max(len(original_paragraphs), len(revised_paragraphs))
             
             self.logger.info(f"Comparando {total_paragraphs} parágrafos...")
             
-            # Processa TODOS os parágrafos (mesmo se um doc tem mais que o outro)
-            for i in range(total_paragraphs):
-                # Pega o parágrafo de cada doc (ou texto vazio se não existir)
-                orig_text = original_doc.paragraphs[i].text if i < len(original_doc.paragraphs) else ""
-                rev_text = revised_doc.paragraphs[i].text if i < len(revised_doc.paragraphs) else ""
-                comp_para = comparison_doc.paragraphs[i] if i < len(comparison_doc.paragraphs) else None
-                
-                # Conta parágrafos não vazios
+            # Extrai todos os textos de uma vez (mesmo se um doc tem mais que o outro)
+            orig_texts = [p.text for p in original_paragraphs]
+            rev_texts = [p.text for p in revised_paragraphs]
+            orig_texts.extend([""] * (total_paragraphs - len(orig_texts)))
+            rev_texts.extend([""] * (total_paragraphs - len(rev_texts)))
+            
+            # Numera os parágrafos não vazios
+            para_numbers = []
+            for orig_text, rev_text in zip(orig_texts, rev_texts):
                 if orig_text.strip() or rev_text.strip():
                     para_num += 1
-                    
-                    # COMPARA CARACTERE POR CARACTERE
-                    if orig_text != rev_text:
-                        self.logger.info(f"Mudança no parágrafo {para_num}:")
-                        self.logger.info(f"  Original: '{orig_text}'")
-                        self.logger.info(f"  Revisado: '{rev_text}'")
-                        
-                        # Analisa a diferença em DETALHE
-                        changes = self._analyze_all_changes(orig_text, rev_text)
-                        
-                        for change in changes:
-                            change.update({
-                                'paragraph_number': para_num,
-                                'location': f'Parágrafo {para_num}',
-                                'page': (para_num // 3) + 1,
-                                'original_full': orig_text,
-                                'revised_full': rev_text
-                            })
-                            all_changes.append(change)
-                        
-                        # MARCA no documento
-                        if comp_para:
-                            self._mark_all_changes(comp_para, orig_text, rev_text)
+                para_numbers.append(para_num)
+            
+            # Só os parágrafos que mudaram passam pela análise detalhada
+            diff_idx = [i for i, (a, b) in enumerate(zip(orig_texts, rev_texts)) if a != b]
+            
+            changed = []
+            for i in diff_idx:
+                orig_text = orig_texts[i]
+                rev_text = rev_texts[i]
+                
+                # Ignora parágrafos vazios
+                if not (orig_text.strip() or rev_text.strip()):
+                    continue
+                
+                paragraph_number = para_numbers[i]
+                page = (paragraph_number // 3) + 1
+                metadata = self._change_metadata(f'Parágrafo {paragraph_number}', page,
+                                                 orig_text, rev_text, paragraph_number)
+                changed.append((i, paragraph_number, (orig_text, rev_text, metadata)))
+            
+            # Analisa a diferença em DETALHE (em paralelo nos documentos grandes)
+            results = self._analyze_pairs([pair for _, _, pair in changed])
+            
+            # Parágrafos da comparação só são necessários se houver o que marcar
+            comparison_paragraphs = comparison_doc.paragraphs if changed else []
+            
+            for (i, paragraph_number, pair), (changes, opcodes) in zip(changed, results):
+                orig_text, rev_text, _ = pair
+                comp_para = comparison_paragraphs[i] if i < len(comparison_paragraphs) else None
+                
+                self.logger.info(f"Mudança no parágrafo {paragraph_number}:")
+                self.logger.info(f"  Original: '{orig_text}'")
+                self.logger.info(f"  Revisado: '{rev_text}'")
+                
+                all_changes.extend(changes)
+                
+                # MARCA no documento (sempre no processo principal)
+                if comp_para:
+                    self._mark_all_changes(comp_para, orig_text, rev_text, opcodes)
             
             # 4. ANÁLISE COMPLETA DAS TABELAS
             self.logger.info("Analisando tabelas...")
-            table_changes = self._compare_all_tables(original_doc, revised_doc, comparison_doc, para_num)
+            table_pages = self._table_pages(original_doc, para_numbers)
+            table_changes = self._compare_all_tables(original_doc, revised_doc, comparison_doc, table_pages)
             all_changes.extend(table_changes)
             
             # 5. Adiciona sumário COMPLETO no início
-            self._add_complete_summary(comparison_doc, all_changes)
+            texts = list(self._text_pool)
+            self._add_complete_summary(comparison_doc, all_changes, texts)
             
             # 6. Salva
             comparison_doc.save(output_path)
@@ -92,23 +163,229 @@ class DocumentComparer:
             
             # 7. Salva relatório JSON detalhado
             report_path = output_path.replace('.docx', '_detalhado.json')
-            with open(report_path, 'w', encoding='utf-8') as f:
-                json.dump({
-                    'total_mudancas': len(all_changes),
-                    'todas_mudancas': all_changes
-                }, f, ensure_ascii=False, indent=2)
+            # Textos integrais ficam em 'textos', referenciados por índice em cada mudança
+            JSONHandler.save(report_path, {
+                'total_mudancas': len(all_changes),
+                'textos': texts,
+                'todas_mudancas': all_changes
+            })
             
             return output_path
-            
+        
         except Exception as e:
             self.logger.error(f"Erro na comparação: {str(e)}")
             raise
     
-    def _analyze_all_changes(self, original: str, revised: str) -> List[Dict]:
-        """Analisa TODAS as mudanças entre dois textos"""
+    def _analyze_pairs(self, pairs: List[Tuple]) -> List[Tuple[List[Dict], Tuple]]:
+        """Aplica _analyze_all_changes a cada par, em paralelo quando compensa
+        
+        A análise é pura (não toca no documento), então pode ir para outros
+        processos; abaixo de PARALLEL_MIN_PARAGRAPHS o custo de pickle não compensa.
+        """
+        workers = os.cpu_count() or 1
+        if len(pairs) < self.PARALLEL_MIN_PARAGRAPHS or workers < 2:
+            return [self._analyze_all_changes(*pair) for pair in pairs]
+        
+        try:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+                return list(executor.map(_analyze_pair, pairs, chunksize=64))
+        except (OSError, concurrent.futures.process.BrokenProcessPool) as e:
+            # Ambientes sem multiprocessamento (ex.: executável congelado) - segue em série
+            self.logger.warning(f"Análise paralela indisponível, processando em série: {str(e)}")
+            return [self._analyze_all_changes(*pair) for pair in pairs]
+    
+    def _get_opcodes(self, original: str, revised: str) -> List[Tuple]:
+        """Calcula os opcodes caractere por caractere (formato do difflib)"""
+        # Prefixo e sufixo comuns são resolvidos com comparações de fatias (em C);
+        # o diff interpretado só roda sobre o trecho que realmente mudou
+        prefix = self._common_prefix_length(original, revised)
+        suffix = self._common_suffix_length(original[prefix:], revised[prefix:])
+        end_orig = len(original) - suffix
+        end_rev = len(revised) - suffix
+        
+        middle = self._diff_opcodes(original[prefix:end_orig], revised[prefix:end_rev])
+        
+        opcodes = []
+        if prefix:
+            opcodes.append(('equal', 0, prefix, 0, prefix))
+        for tag, i1, i2, j1, j2 in middle:
+            opcodes.append((tag, i1 + prefix, i2 + prefix, j1 + prefix, j2 + prefix))
+        if suffix:
+            opcodes.append(('equal', end_orig, len(original), end_rev, len(revised)))
+        
+        return opcodes
+    
+    def _diff_opcodes(self, original: str, revised: str) -> List[Tuple]:
+        """Diff do trecho central: diff-match-patch ou o SequenceMatcher reaproveitado"""
+        if not original or not revised:
+            # Um dos lados vazio: inserção ou remoção pura, sem diff
+            if original:
+                return [('delete', 0, len(original), 0, 0)]
+            if revised:
+                return [('insert', 0, 0, 0, len(revised))]
+            return []
+        
+        # Trechos longos: diff por palavras e refinamento por caractere só onde mudou
+        if max(len(original), len(revised)) > self.LONG_TEXT_CHARS:
+            return self._word_then_char_opcodes(original, revised)
+        
+        return self._char_opcodes(original, revised)
+    
+    def _word_then_char_opcodes(self, original: str, revised: str) -> List[Tuple]:
+        """Diff por palavras; cada substituição é refinada caractere por caractere
+        
+        Mantém a precisão de "cada vírgula" sem rodar o diff de caracteres sobre
+        o parágrafo inteiro.
+        """
+        orig_tokens = WORD_PATTERN.findall(original)
+        rev_tokens = WORD_PATTERN.findall(revised)
+        
+        # Posição (em caracteres) do início de cada token
+        orig_offsets = [0, *accumulate(len(t) for t in orig_tokens)]
+        rev_offsets = [0, *accumulate(len(t) for t in rev_tokens)]
+        
+        opcodes = []
+        for tag, i1, i2, j1, j2 in self._token_opcodes(orig_tokens, rev_tokens):
+            a1, a2 = orig_offsets[i1], orig_offsets[i2]
+            b1, b2 = rev_offsets[j1], rev_offsets[j2]
+            
+            if tag == 'replace':
+                refined = [(t, x1 + a1, x2 + a1, y1 + b1, y2 + b1)
+                           for t, x1, x2, y1, y2 in self._char_opcodes(original[a1:a2], revised[b1:b2])]
+            else:
+                refined = [(tag, a1, a2, b1, b2)]
+            
+            for opcode in refined:
+                # Junta trechos iguais vizinhos (fronteira entre palavra e refinamento)
+                if opcode[0] == 'equal' and opcodes and opcodes[-1][0] == 'equal':
+                    previous = opcodes.pop()
+                    opcode = ('equal', previous[1], opcode[2], previous[3], opcode[4])
+                opcodes.append(opcode)
+        
+        return opcodes
+    
+    def _token_opcodes(self, orig_tokens: List[str], rev_tokens: List[str]) -> List[Tuple]:
+        """Opcodes sobre listas de tokens (índices de token, não de caractere)"""
+        if self._dmp is not None:
+            # Como no modo "linhas" do diff-match-patch: cada token distinto vira um caractere
+            token_codes = {}
+            orig_chars = ''.join(chr(token_codes.setdefault(t, len(token_codes) + 1)) for t in orig_tokens)
+            rev_chars = ''.join(chr(token_codes.setdefault(t, len(token_codes) + 1)) for t in rev_tokens)
+            return self._dmp_to_opcodes(self._dmp.diff_main(orig_chars, rev_chars, False))
+        
+        self._matcher.set_seqs(orig_tokens, rev_tokens)
+        return self._matcher.get_opcodes()
+    
+    def _char_opcodes(self, original: str, revised: str) -> List[Tuple]:
+        """Diff caractere por caractere"""
+        if self._dmp is not None:
+            diffs = self._dmp.diff_main(original, revised, False)
+            self._dmp.diff_cleanupSemantic(diffs)
+            return self._dmp_to_opcodes(diffs)
+        
+        self._matcher.set_seqs(original, revised)
+        return self._matcher.get_opcodes()
+    
+    @staticmethod
+    def _common_prefix_length(a: str, b: str) -> int:
+        """Tamanho do prefixo comum por busca binária sobre fatias"""
+        low, high = 0, min(len(a), len(b))
+        while low < high:
+            mid = (low + high + 1) // 2
+            if a[low:mid] == b[low:mid]:
+                low = mid
+            else:
+                high = mid - 1
+        return low
+    
+    @staticmethod
+    def _common_suffix_length(a: str, b: str) -> int:
+        """Tamanho do sufixo comum por busca binária sobre fatias"""
+        low, high = 0, min(len(a), len(b))
+        while low < high:
+            mid = (low + high + 1) // 2
+            if a[len(a) - mid:len(a) - low] == b[len(b) - mid:len(b) - low]:
+                low = mid
+            else:
+                high = mid - 1
+        return low
+    
+    @staticmethod
+    def _dmp_to_opcodes(diffs) -> List[Tuple]:
+        """Converte a saída do diff-match-patch em opcodes equal/replace/delete/insert"""
+        opcodes = []
+        i = j = 0
+        deleted = inserted = 0
+        
+        def flush():
+            if deleted and inserted:
+                opcodes.append(('replace', i - deleted, i, j - inserted, j))
+            elif deleted:
+                opcodes.append(('delete', i - deleted, i, j, j))
+            elif inserted:
+                opcodes.append(('insert', i, i, j - inserted, j))
+        
+        for op, text in diffs:
+            size = len(text)
+            if op == diff_match_patch.DIFF_EQUAL:
+                flush()
+                deleted = inserted = 0
+                opcodes.append(('equal', i, i + size, j, j + size))
+                i += size
+                j += size
+            elif op == diff_match_patch.DIFF_DELETE:
+                deleted += size
+                i += size
+            else:
+                inserted += size
+                j += size
+        
+        flush()
+        return opcodes
+    
+    def _change_metadata(self, location: str, page: int, original: str, revised: str,
+                         paragraph_number: int = None) -> Tuple:
+        """Campos do parágrafo anexados a cada mudança
+        
+        Os textos integrais não são repetidos em cada mudança: entram uma vez
+        no pool de textos e cada mudança guarda só os índices.
+        """
+        metadata = (('location', location), ('page', page),
+                    ('original_idx', self._intern_text(original)),
+                    ('revised_idx', self._intern_text(revised)))
+        if paragraph_number is not None:
+            metadata = (('paragraph_number', paragraph_number),) + metadata
+        return metadata
+    
+    def _intern_text(self, text: str) -> int:
+        """Índice do texto no pool da comparação atual"""
+        index = self._text_pool.get(text)
+        if index is None:
+            index = self._text_pool[text] = len(self._text_pool)
+        return index
+    
+    def _analyze_all_changes(self, original: str, revised: str, metadata: Tuple) -> Tuple[List[Dict], Tuple]:
+        """Analisa TODAS as mudanças entre dois textos
+        
+        Retorna (mudanças, opcodes) - os opcodes são reaproveitados por
+        _mark_all_changes para não calcular o diff duas vezes. Cada mudança
+        já sai completa, com os campos de `metadata` (ver _change_metadata).
+        """
+        # Textos idênticos: nada a analisar (evita o SequenceMatcher)
+        if original is revised or original == revised:
+            return [], ()
+        
+        # Pares repetidos (cabeçalhos, células iguais) vêm do cache
+        changes, opcodes = self._analysis_cache(original, revised)
+        return [dict(change + metadata) for change in changes], opcodes
+    
+    def _compute_changes(self, original: str, revised: str) -> Tuple[Tuple, Tuple]:
+        """Calcula as mudanças de um par de textos (resultado imutável, memoizado)"""
+        # Análise CARACTERE por CARACTERE (calculada uma única vez)
+        opcodes = self._get_opcodes(original, revised)
         changes = []
         
-        # 1. Verifica mudanças simples primeiro
+        # Verifica mudanças simples primeiro
         if revised == original + '.':
             changes.append({
                 'type': 'pontuação',
@@ -116,169 +393,183 @@ class DocumentComparer:
                 'correction': '.',
                 'description': 'Adicionado ponto final'
             })
-            return changes
         
-        if revised == original + ',':
+        elif revised == original + ',':
             changes.append({
                 'type': 'pontuação',
                 'error': '[SEM VÍRGULA]',
                 'correction': ',',
                 'description': 'Adicionada vírgula'
             })
-            return changes
-        
-        # 2. Análise CARACTERE por CARACTERE
-        s = difflib.SequenceMatcher(None, original, revised)
         
-        for tag, i1, i2, j1, j2 in s.get_opcodes():
-            if tag == 'replace':
-                changes.append({
-                    'type': 'substituição',
-                    'error': original[i1:i2],
-                    'correction': revised[j1:j2],
-                    'position': i1,
-                    'description': f'"{original[i1:i2]}" → "{revised[j1:j2]}"'
-                })
-            elif tag == 'delete':
-                changes.append({
-                    'type': 'remoção',
-                    'error': original[i1:i2],
-                    'correction': '',
-                    'position': i1,
-                    'description': f'Removido: "{original[i1:i2]}"'
-                })
-            elif tag == 'insert':
+        else:
+            for tag, i1, i2, j1, j2 in opcodes:
+                if tag == 'replace':
+                    changes.append({
+                        'type': 'substituição',
+                        'error': original[i1:i2],
+                        'correction': revised[j1:j2],
+                        'position': i1,
+                        'description': f'"{original[i1:i2]}" → "{revised[j1:j2]}"'
+                    })
+                elif tag == 'delete':
+                    changes.append({
+                        'type': 'remoção',
+                        'error': original[i1:i2],
+                        'correction': '',
+                        'position': i1,
+                        'description': f'Removido: "{original[i1:i2]}"'
+                    })
+                elif tag == 'insert':
+                    changes.append({
+                        'type': 'adição',
+                        'error': '',
+                        'correction': revised[j1:j2],
+                        'position': i1,
+                        'description': f'Adicionado: "{revised[j1:j2]}"'
+                    })
+            
+            # Se não encontrou mudanças específicas mas os textos são diferentes
+            if not changes and original != revised:
                 changes.append({
-                    'type': 'adição',
-                    'error': '',
-                    'correction': revised[j1:j2],
-                    'position': i1,
-                    'description': f'Adicionado: "{revised[j1:j2]}"'
+                    'type': 'mudança geral',
+                    'error': original,
+                    'correction': revised,
+                    'description': 'Texto completamente alterado'
                 })
         
-        # Se não encontrou mudanças específicas mas os textos são diferentes
-        if not changes and original != revised:
-            changes.append({
-                'type': 'mudança geral',
-                'error': original,
-                'correction': revised,
-                'description': 'Texto completamente alterado'
-            })
-        
-        return changes
+        # Congela o resultado: o cache não pode ser alterado pelos chamadores
+        return tuple(tuple(change.items()) for change in changes), tuple(opcodes)
     
-    def _mark_all_changes(self, paragraph, original_text: str, revised_text: str):
+    def _mark_all_changes(self, paragraph, original_text: str, revised_text: str, opcodes: Tuple = None):
         """Marca TODAS as mudanças visualmente"""
         
-        # Limpa parágrafo
-        for run in paragraph.runs:
-            run.text = ""
+        # Limpa parágrafo: remove os <w:r> direto no XML em vez de deixá-los vazios
+        # (<w:pPr>, hyperlinks e bookmarks permanecem)
+        p = paragraph._p
+        for r in p.findall(qn('w:r')):
+            p.remove(r)
+        
+        # Textos idênticos: reemite o texto sem marcações
+        if original_text is revised_text or original_text == revised_text:
+            paragraph.add_run(original_text)
+            return
         
-        # Análise caractere por caractere
-        s = difflib.SequenceMatcher(None, original_text, revised_text)
+        # Análise caractere por caractere (reaproveita opcodes já calculados)
+        if opcodes is None:
+            opcodes = self._get_opcodes(original_text, revised_text)
         
-        for tag, i1, i2, j1, j2 in s.get_opcodes():
+        # 1ª passada: agrupa opcodes de mudança consecutivos em um único trecho
+        # (texto igual, texto removido, texto adicionado)
+        segments = []
+        for tag, i1, i2, j1, j2 in opcodes:
             if tag == 'equal':
+                segments.append((original_text[i1:i2], None, None))
+            elif segments and segments[-1][0] is None:
+                _, removed, added = segments[-1]
+                segments[-1] = (None, removed + original_text[i1:i2], added + revised_text[j1:j2])
+            else:
+                segments.append((None, original_text[i1:i2], revised_text[j1:j2]))
+        
+        # 2ª passada: um run por trecho agrupado
+        for equal, removed, added in segments:
+            if equal is not None:
                 # Texto igual - normal
-                paragraph.add_run(original_text[i1:i2])
-            
-            elif tag == 'replace':
-                # Mostra o que foi removido
-                old_run = paragraph.add_run(original_text[i1:i2])
-                old_run.font.strike = True
-                old_run.font.color.rgb = RGBColor(255, 0, 0)
-                old_run.font.bold = True
-                
-                # Mostra o que foi adicionado
-                new_run = paragraph.add_run(revised_text[j1:j2])
-                new_run.font.color.rgb = RGBColor(0, 255, 0)
-                new_run.font.underline = True
-                new_run.font.bold = True
+                paragraph.add_run(equal)
+                continue
             
-            elif tag == 'delete':
+            if removed:
                 # Texto removido
-                del_run = paragraph.add_run(original_text[i1:i2])
-                del_run.font.strike = True
-                del_run.font.color.rgb = RGBColor(255, 0, 0)
-                del_run.font.bold = True
+                del_run = paragraph.add_run(removed)
+                self._apply_style(del_run._r, bold=True, strike=True, color=self.RED)
             
-            elif tag == 'insert':
+            if added:
                 # Texto adicionado
-                add_run = paragraph.add_run(revised_text[j1:j2])
-                add_run.font.color.rgb = RGBColor(0, 255, 0)
-                add_run.font.underline = True
-                add_run.font.bold = True
-                add_run.font.size = add_run.font.size  # Mantém tamanho
+                add_run = paragraph.add_run(added)
+                self._apply_style(add_run._r, bold=True, underline=True, color=self.GREEN)
     
-    def _compare_all_tables(self, original_doc, revised_doc, comparison_doc, para_offset):
+    def _table_pages(self, doc, para_numbers: List[int]) -> List[int]:
+        """Página estimada de cada tabela pela sua posição real no corpo do documento"""
+        pages = []
+        body_paragraphs = 0
+        
+        for child in doc.element.body.iterchildren():
+            if child.tag == qn('w:p'):
+                body_paragraphs += 1
+            elif child.tag == qn('w:tbl'):
+                # Número do último parágrafo não vazio antes da tabela
+                preceding = min(body_paragraphs, len(para_numbers))
+                para_offset = para_numbers[preceding - 1] if preceding else 0
+                pages.append((para_offset // 3) + 1)
+        
+        return pages
+    
+    def _compare_all_tables(self, original_doc, revised_doc, comparison_doc, table_pages):
         """Compara TODAS as células de TODAS as tabelas"""
         table_changes = []
         
-        max_tables = max(len(original_doc.tables), len(revised_doc.tables))
+        # Materializa cada coleção uma única vez (python-docx percorre o XML a cada acesso)
+        original_tables = original_doc.tables
+        revised_tables = revised_doc.tables
+        comparison_tables = comparison_doc.tables
         
-        for t_idx in range(max_tables):
-            if t_idx >= len(original_doc.tables) or t_idx >= len(revised_doc.tables):
-                # Uma tabela foi adicionada ou removida
+        # Tabelas adicionadas ou removidas ficam de fora (zip para na menor)
+        for t_idx, (orig_table, rev_table) in enumerate(zip(original_tables, revised_tables)):
+            # Tabela idêntica (XML serializado igual, comparado em C): pula as células
+            if etree.tostring(orig_table._tbl) == etree.tostring(rev_table._tbl):
                 continue
             
-            orig_table = original_doc.tables[t_idx]
-            rev_table = revised_doc.tables[t_idx]
-            comp_table = comparison_doc.tables[t_idx] if t_idx < len(comparison_doc.tables) else None
+            comp_table = comparison_tables[t_idx] if t_idx < len(comparison_tables) else None
+            comp_rows = comp_table.rows if comp_table else None
+            page = table_pages[t_idx] if t_idx < len(table_pages) else 1
             
             # Compara cada célula
-            for r_idx in range(max(len(orig_table.rows), len(rev_table.rows))):
-                if r_idx >= len(orig_table.rows) or r_idx >= len(rev_table.rows):
-                    continue
+            for r_idx, (orig_row, rev_row) in enumerate(zip(orig_table.rows, rev_table.rows)):
+                comp_cells = comp_rows[r_idx].cells if comp_rows and r_idx < len(comp_rows) else None
                 
-                for c_idx in range(max(len(orig_table.rows[r_idx].cells), len(rev_table.rows[r_idx].cells))):
-                    if c_idx >= len(orig_table.rows[r_idx].cells) or c_idx >= len(rev_table.rows[r_idx].cells):
-                        continue
+                for c_idx, (orig_cell, rev_cell) in enumerate(zip(orig_row.cells, rev_row.cells)):
+                    comp_cell = comp_cells[c_idx] if comp_cells and c_idx < len(comp_cells) else None
                     
-                    orig_cell = orig_table.rows[r_idx].cells[c_idx]
-                    rev_cell = rev_table.rows[r_idx].cells[c_idx]
-                    comp_cell = comp_table.rows[r_idx].cells[c_idx] if comp_table else None
+                    orig_paras = orig_cell.paragraphs
+                    rev_paras = rev_cell.paragraphs
+                    comp_paras = comp_cell.paragraphs if comp_cell else []
                     
                     # Compara cada parágrafo na célula
-                    for p_idx in range(max(len(orig_cell.paragraphs), len(rev_cell.paragraphs))):
-                        orig_text = orig_cell.paragraphs[p_idx].text if p_idx < len(orig_cell.paragraphs) else ""
-                        rev_text = rev_cell.paragraphs[p_idx].text if p_idx < len(rev_cell.paragraphs) else ""
+                    for p_idx in range(max(len(orig_paras), len(rev_paras))):
+                        orig_text = orig_paras[p_idx].text if p_idx < len(orig_paras) else ""
+                        rev_text = rev_paras[p_idx].text if p_idx < len(rev_paras) else ""
                         
                         if orig_text != rev_text and (orig_text.strip() or rev_text.strip()):
                             # Analisa mudanças
-                            changes = self._analyze_all_changes(orig_text, rev_text)
-                            
-                            for change in changes:
-                                change.update({
-                                    'location': f'Tabela {t_idx+1}, Célula ({r_idx+1},{c_idx+1})',
-                                    'page': (para_offset // 3) + 1,
-                                    'original_full': orig_text,
-                                    'revised_full': rev_text
-                                })
-                                table_changes.append(change)
+                            metadata = self._change_metadata(
+                                f'Tabela {t_idx+1}, Célula ({r_idx+1},{c_idx+1})', page, orig_text, rev_text
+                            )
+                            changes, opcodes = self._analyze_all_changes(orig_text, rev_text, metadata)
+                            table_changes.extend(changes)
                             
                             # Marca mudanças
-                            if comp_cell and p_idx < len(comp_cell.paragraphs):
-                                self._mark_all_changes(comp_cell.paragraphs[p_idx], orig_text, rev_text)
+                            if p_idx < len(comp_paras):
+                                self._mark_all_changes(comp_paras[p_idx], orig_text, rev_text, opcodes)
         
         return table_changes
     
-    def _add_complete_summary(self, doc, all_changes):
-        """Adiciona sumário ULTRA COMPLETO no início"""
+    def _add_complete_summary(self, doc, all_changes, texts: List[str]):
+        """Adiciona sumário ULTRA COMPLETO no início
         
-        # Move para o início
-        first_para = doc.paragraphs[0] if doc.paragraphs else None
+        O sumário é montado direto em XML (<w:p>/<w:r>) dentro de um contêiner
+        temporário, sem passar por doc.add_paragraph(), e depois movido de uma
+        vez para antes do primeiro parágrafo.
+        """
+        body = doc.element.body
+        container = OxmlElement('w:body')
         
         # TÍTULO
-        title = doc.add_paragraph()
-        title_run = title.add_run('RELATÓRIO ULTRA DETALHADO DE TODAS AS MUDANÇAS')
-        title_run.bold = True
-        title_run.font.size = 18
-        if first_para:
-            title._element.addprevious(first_para._element)
+        title = self._new_paragraph(container)
+        self._new_run(title, 'RELATÓRIO ULTRA DETALHADO DE TODAS AS MUDANÇAS', bold=True, size=18)
         
         # ESTATÍSTICAS
-        stats = doc.add_paragraph()
-        stats.add_run(f'\nTOTAL DE MUDANÇAS DETECTADAS: {len(all_changes)}\n\n')
+        stats = self._new_paragraph(container)
+        self._new_run(stats, f'\nTOTAL DE MUDANÇAS DETECTADAS: {len(all_changes)}\n\n')
         
         # Por tipo
         by_type = {}
@@ -286,72 +577,127 @@ class DocumentComparer:
             t = change.get('type', 'outro')
             by_type[t] = by_type.get(t, 0) + 1
         
-        stats.add_run('POR TIPO:\n')
+        self._new_run(stats, 'POR TIPO:\n')
         for tipo, count in sorted(by_type.items(), key=lambda x: x[1], reverse=True):
-            stats.add_run(f'• {tipo.upper()}: {count}\n')
-        
-        if first_para:
-            stats._element.addprevious(first_para._element)
+            self._new_run(stats, f'• {tipo.upper()}: {count}\n')
         
         # LEGENDA
-        legend = doc.add_paragraph()
-        legend.add_run('\nLEGENDA: ')
-        
-        rem = legend.add_run('texto removido')
-        rem.font.strike = True
-        rem.font.color.rgb = RGBColor(255, 0, 0)
-        rem.font.bold = True
-        
-        legend.add_run(' | ')
-        
-        add = legend.add_run('texto adicionado')
-        add.font.color.rgb = RGBColor(0, 255, 0)
-        add.font.underline = True
-        add.font.bold = True
-        
-        if first_para:
-            legend._element.addprevious(first_para._element)
+        legend = self._new_paragraph(container)
+        self._new_run(legend, '\nLEGENDA: ')
+        self._new_run(legend, 'texto removido', bold=True, strike=True, color=self.RED)
+        self._new_run(legend, ' | ')
+        self._new_run(legend, 'texto adicionado', bold=True, underline=True, color=self.GREEN)
         
         # LISTA COMPLETA DE MUDANÇAS
-        div = doc.add_paragraph()
-        div.add_run('\n' + '='*100 + '\n')
-        if first_para:
-            div._element.addprevious(first_para._element)
-        
-        list_title = doc.add_paragraph()
-        list_run = list_title.add_run('LISTA COMPLETA DE TODAS AS MUDANÇAS (cada vírgula, ponto, espaço)')
-        list_run.bold = True
-        list_run.font.size = 14
-        if first_para:
-            list_title._element.addprevious(first_para._element)
+        div = self._new_paragraph(container)
+        self._new_run(div, '\n' + '='*100 + '\n')
+        
+        list_title = self._new_paragraph(container)
+        self._new_run(list_title, 'LISTA COMPLETA DE TODAS AS MUDANÇAS (cada vírgula, ponto, espaço)',
+                      bold=True, size=14)
         
         # Lista cada mudança
         for i, change in enumerate(all_changes, 1):
-            change_para = doc.add_paragraph()
+            change_para = self._new_paragraph(container)
             
             # Número e localização
-            change_para.add_run(f'\n{i}. {change["location"]}: ').bold = True
+            self._new_run(change_para, f'\n{i}. {change["location"]}: ', bold=True)
             
             # Tipo
-            type_run = change_para.add_run(f'[{change["type"].upper()}] ')
-            type_run.font.color.rgb = RGBColor(0, 0, 139)
+            self._new_run(change_para, f'[{change["type"].upper()}] ', color=self.DARK_BLUE)
             
             # Descrição
-            change_para.add_run(change['description'])
+            self._new_run(change_para, change['description'])
             
             # Contexto (primeiros 50 chars)
-            if len(change.get('original_full', '')) > 50:
-                context = change['original_full'][:50] + '...'
-                change_para.add_run(f'\n   Contexto: "{context}"')
-                change_para.runs[-1].font.size = 10
-                change_para.runs[-1].font.color.rgb = RGBColor(128, 128, 128)
-            
-            if first_para:
-                change_para._element.addprevious(first_para._element)
+            original_full = texts[change['original_idx']]
+            if len(original_full) > 50:
+                context = original_full[:50] + '...'
+                self._new_run(change_para, f'\n   Contexto: "{context}"', color=self.GRAY, size=10)
         
         # Linha final
-        final = doc.add_paragraph()
-        final.add_run('\n' + '='*100)
-        final.add_run('\nDOCUMENTO REVISADO COM TODAS AS MARCAÇÕES:\n\n')
-        if first_para:
-            final._element.addprevious(first_para._element)
\ No newline at end of file
+        final = self._new_paragraph(container)
+        self._new_run(final, '\n' + '='*100)
+        self._new_run(final, '\nDOCUMENTO REVISADO COM TODAS AS MARCAÇÕES:\n\n')
+        
+        # Move todo o sumário de uma vez, em ordem, para antes do primeiro parágrafo
+        # (ou para o fim do corpo, antes de <w:sectPr>, se o documento não tiver parágrafos)
+        anchor = body.find(qn('w:p'))
+        if anchor is None:
+            anchor = body.find(qn('w:sectPr'))
+        
+        for para in list(container):
+            if anchor is not None:
+                anchor.addprevious(para)
+            else:
+                body.append(para)
+    
+    @staticmethod
+    def _new_paragraph(container):
+        """Cria um <w:p> vazio no contêiner"""
+        return etree.SubElement(container, qn('w:p'))
+    
+    @classmethod
+    def _new_run(cls, paragraph, text: str, bold: bool = False, strike: bool = False,
+                 underline: bool = False, color: RGBColor = None, size: int = None):
+        """Cria um <w:r> formatado (tab vira <w:tab/> e quebras viram <w:br/>, como no add_run)"""
+        run = etree.SubElement(paragraph, qn('w:r'))
+        cls._apply_style(run, bold=bold, strike=strike, underline=underline, color=color, size=size)
+        
+        start = 0
+        for match in CONTROL_PATTERN.finditer(text):
+            cls._append_text(run, text[start:match.start()])
+            if match.group(1) == '\t':
+                etree.SubElement(run, qn('w:tab'))
+            elif match.group(1):
+                etree.SubElement(run, qn('w:br'))
+            start = match.end()
+        cls._append_text(run, text[start:])
+        
+        return run
+    
+    @staticmethod
+    def _append_text(run, text: str):
+        """Acrescenta um <w:t> ao run (nada se o texto for vazio)"""
+        if text:
+            t = etree.SubElement(run, qn('w:t'))
+            t.text = text
+            if text != text.strip():
+                t.set(XML_SPACE, 'preserve')
+    
+    @staticmethod
+    def _apply_style(run, bold: bool = False, strike: bool = False, underline: bool = False,
+                     color: RGBColor = None, size: int = None):
+        """Grava o <w:rPr> de um run recém-criado de uma só vez
+        
+        Substitui a sequência de setters do python-docx (font.bold, font.strike,
+        font.color.rgb...), em que cada um procura/cria o <w:rPr> novamente.
+        """
+        if not (bold or strike or underline or color or size):
+            return
+        
+        # Ordem exigida pelo schema: b, strike, color, sz, u
+        rPr = OxmlElement('w:rPr')
+        if bold:
+            etree.SubElement(rPr, qn('w:b'))
+        if strike:
+            etree.SubElement(rPr, qn('w:strike'))
+        if color is not None:
+            etree.SubElement(rPr, qn('w:color')).set(qn('w:val'), str(color))
+        if size:
+            etree.SubElement(rPr, qn('w:sz')).set(qn('w:val'), str(size * 2))  # meios-pontos
+        if underline:
+            etree.SubElement(rPr, qn('w:u')).set(qn('w:val'), 'single')
+        
+        run.insert(0, rPr)
+
+
+# Comparador de cada processo de trabalho (criado sob demanda, com cache próprio)
+_worker_comparer = None
+
+def _analyze_pair(pair: Tuple) -> Tuple[List[Dict], Tuple]:
+    """Executado no pool de processos: analisa um par (original, revisado, metadados)"""
+    global _worker_comparer
+    if _worker_comparer is None:
+        _worker_comparer = DocumentComparer()
+    return _worker_comparer._analyze_all_changes(*pair)
\ No newline at end of file
@@ -1,39 +1,101 @@
 import os
-import shutil
 import logging
-import json
 import re
+import asyncio
+import concurrent.futures
+import difflib
+from collections import Counter
+from itertools import chain
 from typing import List, Dict, Tuple
 from docx import Document
+
+try:
+    from rapidfuzz.distance import Levenshtein
+except ImportError:  # Sem rapidfuzz: usa o difflib
+    Levenshtein = None
+
 from ..utils.word_utils import WordDocumentHandler
-from ..utils.api_client import OpenAIClient
+from ..utils.api_client import OpenAIClient, NoAnswer
+from ..utils.json_utils import JSONHandler
+from ..utils.response_cache import ResponseCache
+
+# Padrões usados em todo parágrafo - compilados uma vez só
+_RE_QNUM = re.compile(r'^\d+[\.\)]')  # Início de questão numerada
+_RE_ABNT = re.compile(r'^[A-Z]+,\s+[A-Z][a-z]+')
+_RE_YEAR = re.compile(r'\b\d{4}\b')
+
+# Proteções simples numa alternância só: alternativa a), b)... ou texto
+# indentado no início; código BNCC ou link em qualquer posição
+_RE_PROTECTED = re.compile(
+    r'^(?:[a-eA-E][\)\.]\s| {4}|\t)'
+    r'|\b(?:EF|EM)\d{2}[A-Z]{2}\d{2}\b'
+    r'|https?://\S'
+)
+
+# Marcadores de início de citação/poema, em forma de trie: "leia o texto:",
+# "observe o poema:" etc. já contêm "texto:"/"poema:", e os prefixos comuns
+# ficam fatorados - menos ramos para o regex testar em cada posição
+_RE_CONTEXT_MARKERS = re.compile(
+    r'texto:|poema:|leia(?: a seguir)?:|o (?:poema a seguir|texto abaixo)|a poesia',
+    re.IGNORECASE
+)
+_RE_POEM_WORDS = re.compile(r'poema|poesia', re.IGNORECASE)
+
+class TextRecord:
+    """Um texto mapeado do documento (parágrafo ou célula de tabela)
+    
+    Com __slots__ cada registro ocupa bem menos memória que um dict de 9
+    chaves, e o acesso por atributo é mais rápido que a busca por chave.
+    """
+    __slots__ = ('index', 'doc_index', 'original_text', 'current_text', 'paragraph_obj',
+                 'type', 'protected', 'protection_reason', 'location', 'content_type', 'runs')
+    
+    def __init__(self, index: int, doc_index, original_text: str, current_text: str,
+                 paragraph_obj, type: str, protected: bool, location: str,
+                 protection_reason: str = None, content_type: str = None):
+        self.index = index
+        self.doc_index = doc_index
+        self.original_text = original_text
+        self.current_text = current_text
+        self.paragraph_obj = paragraph_obj
+        self.type = type
+        self.protected = protected
+        self.protection_reason = protection_reason
+        self.location = location
+        self.content_type = content_type  # Só calculado para textos processáveis
+        self.runs = None  # Runs do parágrafo, guardados na primeira correção
 
 class DocumentProcessor:
     """Processa documentos Word - Versão COMPLETA que processa TUDO"""
     
-    def __init__(self, api_key: str, model: str = "gpt-4.1"):
+    def __init__(self, api_key: str, model: str = "gpt-4.1", batch_mode: bool = False, use_cache: bool = True):
         self.api_client = OpenAIClient(api_key, model)
         self.api_key = api_key
         self.model = model
         self.word_handler = WordDocumentHandler()
         self.logger = logging.getLogger(__name__)
         self.max_chunk_size = 10000  # Aproveita janela do gpt-4.1
+        self.parallel_min_texts = 5000  # Abaixo disto a classificação roda em série
+        self.max_concurrent_requests = 8  # Blocos analisados ao mesmo tempo
+        self.batch_mode = batch_mode  # Usa a Batch API: metade do custo, mas demora mais
+        self.response_cache = ResponseCache() if use_cache else None  # Respostas de execuções anteriores
     
     def process_document(self, input_path: str, output_path: str, callback=None):
         """Processa documento corrigindo TODOS os erros reais"""
         try:
             self.logger.info("=== PROCESSAMENTO COMPLETO INICIADO ===")
             
-            # 1. Copia o arquivo original
+            # 1. Garante a pasta de saída (o documento é gravado lá no passo 8)
             os.makedirs(os.path.dirname(output_path), exist_ok=True)
-            shutil.copy2(input_path, output_path)
             
-            # 2. Abre ambos os documentos
-            original_doc = Document(input_path)
-            doc = Document(output_path)
+            # 2. Abre o documento uma vez só; o texto original de cada parágrafo
+            # é guardado como string durante o mapeamento, antes de qualquer correção
+            doc = Document(input_path)
             
-            # 3. Mapeia TODOS os textos (parágrafos + tabelas)
-            all_texts = []
+            # 3. Mapeia TODOS os textos (parágrafos + tabelas), já separando
+            # processáveis de protegidos
+            processable = []
+            protected = []
             text_counter = 0
             
             # Rastreia contexto (para identificar citações/poemas)
@@ -42,18 +104,40 @@ class DocumentProcessor:
             in_poem = False
             poem_start = -1
             
-            # Parágrafos normais
+            # Lê o texto de cada parágrafo/célula uma vez (.text concatena os runs
+            # a cada acesso); a árvore do documento só é percorrida aqui, em série
             self.logger.info("Mapeando parágrafos...")
-            for i, (orig_para, para) in enumerate(zip(original_doc.paragraphs, doc.paragraphs)):
-                text = para.text.strip()
+            paragraphs = [(para, para.text) for para in doc.paragraphs]
+            
+            self.logger.info("Mapeando tabelas...")
+            cells = []
+            for t_idx, table in enumerate(doc.tables):
+                # row.cells remonta a grade da tabela inteira a cada linha (e row._index
+                # varre as linhas): monta a grade uma vez e fatia por linha, como o
+                # próprio python-docx faz em Table.row_cells
+                grid = table._cells
+                col_count = table._column_count
+                for r_idx in range(len(table.rows)):
+                    row_cells = grid[r_idx * col_count:(r_idx + 1) * col_count]
+                    for c_idx, cell in enumerate(row_cells):
+                        for p_idx, para in enumerate(cell.paragraphs):
+                            ptext = para.text
+                            if ptext.strip():
+                                cells.append((t_idx, r_idx, c_idx, p_idx, para, ptext))
+            
+            # Checagem de proteção (só regex, sem estado) de todos os textos de uma vez
+            flags = self._protection_flags([ptext for _, ptext in paragraphs] + [c[-1] for c in cells])
+            para_flags = flags[:len(paragraphs)]
+            cell_flags = flags[len(paragraphs):]
+            
+            # Parágrafos normais: o contexto de citação/poema depende da ordem
+            prev_stripped_len = 0  # Tamanho do parágrafo anterior (sem reler o documento)
+            for i, ((para, ptext), really_protected) in enumerate(zip(paragraphs, para_flags)):
+                text = ptext.strip()
                 
                 # Detecta início de citação/poema
-                if any(marker in text.lower() for marker in [
-                    'leia o texto:', 'observe o poema:', 'leia o poema:',
-                    'texto:', 'poema:', 'leia a seguir:', 'leia:',
-                    'o poema a seguir', 'o texto abaixo', 'a poesia'
-                ]):
-                    if 'poema' in text.lower() or 'poesia' in text.lower():
+                if _RE_CONTEXT_MARKERS.search(text):
+                    if _RE_POEM_WORDS.search(text):
                         in_poem = True
                         poem_start = i + 1
                     else:
@@ -61,7 +145,7 @@ class DocumentProcessor:
                         citation_start = i + 1
                 
                 # Detecta fim de citação/poema (linha vazia ou nova questão)
-                if (in_citation or in_poem) and (not text or re.match(r'^\d+[\.\)]', text)):
+                if (in_citation or in_poem) and (not text or _RE_QNUM.match(text)):
                     in_citation = False
                     in_poem = False
                 
@@ -78,12 +162,12 @@ class DocumentProcessor:
                         (len(text) < 60 and 
                          not text.endswith('.') and 
                          not any(c in text for c in [',', ';']) and
-                         i > 0 and len(doc.paragraphs[i-1].text.strip()) < 60)
+                         i > 0 and prev_stripped_len < 60)
                     )
                     
                     # Detecta se é realmente protegido
                     is_protected = (
-                        self._is_really_protected(para.text) or 
+                        really_protected or 
                         is_citation_content or 
                         is_poem_content or
                         is_verse
@@ -94,50 +178,43 @@ class DocumentProcessor:
                         protection_reason = 'poema/verso'
                     elif is_citation_content:
                         protection_reason = 'citação'
-                    elif self._is_really_protected(para.text):
+                    elif really_protected:
                         protection_reason = 'outro'
                     
-                    all_texts.append({
-                        'index': text_counter,
-                        'doc_index': i,
-                        'original_text': orig_para.text,
-                        'current_text': para.text,
-                        'paragraph_obj': para,
-                        'type': 'paragraph',
-                        'protected': is_protected,
-                        'protection_reason': protection_reason,
-                        'location': f'Parágrafo {text_counter}'
-                    })
+                    (protected if is_protected else processable).append(TextRecord(
+                        index=text_counter,
+                        doc_index=i,
+                        original_text=ptext,
+                        current_text=ptext,
+                        paragraph_obj=para,
+                        type='paragraph',
+                        protected=is_protected,
+                        protection_reason=protection_reason,
+                        location=f'Parágrafo {text_counter}',
+                        content_type=None if is_protected else self._detect_content_type(ptext)
+                    ))
+                
+                prev_stripped_len = len(text)
             
-            # Tabelas - SEMPRE processa
-            self.logger.info("Mapeando tabelas...")
-            for t_idx, (orig_table, table) in enumerate(zip(original_doc.tables, doc.tables)):
-                for r_idx, (orig_row, row) in enumerate(zip(orig_table.rows, table.rows)):
-                    for c_idx, (orig_cell, cell) in enumerate(zip(orig_row.cells, row.cells)):
-                        for p_idx, (orig_para, para) in enumerate(zip(orig_cell.paragraphs, cell.paragraphs)):
-                            if para.text.strip():
-                                text_counter += 1
-                                
-                                # Tabelas não são automaticamente protegidas
-                                is_protected = self._is_really_protected(para.text)
-                                
-                                all_texts.append({
-                                    'index': text_counter,
-                                    'doc_index': f"table_{t_idx}_{r_idx}_{c_idx}_{p_idx}",
-                                    'original_text': orig_para.text,
-                                    'current_text': para.text,
-                                    'paragraph_obj': para,
-                                    'type': 'table',
-                                    'protected': is_protected,
-                                    'location': f'Tabela {t_idx+1}, Célula ({r_idx+1},{c_idx+1})'
-                                })
-            
-            self.logger.info(f"Total de textos mapeados: {len(all_texts)}")
-            
-            # 4. Separa processáveis
-            processable = [t for t in all_texts if not t['protected']]
-            protected = [t for t in all_texts if t['protected']]
+            # Tabelas - SEMPRE processa (não são automaticamente protegidas)
+            for (t_idx, r_idx, c_idx, p_idx, para, ptext), is_protected in zip(cells, cell_flags):
+                text_counter += 1
+                
+                (protected if is_protected else processable).append(TextRecord(
+                    index=text_counter,
+                    doc_index=f"table_{t_idx}_{r_idx}_{c_idx}_{p_idx}",
+                    original_text=ptext,
+                    current_text=ptext,
+                    paragraph_obj=para,
+                    type='table',
+                    protected=is_protected,
+                    location=f'Tabela {t_idx+1}, Célula ({r_idx+1},{c_idx+1})',
+                    content_type=None if is_protected else self._detect_content_type(ptext)
+                ))
+            
+            self.logger.info(f"Total de textos mapeados: {len(processable) + len(protected)}")
             
+            # 4. Processáveis e protegidos
             self.logger.info(f"Textos processáveis: {len(processable)}")
             self.logger.info(f"Textos protegidos: {len(protected)} (apenas alternativas e BNCC)")
             
@@ -145,34 +222,35 @@ class DocumentProcessor:
             blocks = self._create_mixed_blocks(processable)
             self.logger.info(f"Criados {len(blocks)} blocos para análise")
             
-            # 6. Processa cada bloco
+            # 6. Analisa todos os blocos (são independentes): em lote ou em paralelo
+            block_texts = [self._prepare_mixed_block(block) for block in blocks]
+            block_results = self._analyze_with_cache(block_texts, callback)
+            
+            # Aplica as correções em sequência (objetos do python-docx não são thread-safe)
             all_corrections = []
             corrections_by_index = {}  # Para rastreamento
             
-            for block_idx, block in enumerate(blocks):
-                if callback:
-                    callback(block_idx + 1, len(blocks), 
-                            f"Analisando bloco {block_idx+1}/{len(blocks)}")
-                
+            # Contagens para o relatório, acumuladas à medida que as correções entram
+            counts = {'paragraph': 0, 'table': 0, 'auto': 0}
+            by_error_type = Counter()
+            
+            for block_idx, (block, corrections) in enumerate(zip(blocks, block_results)):
                 # Info do bloco
                 block_info = f"Bloco {block_idx+1}: {len(block)} textos"
-                if any(t['type'] == 'table' for t in block):
-                    table_count = sum(1 for t in block if t['type'] == 'table')
+                if any(t.type == 'table' for t in block):
+                    table_count = sum(1 for t in block if t.type == 'table')
                     block_info += f" ({table_count} de tabelas)"
                 self.logger.info(block_info)
                 
-                # Prepara texto
-                block_text = self._prepare_mixed_block(block)
-                
-                # Analisa
-                corrections = self.api_client.identify_errors_precise(block_text, block_idx)
-                
                 if corrections:
                     self.logger.info(f"  {len(corrections)} correções sugeridas")
                     
+                    # Índice número → texto, montado uma vez por bloco
+                    by_index = {t.index: t for t in block}
+                    
                     for corr in corrections:
                         # Encontra o texto correspondente
-                        text_data = self._find_text_in_block(block, corr)
+                        text_data = self._find_text_in_block(block, corr, by_index)
                         
                         if text_data:
                             # Valida e aplica
@@ -182,97 +260,171 @@ class DocumentProcessor:
                                 if success:
                                     correction_record = {
                                         'block': block_idx + 1,
-                                        'text_index': text_data['index'],
-                                        'location': text_data['location'],
-                                        'type': text_data['type'],
+                                        'text_index': text_data.index,
+                                        'location': text_data.location,
+                                        'type': text_data.type,
                                         'error': corr.get('error', ''),
                                         'correction': corr.get('correction', ''),
                                         'error_type': corr.get('type', ''),
-                                        'original_text': text_data['original_text'],
-                                        'corrected_text': text_data['paragraph_obj'].text
+                                        'original_text': text_data.original_text,
+                                        'corrected_text': text_data.paragraph_obj.text
                                     }
                                     all_corrections.append(correction_record)
-                                    corrections_by_index[text_data['index']] = correction_record
+                                    corrections_by_index[text_data.index] = correction_record
+                                    counts[text_data.type] += 1
+                                    by_error_type[correction_record['error_type']] += 1
                                     
-                                    self.logger.info(f"  ✓ Aplicada em {text_data['location']}: '{corr['error']}' → '{corr['correction']}'")
+                                    self.logger.info(f"  ✓ Aplicada em {text_data.location}: '{corr['error']}' → '{corr['correction']}'")
             
             # 7. Verifica se há mudanças não detectadas pela API
             self.logger.info("Verificando integridade das correções...")
-            for text_data in all_texts:
-                current = text_data['paragraph_obj'].text
-                original = text_data['original_text']
+            for text_data in chain(processable, protected):
+                # Textos já registrados dispensam reler os runs do parágrafo
+                if text_data.index in corrections_by_index:
+                    continue
                 
-                if current != original and text_data['index'] not in corrections_by_index:
+                current = text_data.paragraph_obj.text
+                original = text_data.original_text
+                
+                if current != original:
                     # Mudança não registrada!
-                    self.logger.warning(f"Mudança não detectada no texto {text_data['index']}: {text_data['location']}")
+                    self.logger.warning(f"Mudança não detectada no texto {text_data.index}: {text_data.location}")
                     
                     # Analisa a diferença
                     diff = self._analyze_difference(original, current)
                     all_corrections.append({
                         'block': 'auto',
-                        'text_index': text_data['index'],
-                        'location': text_data['location'],
-                        'type': text_data['type'],
+                        'text_index': text_data.index,
+                        'location': text_data.location,
+                        'type': text_data.type,
                         'error': diff['error'],
                         'correction': diff['correction'],
                         'error_type': 'auto-detectado',
                         'original_text': original,
                         'corrected_text': current
                     })
+                    counts[text_data.type] += 1
+                    counts['auto'] += 1
+                    by_error_type['auto-detectado'] += 1
             
             # 8. Salva documento
             doc.save(output_path)
             
             self.logger.info(f"=== PROCESSAMENTO CONCLUÍDO ===")
             self.logger.info(f"Total de correções: {len(all_corrections)}")
-            self.logger.info(f"Em parágrafos: {sum(1 for c in all_corrections if c['type'] == 'paragraph')}")
-            self.logger.info(f"Em tabelas: {sum(1 for c in all_corrections if c['type'] == 'table')}")
+            self.logger.info(f"Em parágrafos: {counts['paragraph']}")
+            self.logger.info(f"Em tabelas: {counts['table']}")
             
             # 9. Salva relatório
-            self._save_complete_report(output_path, all_corrections, protected)
+            self._save_complete_report(output_path, all_corrections, protected, counts, by_error_type)
             
             return output_path
-            
+        
         except Exception as e:
             self.logger.error(f"Erro no processamento: {str(e)}")
             raise
     
-    def _is_really_protected(self, text: str) -> bool:
-        """Protege APENAS o que realmente não deve ser alterado"""
-        # Alternativas de questões (a), b), c) etc
-        if re.match(r'^[a-eA-E][\)\.][\s]', text):
-            return True
+    def _analyze_with_cache(self, block_texts: List[str], callback=None) -> List[List[Dict]]:
+        """Correções de cada bloco: do cache em disco ou da API (em lote ou em paralelo)"""
+        keys = [ResponseCache.key(self.model, text) for text in block_texts]
+        if self.response_cache is not None:
+            results = [self.response_cache.get(key) for key in keys]
+        else:
+            results = [None] * len(block_texts)
+        
+        pending = [(text, i) for i, text in enumerate(block_texts) if results[i] is None]
+        if len(pending) < len(block_texts):
+            self.logger.info(f"{len(block_texts) - len(pending)} blocos reaproveitados do cache")
+        
+        def store(block_idx: int, corrections: List[Dict]):
+            # Guardada logo que chega: se a execução cair no meio, a próxima
+            # retoma dali. Falha da API não é guardada; "nenhuma correção" é
+            # (o bloco não volta à API)
+            if not isinstance(corrections, NoAnswer) and self.response_cache is not None:
+                self.response_cache.set(keys[block_idx], corrections)
+        
+        if pending:
+            if self.batch_mode:
+                fetched = self.api_client.identify_errors_bulk(pending, callback, on_result=store)
+            else:
+                fetched = asyncio.run(self._analyze_blocks(pending, callback, on_result=store))
+            
+            for (_, i), corrections in zip(pending, fetched):
+                results[i] = corrections
         
-        # Códigos BNCC
-        if re.search(r'\b(EF\d{2}[A-Z]{2}\d{2}|EM\d{2}[A-Z]{2}\d{2})\b', text):
-            return True
+        return [corrections or [] for corrections in results]
+    
+    async def _analyze_blocks(self, prompts: List[tuple], callback=None, on_result=None) -> List[List[Dict]]:
+        """Envia todos os blocos à API ao mesmo tempo, limitado por um semáforo
+        
+        Args:
+            prompts: Lista de tuplas (texto do bloco, índice do bloco)
+            on_result: Recebe (índice do bloco, correções) assim que cada bloco termina
+        """
+        semaphore = asyncio.Semaphore(self.max_concurrent_requests)
+        total = len(prompts)
+        done = 0
+        
+        async def analyze(block_idx: int, block_text: str) -> List[Dict]:
+            nonlocal done
+            async with semaphore:
+                corrections = await self.api_client.identify_errors_precise_async(block_text, block_idx)
+            if on_result:
+                on_result(block_idx, corrections)
+            
+            # Tudo roda na mesma thread do event loop: o contador dispensa lock
+            done += 1
+            if callback:
+                callback(done, total, f"Analisando bloco {done}/{total}")
+            return corrections
+        
+        # gather devolve os resultados na ordem dos blocos
+        return await asyncio.gather(*(analyze(i, text) for text, i in prompts))
+    
+    def _protection_flags(self, texts: List[str]) -> List[bool]:
+        """_is_really_protected para cada texto, em paralelo quando compensa
         
-        # Links completos (não corrige URLs)
-        if re.search(r'https?://[^\s]+', text):
-            return True
+        O re do CPython não libera o GIL, então threads não ajudariam: documentos
+        grandes vão para um pool de processos; com poucos textos o custo de
+        pickle não compensa.
+        """
+        workers = os.cpu_count() or 1
+        if len(texts) < self.parallel_min_texts or workers < 2:
+            return [self._is_really_protected(text) for text in texts]
         
-        # Referências bibliográficas (padrão ABNT)
-        if re.match(r'^[A-Z]+,\s+[A-Z][a-z]+', text) and 'Editora' in text:
+        try:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+                return list(executor.map(DocumentProcessor._is_really_protected, texts, chunksize=256))
+        except (OSError, concurrent.futures.process.BrokenProcessPool) as e:
+            # Ambientes sem multiprocessamento (ex.: executável congelado) - segue em série
+            self.logger.warning(f"Classificação paralela indisponível, processando em série: {str(e)}")
+            return [self._is_really_protected(text) for text in texts]
+    
+    @staticmethod
+    def _is_really_protected(text: str) -> bool:
+        """Protege APENAS o que realmente não deve ser alterado"""
+        # Alternativas, códigos BNCC, links e citações longas indentadas
+        if _RE_PROTECTED.search(text):
             return True
         
-        # Gabarito
-        if text.strip().upper().startswith('GABARITO'):
+        # Gabarito (só o início precisa ir para maiúsculas)
+        if text.lstrip()[:8].upper().startswith('GABARITO'):
             return True
         
-        # Citações diretas longas (mais de 3 linhas geralmente)
-        if text.startswith('    ') or text.startswith('\t'):  # Indentado
+        # Referências bibliográficas (padrão ABNT)
+        if 'Editora' in text and _RE_ABNT.match(text):
             return True
         
         return False
     
-    def _create_mixed_blocks(self, texts: List[Dict]) -> List[List[Dict]]:
+    def _create_mixed_blocks(self, texts: List[TextRecord]) -> List[List[TextRecord]]:
         """Cria blocos misturando parágrafos e tabelas"""
         blocks = []
         current_block = []
         current_size = 0
         
         for text_data in texts:
-            text_size = len(text_data['current_text'])
+            text_size = len(text_data.current_text)
             
             # Cria novo bloco se necessário
             if current_size + text_size > self.max_chunk_size or len(current_block) >= 100:
@@ -289,26 +441,28 @@ class DocumentProcessor:
         
         return blocks
     
-    def _prepare_mixed_block(self, block: List[Dict]) -> str:
+    def _prepare_mixed_block(self, block: List[TextRecord]) -> str:
         """Prepara bloco com parágrafos e tabelas"""
-        block_text = f"BLOCO COM {len(block)} TEXTOS\n\n"
-        block_text += "Corrija TODOS os erros de português encontrados.\n\n"
+        # Junta as partes no final: += em laço recopiaria o bloco inteiro a cada texto
+        parts = [
+            f"BLOCO COM {len(block)} TEXTOS\n\n",
+            "Corrija TODOS os erros de português encontrados.\n\n"
+        ]
         
         for text_data in block:
-            block_text += f"[TEXTO {text_data['index']}]\n"
-            block_text += f"[TIPO: {text_data['type'].upper()}]\n"
+            parts.append(f"[TEXTO {text_data.index}]\n")
+            parts.append(f"[TIPO: {text_data.type.upper()}]\n")
             
-            if text_data['type'] == 'table':
-                block_text += f"[LOCALIZAÇÃO: {text_data['location']}]\n"
+            if text_data.type == 'table':
+                parts.append(f"[LOCALIZAÇÃO: {text_data.location}]\n")
             
-            # Marca tipo de conteúdo
-            content_type = self._detect_content_type(text_data['current_text'])
-            block_text += f"[CONTEÚDO: {content_type}]\n"
+            # Marca tipo de conteúdo (classificado no mapeamento)
+            parts.append(f"[CONTEÚDO: {text_data.content_type}]\n")
             
-            block_text += text_data['current_text'] + "\n"
-            block_text += f"[FIM_TEXTO_{text_data['index']}]\n\n"
+            parts.append(text_data.current_text + "\n")
+            parts.append(f"[FIM_TEXTO_{text_data.index}]\n\n")
         
-        return block_text
+        return "".join(parts)
     
     def _detect_content_type(self, text: str) -> str:
         """Detecta o tipo de conteúdo com mais precisão"""
@@ -325,7 +479,7 @@ class DocumentProcessor:
             return "POSSÍVEL VERSO"
         
         # URL/Link
-        elif re.search(r'https?://', text):
+        elif 'http://' in text or 'https://' in text:
             return "CONTÉM LINK"
         
         # Citação com aspas
@@ -333,38 +487,46 @@ class DocumentProcessor:
             return "CITAÇÃO"
         
         # Referência bibliográfica
-        elif re.search(r'\b\d{4}\b', text) and any(word in text for word in ['Editora', 'ed.', 'p.', 'In:']):
+        elif any(word in text for word in ('Editora', 'ed.', 'p.', 'In:')) and _RE_YEAR.search(text):
             return "REFERÊNCIA"
         
         else:
             return "TEXTO NORMAL"
     
-    def _find_text_in_block(self, block: List[Dict], correction: Dict) -> Dict:
-        """Encontra texto no bloco pela correção"""
+    def _find_text_in_block(self, block: List[TextRecord], correction: Dict,
+                            by_index: Dict[int, TextRecord] = None) -> TextRecord:
+        """Encontra texto no bloco pela correção
+        
+        `by_index` (número do texto → registro) pode ser reaproveitado entre as
+        correções do mesmo bloco.
+        """
+        if by_index is None:
+            by_index = {t.index: t for t in block}
+        
         # Tenta pelo número do texto
         text_num = correction.get('paragraph', correction.get('text', 0))
         error_text = correction.get('error', '')
         
-        for text_data in block:
-            if text_data['index'] == text_num:
-                if error_text in text_data['current_text']:
-                    return text_data
+        text_data = by_index.get(text_num)
+        if text_data is not None and error_text in text_data.current_text:
+            return text_data
         
         # Tenta só pelo conteúdo
         for text_data in block:
-            if error_text in text_data['current_text']:
+            if error_text in text_data.current_text:
                 return text_data
         
         return None
     
-    def _should_apply_correction(self, text_data: Dict, correction: Dict) -> bool:
+    def _should_apply_correction(self, text_data: TextRecord, correction: Dict) -> bool:
         """Validação antes de aplicar - equilibrada"""
-        text = text_data['current_text']
+        text = text_data.current_text
         error = correction.get('error', '')
         fix = correction.get('correction', '')
         
-        # Verifica se o erro existe
-        if error not in text:
+        # Verifica se o erro existe (a posição serve também para a checagem de aspas)
+        error_pos = text.find(error)
+        if error_pos < 0:
             return False
         
         # Não altera demonstrativos
@@ -378,111 +540,145 @@ class DocumentProcessor:
             return False
         
         # Cuidado com citações - verifica se está dentro de aspas
-        if any(quote in text for quote in ['"', '"', '"']):
-            # Encontra posição do erro
-            error_pos = text.find(error)
-            if error_pos > -1:
-                # Conta aspas antes do erro
-                before_text = text[:error_pos]
-                quotes_before = sum(before_text.count(q) for q in ['"', '"', '"'])
-                
-                # Se número ímpar, está dentro de aspas
-                if quotes_before % 2 == 1:
-                    self.logger.info(f"Rejeitada: dentro de citação")
-                    return False
+        if '"' in text:
+            # Conta aspas antes do erro, sem copiar o trecho
+            quotes_before = text.count('"', 0, error_pos)
+            
+            # Se número ímpar, está dentro de aspas
+            if quotes_before % 2 == 1:
+                self.logger.info(f"Rejeitada: dentro de citação")
+                return False
         
         # Se é poema/verso (identificado pelo tipo de conteúdo)
-        if text_data.get('protection_reason') == 'citação/poema':
+        if text_data.protection_reason == 'citação/poema':
             self.logger.info(f"Rejeitada: conteúdo de poema/citação")
             return False
         
         return True
     
-    def _apply_correction_safe(self, text_data: Dict, correction: Dict) -> bool:
-        """Aplica correção com segurança"""
+    def _apply_correction_safe(self, text_data: TextRecord, correction: Dict) -> bool:
+        """Aplica correção com segurança
+        
+        Só o texto dos runs que o erro atinge muda (mantém a formatação e não
+        recria o parágrafo): a correção entra no run onde o erro começa; se o
+        erro atravessa runs, os do meio ficam vazios e o último perde só a
+        parte do erro.
+        """
         try:
-            paragraph = text_data['paragraph_obj']
-            original_text = paragraph.text
+            paragraph = text_data.paragraph_obj
             error = correction.get('error', '')
             fix = correction.get('correction', '')
             
-            if not error or not fix or error not in original_text:
+            if not error or not fix:
                 return False
             
-            # Aplica uma vez
-            new_text = original_text.replace(error, fix, 1)
+            # Runs reaproveitados entre correções do mesmo parágrafo
+            runs = text_data.runs
+            if runs is None:
+                runs = text_data.runs = paragraph.runs
+            run_texts = [run.text for run in runs]
+            original_text = ''.join(run_texts)  # O mesmo que paragraph.text
+            
+            # Aplica uma vez (uma só busca: find + fatias)
+            pos = original_text.find(error)
+            if pos < 0:
+                return False
+            new_text = original_text[:pos] + fix + original_text[pos + len(error):]
             
             # Validação final
             if abs(len(new_text) - len(original_text)) > 20:
                 return False
             
-            paragraph.text = new_text
+            # Edita só os runs que o erro atinge
+            error_end = pos + len(error)
+            run_start = 0
+            for run, run_text in zip(runs, run_texts):
+                run_end = run_start + len(run_text)
+                if run_end > pos:
+                    head = run_text[:pos - run_start] + fix if run_start <= pos else ''
+                    tail = run_text[error_end - run_start:] if error_end <= run_end else ''
+                    run.text = head + tail
+                    if error_end <= run_end:
+                        break
+                run_start = run_end
             return True
-            
+        
         except Exception as e:
             self.logger.error(f"Erro ao aplicar: {str(e)}")
             return False
     
     def _analyze_difference(self, original: str, current: str) -> Dict:
         """Analisa diferença entre textos"""
-        import difflib
-        
         # Casos especiais
         if current == original + '.':
             return {'error': '[faltava ponto final]', 'correction': '.'}
         
         # Análise por palavras
-        s = difflib.SequenceMatcher(None, original.split(), current.split())
+        orig_words = original.split()
+        current_words = current.split()
         
-        for tag, i1, i2, j1, j2 in s.get_opcodes():
-            if tag == 'replace':
+        if Levenshtein is not None:
+            # Implementação em C++, bem mais rápida que o SequenceMatcher
+            opcodes = [tuple(op) for op in Levenshtein.opcodes(orig_words, current_words)]
+        else:
+            opcodes = difflib.SequenceMatcher(None, orig_words, current_words).get_opcodes()
+        
+        # Primeira mudança; operações vizinhas (ex.: replace + insert do Levenshtein)
+        # formam um trecho só, como o replace do difflib
+        changed = [op for op in opcodes if op[0] != 'equal']
+        if changed:
+            _, i1, i2, j1, j2 = changed[0]
+            for _, k1, k2, l1, l2 in changed[1:]:
+                if k1 != i2 or l1 != j2:
+                    break
+                i2, j2 = k2, l2
+            
+            if i1 < i2 and j1 < j2:
                 return {
-                    'error': ' '.join(original.split()[i1:i2]),
-                    'correction': ' '.join(current.split()[j1:j2])
+                    'error': ' '.join(orig_words[i1:i2]),
+                    'correction': ' '.join(current_words[j1:j2])
                 }
-            elif tag == 'insert':
+            elif j1 < j2:
                 return {
                     'error': '[faltando]',
-                    'correction': ' '.join(current.split()[j1:j2])
+                    'correction': ' '.join(current_words[j1:j2])
                 }
-            elif tag == 'delete':
+            else:
                 return {
-                    'error': ' '.join(original.split()[i1:i2]),
+                    'error': ' '.join(orig_words[i1:i2]),
                     'correction': '[removido]'
                 }
         
         return {'error': 'mudança detectada', 'correction': 'texto alterado'}
     
-    def _save_complete_report(self, output_path: str, corrections: List[Dict], protected: List[Dict]):
-        """Salva relatório completo"""
+    def _save_complete_report(self, output_path: str, corrections: List[Dict], protected: List[TextRecord],
+                              counts: Dict[str, int], by_error_type: Dict[str, int]):
+        """Salva relatório completo
+        
+        `counts` (por tipo de texto e 'auto') e `by_error_type` já vêm contados
+        pelo processamento, sem varrer as correções de novo.
+        """
         report_path = output_path.replace('.docx', '_relatorio_completo.json')
         
         # Estatísticas
         stats = {
             'total_correcoes': len(corrections),
-            'em_paragrafos': sum(1 for c in corrections if c['type'] == 'paragraph'),
-            'em_tabelas': sum(1 for c in corrections if c['type'] == 'table'),
-            'auto_detectadas': sum(1 for c in corrections if c.get('block') == 'auto'),
+            'em_paragrafos': counts['paragraph'],
+            'em_tabelas': counts['table'],
+            'auto_detectadas': counts['auto'],
             'textos_protegidos': len(protected)
         }
         
-        # Por tipo de erro
-        by_error_type = {}
-        for corr in corrections:
-            err_type = corr.get('error_type', 'outros')
-            by_error_type[err_type] = by_error_type.get(err_type, 0) + 1
-        
         report = {
             'resumo': stats,
-            'por_tipo_erro': by_error_type,
+            'por_tipo_erro': dict(by_error_type),
             'todas_correcoes': corrections,
             'textos_protegidos': [
-                {'index': p['index'], 'location': p['location'], 'preview': p['current_text'][:50]}
+                {'index': p.index, 'location': p.location, 'preview': p.current_text[:50]}
                 for p in protected
             ]
         }
         
-        with open(report_path, 'w', encoding='utf-8') as f:
-            json.dump(report, f, ensure_ascii=False, indent=2)
+        JSONHandler.save(report_path, report)
         
         self.logger.info(f"Relatório salvo: {report_path}")
\ No newline at end of file
@@ -1,9 +1,37 @@
+import re
 import time
+import hashlib
+import asyncio
 import logging
-from typing import List, Dict, Optional
-from dataclasses import dataclass
+import threading
+from pathlib import Path
+from functools import lru_cache
+from operator import attrgetter
+from itertools import combinations
+from typing import ClassVar, List, Dict, Optional, Tuple
+from dataclasses import dataclass, replace
 
-@dataclass
+try:
+    from . import prompts_compiled
+except ImportError:  # Sem a versão gerada por compile_prompts.py: compacta na inicialização
+    prompts_compiled = None
+
+_LOGGER = logging.getLogger(__name__)
+_PRIORITY = attrgetter('priority')  # Chave de ordenação em C, sem lambda
+
+# Regra de segurança comum a todos os modos: fica só no módulo de proteções,
+# que entra em todas as sequências, em vez de repetida em cada módulo
+CRITICAL_RULES = "IMPORTANTE: Na dúvida, NÃO ALTERE. É melhor preservar um texto com erro do que alterar uma citação original."
+
+# Conteúdo de cada módulo fica em prompts/<nome>.txt
+PROMPTS_DIR = Path(__file__).parent / "prompts"
+
+@lru_cache(maxsize=None)
+def _load(name: str) -> str:
+    """Lê o texto de um módulo (uma vez por processo)"""
+    return (PROMPTS_DIR / f"{name}.txt").read_text(encoding='utf-8').rstrip("\n")
+
+@dataclass(frozen=True, slots=True)
 class PromptModule:
     """Módulo individual de prompt"""
     name: str
@@ -13,382 +41,450 @@ class PromptModule:
 class ModularPromptSystem:
     """Sistema modular de prompts otimizado para velocidade"""
     
-    def __init__(self):
-        self.logger = logging.getLogger(__name__)
-        self.delay_between_calls = 50  # 50ms apenas - muito mais rápido
+    # Regras de compactação dos conteúdos (menos tokens por chamada)
+    _RE_ANY_LINE = re.compile(r'^(\s*- QUALQUER linha que comece com: )(.+)$')
+    _RE_NUMBERED_BOLD = re.compile(r'^(\d+\.)\s+\*\*(.+?)\*\*', re.MULTILINE)
+    _RE_INNER_SPACES = re.compile(r'(?<=\S) {2,}')
+    _RE_BLANK_LINES = re.compile(r'\n{3,}')
+    _RE_NUMBERED_ITEM = re.compile(r'^\d+\.\s+(.+)$')
+    
+    # Versão das regras de _compress: entra no hash de prompts_compiled, que
+    # fica desatualizado quando as regras mudam
+    COMPRESS_VERSION = 2
+    
+    # Sobreposição (Jaccard de trigramas de palavras) acima da qual dois
+    # módulos são acusados como redundantes na inicialização
+    OVERLAP_THRESHOLD = 0.2
+    
+    # Partes fixas do prompt: papel do revisor e cabeçalho antes do texto
+    ROLE_LINE = "Você é um revisor de textos educacionais."
+    TEXT_HEADER = "**TEXTO PARA REVISAR:**\n"
+    STAGE_HEADER = "Aplique apenas: "
+    
+    # Módulos que valem para todas as etapas (não viram turno próprio na conversa)
+    ALWAYS_ON = frozenset({"formato", "protecoes"})
+    
+    # Módulos, sequências e cabeçalhos montados uma vez por processo (chave:
+    # compress) e compartilhados por todas as instâncias - o conteúdo é fixo
+    _SHARED: ClassVar[Dict[bool, tuple]] = {}
+    
+    def __init__(self, compress: bool = True, delay_between_calls: int = 50):
+        self.delay_between_calls = delay_between_calls  # ms entre chamadas (50ms - muito mais rápido)
+        
+        # Horário (time.monotonic) reservado para a última chamada
+        self._last_call_ts = 0.0
+        self._slot_lock = threading.Lock()
+        
+        shared = self._SHARED.get(compress)
+        if shared is None:
+            modules = self._build_modules()
+            
+            # Conteúdos compactados uma vez aqui (ou já prontos em prompts_compiled,
+            # se gerados destes mesmos textos); compress=False mantém os originais
+            if compress:
+                compiled = self._compiled_contents(modules)
+                modules = {key: replace(module, content=compiled[key] if compiled else self._compress(module.content))
+                           for key, module in modules.items()}
+            
+            # Módulos de cada modo, montados e ordenados uma vez (não mudam depois);
+            # os dicts vazios são os caches de cabeçalhos estáticos por combinação
+            # de módulos (str e já codificado em UTF-8)
+            shared = self._SHARED[compress] = (modules, self._build_sequences(modules), {}, {})
+            
+            for first, second, score in self._overlapping_modules(modules):
+                _LOGGER.warning(f"Módulos de prompt redundantes: {first} e {second} (Jaccard {score:.2f})")
         
-        # Registra todos os módulos de prompt
-        self.modules = {
+        self.modules, self._sequences, self._prefix_cache, self._prefix_bytes = shared
+        
+        # Cabeçalho estático (tudo antes do texto) já montado para os modos conhecidos
+        for modules in self._sequences.values():
+            self._get_prefix(modules)
+    
+    @classmethod
+    def _build_modules(cls) -> Dict[str, PromptModule]:
+        """Registra todos os módulos de prompt"""
+        return {
             # **MÓDULOS BASE**
-            "formato": self._get_format_module(),
-            "protecoes": self._get_protections_module(),
+            "formato": cls._get_format_module(),
+            "protecoes": cls._get_protections_module(),
             
             # **MÓDULOS DE CORREÇÃO**
-            "erros_graves": self._get_serious_errors_module(),
-            "erros_gramaticais": self._get_grammar_errors_module(),
-            "pontuacao": self._get_punctuation_module(),
+            "erros_graves": cls._get_serious_errors_module(),
+            "erros_gramaticais": cls._get_grammar_errors_module(),
+            "pontuacao": cls._get_punctuation_module(),
             
             # **MÓDULOS DE QUALIDADE**
-            "repeticoes": self._get_repetitions_module(),
-            "redundancias": self._get_redundancy_module(),
-            "fluidez": self._get_fluency_module(),
+            "repeticoes": cls._get_repetitions_module(),
+            "redundancias": cls._get_redundancy_module(),
+            "fluidez": cls._get_fluency_module(),
             
             # **MÓDULOS DIDÁTICOS**
-            "maneirismos_ia": self._get_ai_mannerisms_module(),
-            "linguagem_didatica": self._get_didactic_language_module(),
-            "tratamento_uniforme": self._get_uniform_treatment_module(),
-            "numeros_uniformes_padrao_internacional": self._get_uniform_treatment_module(),
+            "maneirismos_ia": cls._get_ai_mannerisms_module(),
+            "linguagem_didatica": cls._get_didactic_language_module(),
+            "tratamento_uniforme": cls._get_uniform_treatment_module(),
+            "numeros_uniformes_padrao_internacional": cls._get_numeric_formatting_module(),
             
             # **MÓDULO DE SEGMENTAÇÃO**
-            "segmentacao": self._get_segmentation_module(),
+            "segmentacao": cls._get_segmentation_module(),
             
             # **MÓDULO ESPECIAL PARA QUESTÕES**
-            "questoes_com_gabarito": self._get_questions_with_answer_key_module()
+            "questoes_com_gabarito": cls._get_questions_with_answer_key_module()
         }
     
+    @classmethod
+    def source_hash(cls, modules: Dict[str, PromptModule]) -> str:
+        """Hash dos textos originais dos módulos e das regras (valida prompts_compiled)"""
+        digest = hashlib.sha256(f"v{cls.COMPRESS_VERSION}\0".encode('utf-8'))
+        for key in sorted(modules):
+            digest.update(f"{key}\0{modules[key].content}\0".encode('utf-8'))
+        return digest.hexdigest()
+    
+    @classmethod
+    def _compiled_contents(cls, modules: Dict[str, PromptModule]) -> Optional[Dict[str, str]]:
+        """Conteúdos compactados gerados por compile_prompts.py, se ainda valem"""
+        if prompts_compiled is None:
+            return None
+        if prompts_compiled.SOURCE_HASH != cls.source_hash(modules):
+            _LOGGER.debug("prompts_compiled desatualizado - compactando na inicialização")
+            return None
+        return prompts_compiled.MODULES
+    
+    @classmethod
+    def _overlapping_modules(cls, modules: Dict[str, PromptModule]) -> List[Tuple[str, str, float]]:
+        """Pares de módulos com instruções muito parecidas (lint contra regras repetidas)"""
+        shingles = {}
+        for key, module in modules.items():
+            words = re.findall(r'\w+', module.content.lower())
+            shingles[key] = set(zip(words, words[1:], words[2:]))
+        
+        overlapping = []
+        for first, second in combinations(shingles, 2):
+            union = shingles[first] | shingles[second]
+            if union:
+                score = len(shingles[first] & shingles[second]) / len(union)
+                if score > cls.OVERLAP_THRESHOLD:
+                    overlapping.append((first, second, score))
+        return overlapping
+    
+    @classmethod
+    def _compress(cls, text: str) -> str:
+        """Compacta o conteúdo de um módulo sem mudar as regras
+        
+        - junta linhas seguidas "QUALQUER linha que comece com:" em uma só
+        - tira o negrito dos títulos de itens numerados
+        - lista numerada de itens de uma linha (2+) vira "- item; item; item"
+        - reduz espaços repetidos no meio da linha e linhas em branco extras
+        """
+        lines = []
+        for line in text.split("\n"):
+            line = cls._RE_INNER_SPACES.sub(" ", line.rstrip())
+            match = cls._RE_ANY_LINE.match(line)
+            previous = cls._RE_ANY_LINE.match(lines[-1]) if lines else None
+            if match and previous and match.group(1) == previous.group(1):
+                lines[-1] += " | " + match.group(2)
+            else:
+                lines.append(line)
+        
+        text = cls._RE_NUMBERED_BOLD.sub(r"\1 \2", "\n".join(lines))
+        text = cls._compact_numbered_lists(text.split("\n"))
+        return cls._RE_BLANK_LINES.sub("\n\n", text)
+    
+    @classmethod
+    def _compact_numbered_lists(cls, lines: List[str]) -> str:
+        """Junta sequências de itens numerados simples numa linha só
+        
+        Item simples: não termina em ":" nem tem subitens indentados logo abaixo
+        (esses são títulos de seção e ficam como estão).
+        """
+        out = []
+        run = []
+        for k, line in enumerate(lines):
+            match = cls._RE_NUMBERED_ITEM.match(line)
+            following = lines[k + 1] if k + 1 < len(lines) else ""
+            if match and not line.endswith(":") and not following.startswith((" ", "\t")):
+                run.append((line, match.group(1)))
+                continue
+            
+            out.extend(cls._join_items(run))
+            run = []
+            out.append(line)
+        out.extend(cls._join_items(run))
+        
+        return "\n".join(out)
+    
+    @staticmethod
+    def _join_items(run: List[Tuple[str, str]]) -> List[str]:
+        """Linha única para uma sequência de 2+ itens; item isolado fica como está"""
+        if len(run) < 2:
+            return [line for line, _ in run]
+        return ["- " + "; ".join(item for _, item in run)]
+    
     # **MÓDULOS BASE**
     
-    def _get_format_module(self) -> PromptModule:
+    @staticmethod
+    def _get_format_module() -> PromptModule:
         """Módulo de formato de resposta"""
         return PromptModule(
             name="formato",
-            content="""**FORMATO DE RESPOSTA**
-Retorne APENAS um JSON válido:
-{
-  "corrections": [
-    {
-      "paragraph": 1,
-      "error": "texto com erro",
-      "correction": "texto corrigido",
-      "type": "tipo do erro"
-    }
-  ]
-}
-
-Se não houver correções: {"corrections": []                }"""
+            content=_load("formato")
         )
     
-    def _get_questions_with_answer_key_module(self) -> PromptModule:
+    @staticmethod
+    def _get_questions_with_answer_key_module() -> PromptModule:
         """Módulo especial para questões com gabarito"""
         return PromptModule(
             name="questoes_com_gabarito",
-            content="""**REVISÃO ESPECIAL DE QUESTÕES COM GABARITO**
-
-INSTRUÇÕES CRÍTICAS:
-
-1. **IDENTIFICAÇÃO AUTOMÁTICA**:
-   - Linhas marcadas com [ALTERNATIVA_CORRETA] = alternativa correta segundo o gabarito
-   - Linhas marcadas com [ALTERNATIVA_INCORRETA] = alternativas incorretas
-   - O sistema já identificou qual é qual baseado no gabarito
-
-2. **PARA [ALTERNATIVA_INCORRETA]**:
-   - Corrija APENAS erros gramaticais, ortográficos e de pontuação
-   - NUNCA corrija conteúdo factual (está errado de propósito!)
-   - NUNCA altere informações técnicas, datas, nomes ou conceitos
-   - Exemplo: "São Paulo é a capital do Brazil" → "São Paulo é a capital do Brasil"
-   - NÃO mude para "Brasília é a capital do Brasil" (isso é correção factual!)
-
-3. **PARA [ALTERNATIVA_CORRETA]**:
-   - Corrija TODOS os erros: gramática, ortografia, pontuação E factualidade
-   - Garanta que a informação está 100% correta
-   - Exemplo: "Brazília é a capital do Brazil" → "Brasília é a capital do Brasil"
-
-4. **IMPORTANTE**:
-   - Se não houver marcação [ALTERNATIVA_CORRETA/INCORRETA], trate como texto normal
-   - O gabarito em si (ex: "Gabarito: C") só precisa correção gramatical""",
+            content=_load("questoes_com_gabarito"),
             priority=11
         )
     
-    def _get_protections_module(self) -> PromptModule:
+    @staticmethod
+    def _get_protections_module() -> PromptModule:
         """Módulo de conteúdo protegido"""
         return PromptModule(
             name="protecoes",
-            content="""**CONTEÚDO PROTEGIDO - NUNCA ALTERE**
-
-REGRA ABSOLUTA: Os seguintes conteúdos NUNCA devem ser modificados:
-
-1. **ALTERNATIVAS DE QUESTÕES**
-   - QUALQUER linha que comece com: a), b), c), d), e)
-   - QUALQUER linha que comece com: (a), (b), (c), (d), (e)
-   - QUALQUER linha que comece com: a., b., c., d., e.
-   - QUALQUER linha que comece com: A), B), C), D), E)
-   - Mesmo que contenham erros propositais ou factuais
-
-2. **CITAÇÕES E REFERÊNCIAS**
-   - Qualquer texto entre aspas com atribuição de autoria
-   - Textos com fonte indicada (Fonte:, Referência:, Extraído de:, Adaptado de:)
-   - Textos seguidos de referência bibliográfica ou URL
-   - Textos da Wikipedia ou qualquer outra fonte online
-   - Qualquer parágrafo que termine com indicação de fonte
-   - Textos indentados ou em itálico que sejam citações
-   - Blocos de texto seguidos por autor, data ou fonte
-
-3. **POEMAS E TEXTOS LITERÁRIOS**
-   - Versos de poemas (linhas curtas sem pontuação final)
-   - Textos com estrutura poética ou literária
-   - Letras de músicas
-   - Trechos de obras literárias
-
-4. **OUTROS PROTEGIDOS**
-   - Códigos BNCC (EF01LP01, EM13LGG101, etc)
-   - URLs e links completos
-   - Referências bibliográficas completas
-   - Gabaritos de questões
-   - Exemplos de erros (quando indicado)
-   - Fórmulas matemáticas e químicas
-
-IMPORTANTE: Na dúvida, NÃO ALTERE. É melhor preservar um texto com erro do que alterar uma citação original."""
+            content=_load("protecoes") + "\n\n" + CRITICAL_RULES
         )
     
     # **MÓDULOS DE CORREÇÃO BÁSICA**
     
-    def _get_serious_errors_module(self) -> PromptModule:
+    @staticmethod
+    def _get_serious_errors_module() -> PromptModule:
         """Módulo para erros graves apenas"""
         return PromptModule(
             name="erros_graves",
-            content="""**CORRIJA APENAS ERROS GRAVÍSSIMOS**
-1. Erros de digitação óbvios (computadr → computador)
-2. Ortografia grotescamente errada (ezemplo → exemplo)
-3. Concordância completamente errada (os menino → os meninos)
-4. Acentuação faltando em palavras básicas (voce → você)
-5. Pontuação duplicada (.., ,, → . ,)
-6. Falta de espaço óbvia (amesa → a mesa)
-
-**NA DÚVIDA, NÃO CORRIJA!**""",
+            content=_load("erros_graves"),
             priority=1
         )
     
-    def _get_grammar_errors_module(self) -> PromptModule:
+    @staticmethod
+    def _get_grammar_errors_module() -> PromptModule:
         """Módulo para todos os erros gramaticais"""
         return PromptModule(
             name="erros_gramaticais",
-            content="""**CORRIJA TODOS OS ERROS GRAMATICAIS**
-1. Ortografia incorreta
-2. Concordância verbal e nominal
-3. Regência verbal e nominal
-4. Acentuação incorreta ou faltando
-5. Crase incorreta ou faltando
-6. Uso incorreto de pronomes
-7. Conjugação verbal errada""",
+            content=_load("erros_gramaticais"),
             priority=2
         )
     
-    def _get_punctuation_module(self) -> PromptModule:
+    @staticmethod
+    def _get_punctuation_module() -> PromptModule:
         """Módulo específico para pontuação"""
         return PromptModule(
             name="pontuacao",
-            content="""**CORRIJA PONTUAÇÃO**
-1. Falta de ponto final em parágrafos
-2. Vírgulas obrigatórias faltando
-3. Pontuação antes de conjunções
-4. Dois-pontos e ponto-e-vírgula incorretos
-5. Aspas e parênteses desbalanceados
-6. Espaços incorretos com pontuação""",
+            content=_load("pontuacao"),
             priority=3
         )
     
     # **MÓDULOS DE QUALIDADE**
     
-    def _get_repetitions_module(self) -> PromptModule:
+    @staticmethod
+    def _get_repetitions_module() -> PromptModule:
         """Módulo para repetições"""
         return PromptModule(
             name="repeticoes",
-            content="""**REMOVA REPETIÇÕES DESNECESSÁRIAS**
-1. Palavra repetida em sequência (o o → o)
-2. Mesma palavra 3+ vezes em 2 linhas
-3. Início de frases consecutivas iguais
-4. Repetição de conectivos próximos""",
+            content=_load("repeticoes"),
             priority=4
         )
     
-    def _get_redundancy_module(self) -> PromptModule:
+    @staticmethod
+    def _get_redundancy_module() -> PromptModule:
         """Módulo para redundâncias"""
         return PromptModule(
             name="redundancias",
-            content="""**ELIMINE REDUNDÂNCIAS**
-1. Subir para cima → subir
-2. Entrar para dentro → entrar
-3. Sair para fora → sair
-4. Elo de ligação → elo
-5. Planos para o futuro → planos""",
+            content=_load("redundancias"),
             priority=5
         )
     
-    def _get_fluency_module(self) -> PromptModule:
+    @staticmethod
+    def _get_fluency_module() -> PromptModule:
         """Módulo para fluidez"""
         return PromptModule(
             name="fluidez",
-            content="""**MELHORE A FLUIDEZ (MÍNIMO NECESSÁRIO)**
-1. Adicione conectivos essenciais faltando
-2. Complete frases truncadas
-3. Resolva ambiguidades graves
-4. Corrija ordem de palavras confusa""",
+            content=_load("fluidez"),
             priority=6
         )
     
     # **MÓDULOS DIDÁTICOS**
     
-    def _get_ai_mannerisms_module(self) -> PromptModule:
+    @staticmethod
+    def _get_ai_mannerisms_module() -> PromptModule:
         """Módulo para maneirismos de IA"""
         return PromptModule(
             name="maneirismos_ia",
-            content="""**REMOVA MANEIRISMOS DE IA**
-1. Metáforas desnecessárias (é como um quebra-cabeça)
-2. Analogias forçadas (são como temperos)
-3. Juízo de valor (fascinante, incrível, o mais legal)
-4. Perguntas retóricas (Sabe quando...? Já pensou...?)
-5. Saudações diretas (Olá, estudantes!)
-6. Verbos informais (vamos mergulhar, vamos explorar)
-7. Adjetivação excessiva (super interessante, muito mais divertido)""",
+            content=_load("maneirismos_ia"),
             priority=7
         )
     
-    def _get_didactic_language_module(self) -> PromptModule:
+    @staticmethod
+    def _get_didactic_language_module() -> PromptModule:
         """Módulo para linguagem didática"""
         return PromptModule(
             name="linguagem_didatica",
-            content="""**ADEQUE PARA LINGUAGEM DIDÁTICA**
-1. Substitua informalidades (tipo → como, né → não é)
-2. Remova diminutivos desnecessários (tudinho → tudo)
-3. Elimine gírias e expressões coloquiais
-4. Mantenha vocabulário apropriado para idade
-5. Use termos técnicos com explicação quando necessário""",
+            content=_load("linguagem_didatica"),
             priority=8
         )
     
-    def _get_uniform_treatment_module(self) -> PromptModule:
+    @staticmethod
+    def _get_uniform_treatment_module() -> PromptModule:
         """Módulo para tratamento uniforme"""
         return PromptModule(
             name="tratamento_uniforme",
-            content="""**PADRONIZE O TRATAMENTO**
-1. Use sempre SINGULAR (você, não vocês)
-2. Evite "a gente" → use "nós" ou reformule
-3. Mantenha impessoalidade quando apropriado
-4. Evite se dirigir diretamente ao leitor em excesso""",
+            content=_load("tratamento_uniforme"),
             priority=9
         )
     
-    def _get_uniform_treatment_module(self) -> PromptModule:
+    @staticmethod
+    def _get_numeric_formatting_module() -> PromptModule:
         """Módulo para tratamento uniforme de números e unidades."""
         return PromptModule(
             name="numeros_uniformes_padrao_internacional",
-            content="""**REGRAS DE FORMATAÇÃO NUMÉRICA (PADRÃO INTERNACIONAL)**
-
-1.  **SEPARADOR DE MILHARES**:
-    * Todos os números com quatro ou mais dígitos devem ter seus grupos de três dígitos separados por um **espaço fino não separável (Unicode `U+202F`)**.
-    * É estritamente **proibido** o uso de pontos (`.`) ou vírgulas (`,`) como separadores de milhares.
-    * **Exemplos de aplicação**:
-        * `1000` deve ser formatado como `1 000`
-        * `12345` deve ser formatado como `12 345`
-        * `1500000` deve ser formatado como `1 500 000`
-
-2.  **NÚMERO E UNIDADE**:
-    * Sempre utilize um **espaço não separável (Unicode `U+00A0`)** entre um número e sua respectiva unidade de medida (ex: cm, kg, km/h, R$).
-    * Esta regra garante que o número e sua unidade nunca sejam separados por uma quebra de linha.
-    * **Exemplos de aplicação**:
-        * `10cm` ou `10 cm` (com espaço comum) deve ser formatado como `10 cm` (com `U+00A0`).
-        * `R$50` deve ser formatado como `R$ 50` (com `U+00A0`).
-        * `78km` deve ser formatado como `78 km` (com `U+00A0`).
-
-3.  **INTEGRIDADE NUMÉRICA**:
-    * Um número completo, incluindo seus separadores de milhares e sua unidade (se aplicável), deve ser tratado como um bloco único e indivisível, **sempre permanecendo na mesma linha**. As regras acima garantem essa condição.""",
+            content=_load("numeros_uniformes_padrao_internacional"),
         priority=10
     )
     
     # **MÓDULO DE SEGMENTAÇÃO**
     
-    def _get_segmentation_module(self) -> PromptModule:
+    @staticmethod
+    def _get_segmentation_module() -> PromptModule:
         """Módulo para análise de segmentação"""
         return PromptModule(
             name="segmentacao",
-            content="""**ANÁLISE DE SEGMENTAÇÃO DE BLOCO**
-Analise o texto e indique onde seria ideal cortar este bloco:
-
-1. **Procure por quebras naturais**:
-   - Fim de seção ou tópico
-   - Mudança de assunto
-   - Transição entre conceitos
-   - Após conclusão de ideia
-
-2. **Evite cortar**:
-   - No meio de parágrafos
-   - Durante explicações
-   - Entre pergunta e resposta
-   - No meio de listas
-
-3. **Tamanho ideal**: 2-3 páginas (aproximadamente 10-15 parágrafos)
-
-Retorne:
-{
-  "ideal_cut_point": número_do_parágrafo,
-  "reason": "motivo da escolha",
-  "confidence": 0.0-1.0
-}"""
+            content=_load("segmentacao")
         )
     
-    def get_prompt_sequence(self, mode: str) -> List[PromptModule]:
-        """Retorna sequência de prompts baseada no modo"""
+    @staticmethod
+    def _build_sequences(modules: Dict[str, PromptModule]) -> Dict[str, Tuple[PromptModule, ...]]:
+        """Sequências de módulos de cada modo, ordenadas por prioridade uma vez só"""
         
         sequences = {
             # Modo ULTRA RÁPIDO - apenas o essencial
             "fast": [
-                self.modules["formato"],
-                self.modules["protecoes"],
-                self.modules["erros_gramaticais"],
-                self.modules["pontuacao"]
+                modules["formato"],
+                modules["protecoes"],
+                modules["erros_gramaticais"],
+                modules["pontuacao"]
             ],
             
             "conservador": [
-                self.modules["formato"],
-                self.modules["protecoes"],
-                self.modules["erros_graves"]
+                modules["formato"],
+                modules["protecoes"],
+                modules["erros_graves"]
             ],
             
             "balanceado": [
-                self.modules["formato"],
-                self.modules["protecoes"],
-                self.modules["erros_graves"],
-                self.modules["erros_gramaticais"],
-                self.modules["pontuacao"]
+                modules["formato"],
+                modules["protecoes"],
+                modules["erros_graves"],
+                modules["erros_gramaticais"],
+                modules["pontuacao"]
             ],
             
             "editorial": [
-                self.modules["formato"],
-                self.modules["protecoes"],
-                self.modules["erros_gramaticais"],
-                self.modules["pontuacao"],
-                self.modules["repeticoes"],
-                self.modules["redundancias"],
-                self.modules["fluidez"],
-                self.modules["maneirismos_ia"],
-                self.modules["linguagem_didatica"],
-                self.modules["tratamento_uniforme"],
-                self.modules["segmentacao"],
-                self.modules["questoes_com_gabarito"],
-                self.modules["numeros_uniformes_padrao_internacional"]
+                modules["formato"],
+                modules["protecoes"],
+                modules["erros_gramaticais"],
+                modules["pontuacao"],
+                modules["repeticoes"],
+                modules["redundancias"],
+                modules["fluidez"],
+                modules["maneirismos_ia"],
+                modules["linguagem_didatica"],
+                modules["tratamento_uniforme"],
+                modules["segmentacao"],
+                modules["questoes_com_gabarito"],
+                modules["numeros_uniformes_padrao_internacional"]
             ]
         }
         
-        return sequences.get(mode, sequences["fast"])
+        return {
+            mode: tuple(sorted(selected, key=_PRIORITY))
+            for mode, selected in sequences.items()
+        }
+    
+    def get_prompt_sequence(self, mode: str) -> Tuple[PromptModule, ...]:
+        """Retorna sequência de prompts baseada no modo (já em ordem de prioridade)"""
+        return self._sequences.get(mode, self._sequences["fast"])
     
     def build_prompt(self, modules: List[PromptModule], text: str) -> str:
         """Constrói prompt completo com módulos selecionados"""
-        prompt_parts = [
-            "Você é um revisor de textos educacionais.",
-            ""
-        ]
+        # Só o texto muda entre as chamadas: o cabeçalho vem pronto do cache
+        return f"{self._get_prefix(modules)}{text}"
+    
+    def build_prompt_bytes(self, modules: List[PromptModule], text: str) -> bytes:
+        """Prompt completo já em UTF-8, para clientes HTTP que enviam bytes
         
-        # Adiciona módulos em ordem de prioridade
-        sorted_modules = sorted(modules, key=lambda m: m.priority)
-        for module in sorted_modules:
-            prompt_parts.append(module.content)
-            prompt_parts.append("")
+        O cabeçalho é codificado uma vez por combinação; por chamada só o
+        texto passa pelo encode.
+        """
+        key = tuple(modules)
+        prefix = self._prefix_bytes.get(key)
+        if prefix is None:
+            prefix = self._prefix_bytes[key] = self._get_prefix(modules).encode('utf-8')
+        return prefix + text.encode('utf-8')
+    
+    def build_conversation(self, modules: List[PromptModule], text: str) -> Tuple[str, List[str]]:
+        """Prompt em conversa: um sistema fixo e um turno do usuário por etapa
         
-        prompt_parts.append("**TEXTO PARA REVISAR:**")
-        prompt_parts.append(text)
+        O sistema (papel + todos os módulos) é o mesmo prefixo cacheado de
+        build_prompt, enviado uma vez; cada turno só nomeia a etapa. O texto
+        vai no primeiro turno e as etapas seguintes trabalham sobre ele.
+        """
+        system = self._get_prefix(modules)[:-len(self.TEXT_HEADER) - 2]
+        stages = [module.name for module in modules if module.name not in self.ALWAYS_ON]
+        if not stages:
+            return system, [f"{self.TEXT_HEADER}{text}"]
         
-        return "\n".join(prompt_parts)
+        turns = [f"{self.STAGE_HEADER}{name}" for name in stages]
+        turns[0] = f"{turns[0]}\n\n{self.TEXT_HEADER}{text}"
+        return system, turns
+    
+    def build_prompt_blocks(self, modules: List[PromptModule], text: str) -> Tuple[List[str], str]:
+        """Prompt separado em parte estável (blocos de sistema) e parte variável
+        
+        Os blocos (papel + conteúdo de cada módulo, em ordem fixa de prioridade)
+        são idênticos em todas as chamadas do mesmo modo, o que permite o cache
+        de prefixo do provedor (cache_control no último bloco, ou o cache
+        automático de prefixos da OpenAI). Juntos com "\n\n" reproduzem build_prompt.
+        """
+        blocks = [self.ROLE_LINE]
+        blocks.extend(module.content for module in modules)
+        return blocks, self.TEXT_HEADER + text
+    
+    def _get_prefix(self, modules: List[PromptModule]) -> str:
+        """Parte estática do prompt (instruções dos módulos), montada uma vez por combinação
+        
+        Os módulos entram na ordem recebida - get_prompt_sequence já os entrega
+        ordenados por prioridade.
+        """
+        key = tuple(modules)
+        prefix = self._prefix_cache.get(key)
+        if prefix is None:
+            # Montado a partir de build_prompt_blocks: os dois formatos não divergem
+            blocks, header = self.build_prompt_blocks(modules, '')
+            prefix = self._prefix_cache[key] = "\n\n".join(blocks) + "\n\n" + header
+        return prefix
+    
+    def _reserve_slot(self) -> float:
+        """Reserva o próximo horário de chamada e retorna quanto falta esperar
+        
+        Só espera o que falta do intervalo: se a chamada anterior já demorou
+        mais que delay_between_calls, não há espera nenhuma.
+        """
+        interval = self.delay_between_calls / 1000.0  # Converte ms para segundos
+        with self._slot_lock:
+            now = time.monotonic()
+            wait = max(0.0, self._last_call_ts + interval - now)
+            self._last_call_ts = now + wait
+        return wait
     
     def wait_between_calls(self):
         """Aguarda entre chamadas para evitar throttling"""
-        time.sleep(self.delay_between_calls / 1000.0)  # Converte ms para segundos
\ No newline at end of file
+        wait = self._reserve_slot()
+        if wait:
+            time.sleep(wait)
+    
+    async def await_slot(self):
+        """Versão assíncrona de wait_between_calls - não bloqueia a thread do loop"""
+        wait = self._reserve_slot()
+        if wait:
+            await asyncio.sleep(wait)
\ No newline at end of file
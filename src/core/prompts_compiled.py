@@ -0,0 +1,162 @@
+# Gerado por src/compile_prompts.py - não edite à mão
+
+SOURCE_HASH = 'e6d869e3d52efa8208429a45259f9cfca56720b1fc1cd7c4fd6599e7168a3fce'
+
+MODULES = {'formato': '**FORMATO DE RESPOSTA**\n'
+            'Retorne APENAS um JSON válido:\n'
+            '{\n'
+            '  "corrections": [\n'
+            '    {\n'
+            '      "paragraph": 1,\n'
+            '      "error": "texto com erro",\n'
+            '      "correction": "texto corrigido",\n'
+            '      "type": "tipo do erro"\n'
+            '    }\n'
+            '  ]\n'
+            '}\n'
+            '\n'
+            'Se não houver correções: {"corrections": [] }',
+ 'protecoes': '**CONTEÚDO PROTEGIDO - NUNCA ALTERE**\n'
+              '\n'
+              'REGRA ABSOLUTA: Os seguintes conteúdos NUNCA devem ser modificados:\n'
+              '\n'
+              '1. ALTERNATIVAS DE QUESTÕES\n'
+              '   - QUALQUER linha que comece com: a), b), c), d), e) | (a), (b), (c), (d), (e) | a., b., c., d., e. | '
+              'A), B), C), D), E)\n'
+              '   - Mesmo que contenham erros propositais ou factuais\n'
+              '\n'
+              '2. CITAÇÕES E REFERÊNCIAS\n'
+              '   - Qualquer texto entre aspas com atribuição de autoria\n'
+              '   - Textos com fonte indicada (Fonte:, Referência:, Extraído de:, Adaptado de:)\n'
+              '   - Textos seguidos de referência bibliográfica ou URL\n'
+              '   - Textos da Wikipedia ou qualquer outra fonte online\n'
+              '   - Qualquer parágrafo que termine com indicação de fonte\n'
+              '   - Textos indentados ou em itálico que sejam citações\n'
+              '   - Blocos de texto seguidos por autor, data ou fonte\n'
+              '\n'
+              '3. POEMAS E TEXTOS LITERÁRIOS\n'
+              '   - Versos de poemas (linhas curtas sem pontuação final)\n'
+              '   - Textos com estrutura poética ou literária\n'
+              '   - Letras de músicas\n'
+              '   - Trechos de obras literárias\n'
+              '\n'
+              '4. OUTROS PROTEGIDOS\n'
+              '   - Códigos BNCC (EF01LP01, EM13LGG101, etc)\n'
+              '   - URLs e links completos\n'
+              '   - Referências bibliográficas completas\n'
+              '   - Gabaritos de questões\n'
+              '   - Exemplos de erros (quando indicado)\n'
+              '   - Fórmulas matemáticas e químicas\n'
+              '\n'
+              'IMPORTANTE: Na dúvida, NÃO ALTERE. É melhor preservar um texto com erro do que alterar uma citação '
+              'original.',
+ 'erros_graves': '**CORRIJA APENAS ERROS GRAVÍSSIMOS**\n'
+                 '- Erros de digitação óbvios (computadr → computador); Ortografia grotescamente errada (ezemplo → '
+                 'exemplo); Concordância completamente errada (os menino → os meninos); Acentuação faltando em '
+                 'palavras básicas (voce → você); Pontuação duplicada (.., ,, → . ,); Falta de espaço óbvia (amesa → a '
+                 'mesa)',
+ 'erros_gramaticais': '**CORRIJA TODOS OS ERROS GRAMATICAIS**\n'
+                      '- Ortografia incorreta; Concordância verbal e nominal; Regência verbal e nominal; Acentuação '
+                      'incorreta ou faltando; Crase incorreta ou faltando; Uso incorreto de pronomes; Conjugação '
+                      'verbal errada',
+ 'pontuacao': '**CORRIJA PONTUAÇÃO**\n'
+              '- Falta de ponto final em parágrafos; Vírgulas obrigatórias faltando; Pontuação antes de conjunções; '
+              'Dois-pontos e ponto-e-vírgula incorretos; Aspas e parênteses desbalanceados; Espaços incorretos com '
+              'pontuação',
+ 'repeticoes': '**REMOVA REPETIÇÕES DESNECESSÁRIAS**\n'
+               '- Palavra repetida em sequência (o o → o); Mesma palavra 3+ vezes em 2 linhas; Início de frases '
+               'consecutivas iguais; Repetição de conectivos próximos',
+ 'redundancias': '**ELIMINE REDUNDÂNCIAS**\n'
+                 '- Subir para cima → subir; Entrar para dentro → entrar; Sair para fora → sair; Elo de ligação → elo; '
+                 'Planos para o futuro → planos',
+ 'fluidez': '**MELHORE A FLUIDEZ (MÍNIMO NECESSÁRIO)**\n'
+            '- Adicione conectivos essenciais faltando; Complete frases truncadas; Resolva ambiguidades graves; '
+            'Corrija ordem de palavras confusa',
+ 'maneirismos_ia': '**REMOVA MANEIRISMOS DE IA**\n'
+                   '- Metáforas desnecessárias (é como um quebra-cabeça); Analogias forçadas (são como temperos); '
+                   'Juízo de valor (fascinante, incrível, o mais legal); Perguntas retóricas (Sabe quando...? Já '
+                   'pensou...?); Saudações diretas (Olá, estudantes!); Verbos informais (vamos mergulhar, vamos '
+                   'explorar); Adjetivação excessiva (super interessante, muito mais divertido)',
+ 'linguagem_didatica': '**ADEQUE PARA LINGUAGEM DIDÁTICA**\n'
+                       '- Substitua informalidades (tipo → como, né → não é); Remova diminutivos desnecessários '
+                       '(tudinho → tudo); Elimine gírias e expressões coloquiais; Mantenha vocabulário apropriado para '
+                       'idade; Use termos técnicos com explicação quando necessário',
+ 'tratamento_uniforme': '**PADRONIZE O TRATAMENTO**\n'
+                        '- Use sempre SINGULAR (você, não vocês); Evite "a gente" → use "nós" ou reformule; Mantenha '
+                        'impessoalidade quando apropriado; Evite se dirigir diretamente ao leitor em excesso',
+ 'numeros_uniformes_padrao_internacional': '**REGRAS DE FORMATAÇÃO NUMÉRICA (PADRÃO INTERNACIONAL)**\n'
+                                           '\n'
+                                           '1. SEPARADOR DE MILHARES:\n'
+                                           '    * Todos os números com quatro ou mais dígitos devem ter seus grupos de '
+                                           'três dígitos separados por um **espaço fino não separável (Unicode '
+                                           '`U+202F`)**.\n'
+                                           '    * É estritamente **proibido** o uso de pontos (`.`) ou vírgulas (`,`) '
+                                           'como separadores de milhares.\n'
+                                           '    * **Exemplos de aplicação**:\n'
+                                           '        * `1000` deve ser formatado como `1\u202f000`\n'
+                                           '        * `12345` deve ser formatado como `12\u202f345`\n'
+                                           '        * `1500000` deve ser formatado como `1\u202f500\u202f000`\n'
+                                           '\n'
+                                           '2. NÚMERO E UNIDADE:\n'
+                                           '    * Sempre utilize um **espaço não separável (Unicode `U+00A0`)** entre '
+                                           'um número e sua respectiva unidade de medida (ex: cm, kg, km/h, R$).\n'
+                                           '    * Esta regra garante que o número e sua unidade nunca sejam separados '
+                                           'por uma quebra de linha.\n'
+                                           '    * **Exemplos de aplicação**:\n'
+                                           '        * `10cm` ou `10 cm` (com espaço comum) deve ser formatado como `10 '
+                                           'cm` (com `U+00A0`).\n'
+                                           '        * `R$50` deve ser formatado como `R$ 50` (com `U+00A0`).\n'
+                                           '        * `78km` deve ser formatado como `78 km` (com `U+00A0`).\n'
+                                           '\n'
+                                           '3. INTEGRIDADE NUMÉRICA:\n'
+                                           '    * Um número completo, incluindo seus separadores de milhares e sua '
+                                           'unidade (se aplicável), deve ser tratado como um bloco único e '
+                                           'indivisível, **sempre permanecendo na mesma linha**. As regras acima '
+                                           'garantem essa condição.',
+ 'segmentacao': '**ANÁLISE DE SEGMENTAÇÃO DE BLOCO**\n'
+                'Analise o texto e indique onde seria ideal cortar este bloco:\n'
+                '\n'
+                '1. Procure por quebras naturais:\n'
+                '   - Fim de seção ou tópico\n'
+                '   - Mudança de assunto\n'
+                '   - Transição entre conceitos\n'
+                '   - Após conclusão de ideia\n'
+                '\n'
+                '2. Evite cortar:\n'
+                '   - No meio de parágrafos\n'
+                '   - Durante explicações\n'
+                '   - Entre pergunta e resposta\n'
+                '   - No meio de listas\n'
+                '\n'
+                '3. Tamanho ideal: 2-3 páginas (aproximadamente 10-15 parágrafos)\n'
+                '\n'
+                'Retorne:\n'
+                '{\n'
+                '  "ideal_cut_point": número_do_parágrafo,\n'
+                '  "reason": "motivo da escolha",\n'
+                '  "confidence": 0.0-1.0\n'
+                '}',
+ 'questoes_com_gabarito': '**REVISÃO ESPECIAL DE QUESTÕES COM GABARITO**\n'
+                          '\n'
+                          'INSTRUÇÕES CRÍTICAS:\n'
+                          '\n'
+                          '1. IDENTIFICAÇÃO AUTOMÁTICA:\n'
+                          '   - Linhas marcadas com [ALTERNATIVA_CORRETA] = alternativa correta segundo o gabarito\n'
+                          '   - Linhas marcadas com [ALTERNATIVA_INCORRETA] = alternativas incorretas\n'
+                          '   - O sistema já identificou qual é qual baseado no gabarito\n'
+                          '\n'
+                          '2. PARA [ALTERNATIVA_INCORRETA]:\n'
+                          '   - Corrija APENAS erros gramaticais, ortográficos e de pontuação\n'
+                          '   - NUNCA corrija conteúdo factual (está errado de propósito!)\n'
+                          '   - NUNCA altere informações técnicas, datas, nomes ou conceitos\n'
+                          '   - Exemplo: "São Paulo é a capital do Brazil" → "São Paulo é a capital do Brasil"\n'
+                          '   - NÃO mude para "Brasília é a capital do Brasil" (isso é correção factual!)\n'
+                          '\n'
+                          '3. PARA [ALTERNATIVA_CORRETA]:\n'
+                          '   - Corrija TODOS os erros: gramática, ortografia, pontuação E factualidade\n'
+                          '   - Garanta que a informação está 100% correta\n'
+                          '   - Exemplo: "Brazília é a capital do Brazil" → "Brasília é a capital do Brasil"\n'
+                          '\n'
+                          '4. IMPORTANTE:\n'
+                          '   - Se não houver marcação [ALTERNATIVA_CORRETA/INCORRETA], trate como texto normal\n'
+                          '   - O gabarito em si (ex: "Gabarito: C") só precisa correção gramatical'}
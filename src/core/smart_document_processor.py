@@ -1,20 +1,117 @@
+import gc
 import os
 import time
 import logging
-import json
-import shutil
+import io
 import re
+import asyncio
+import contextlib
+import concurrent.futures
+from collections import defaultdict, deque
+from bisect import bisect_right
+from functools import lru_cache
+from itertools import chain
 from typing import List, Dict, Tuple
 from docx import Document
 from .modular_prompt_system import ModularPromptSystem, PromptModule
 from ..utils.word_utils import WordDocumentHandler
-import concurrent.futures
-from threading import Lock
+from ..utils.response_cache import ResponseCache, SemanticPromptCache
+from ..utils.api_client import NoAnswer
+from ..utils.autotune import ConcurrencyTuner
+from ..utils.json_utils import JSONHandler
+
+try:
+    import ahocorasick
+except ImportError:  # Sem pyahocorasick: localiza os erros com str.find
+    ahocorasick = None
+
+# Marcadores de conteúdo protegido - montados uma vez, não a cada parágrafo
+_SOURCE_MARKERS = ('Fonte:', 'Referência:', 'Extraído de:', 'Adaptado de:', 'Wikipedia', '(Fonte',
+                   'Disponível em:', 'Acesso em:')
+_NEXT_SOURCE_MARKERS = ('Fonte:', 'Referência:', 'Wikipedia')
+_SIGNATURE_MARKERS = ('Atenciosamente', 'Cordialmente', 'Um abraço', 'Abraços',
+                      'Saudações', 'Respeitosamente', 'Grato', 'Obrigado')
+_REFERENCE_MARKERS = ('Disponível em:', 'Acesso em:', 'Fonte:', 'Referência:',
+                      'Adaptado', 'Extraído de:', 'Retirado de:', 'https://', 'http://', 'www.')
+_TEXT_START_MARKERS = ('Disponível em:', 'Fonte:')
+
+# Um bit por conjunto: um parágrafo é varrido uma vez só para todos eles
+_SOURCE, _NEXT_SOURCE, _SIGNATURE, _REFERENCE, _TEXT_START = 1, 2, 4, 8, 16
+_MARKER_SETS = ((_SOURCE, _SOURCE_MARKERS), (_NEXT_SOURCE, _NEXT_SOURCE_MARKERS),
+                (_SIGNATURE, _SIGNATURE_MARKERS), (_REFERENCE, _REFERENCE_MARKERS),
+                (_TEXT_START, _TEXT_START_MARKERS))
+
+def _build_marker_automaton():
+    """Autômato com todos os marcadores; o valor de cada um são os bits dos seus conjuntos"""
+    if ahocorasick is None:
+        return None
+    flags = defaultdict(int)
+    for flag, markers in _MARKER_SETS:
+        for marker in markers:
+            flags[marker] |= flag
+    automaton = ahocorasick.Automaton()
+    for marker, flag in flags.items():
+        automaton.add_word(marker, flag)
+    automaton.make_automaton()
+    return automaton
+
+_MARKER_AUTOMATON = _build_marker_automaton()
+
+def _marker_flags(text: str) -> int:
+    """Bits dos conjuntos de marcadores presentes no texto (_SOURCE, _SIGNATURE...)"""
+    flags = 0
+    if _MARKER_AUTOMATON is not None:
+        # Uma passada pelo texto, com as ocorrências sobrepostas ('(Fonte' e 'Fonte:')
+        for _, flag in _MARKER_AUTOMATON.iter(text):
+            flags |= flag
+    else:
+        for flag, markers in _MARKER_SETS:
+            if any(marker in text for marker in markers):
+                flags |= flag
+    return flags
+
+# Início de questão numerada (1. / 1)) e de alternativa (a) / a.)
+_RE_QNUM = re.compile(r'^\d+[\.\)]')
+_RE_ALTERNATIVE = re.compile(r'^[a-eA-E][\)\.]')
+
+# Gabarito em qualquer caixa (sem criar uma cópia em minúsculas do texto)
+_RE_ANSWER_KEY = re.compile(r'gabarito:|resposta:|alternativa correta:|letra correta:', re.IGNORECASE)
+_RE_ANSWER_LETTER = re.compile(r'[:\s]([A-Ea-e])[)\s\.]')
+
+# Marca de posição de cada linha do bloco ([P12][PÁG3])
+_RE_POSITION_TAG = re.compile(r'^\[P\d+\]\[PÁG[^\]]*\]', re.MULTILINE)
+
+@lru_cache(maxsize=64)
+def _prompt_cache_key(model: str, prompt: str) -> str:
+    """Chave do prompt no ResponseCache, calculada uma vez por prompt
+    
+    A consulta e a gravação no cache (e novas tentativas do mesmo bloco)
+    reaproveitam o sha256; o hash da própria str o Python já guarda.
+    """
+    return ResponseCache.key(model, prompt)
+
+class ParagraphRecord:
+    """Um parágrafo não vazio do corpo, como extraído para os blocos
+    
+    Com __slots__ (em vez de um dict por parágrafo) cada registro ocupa bem
+    menos memória e o acesso por atributo é mais rápido que a busca por chave.
+    """
+    __slots__ = ('index', 'doc_index', 'text', 'page', 'is_protected', 'protection_reason', 'markers')
+    
+    def __init__(self, index: int, doc_index: int, text: str, page: int, is_protected: bool, markers: int):
+        self.index = index          # Número do parágrafo (1..N, só os não vazios) - o [P..] do prompt
+        self.doc_index = doc_index  # Posição em doc.paragraphs
+        self.text = text
+        self.page = page
+        self.is_protected = is_protected
+        self.protection_reason = None
+        self.markers = markers      # Bits dos marcadores encontrados (_SOURCE, _SIGNATURE...)
 
 class SmartDocumentProcessor:
     """Processador inteligente com segmentação e prompts modulares"""
     
-    def __init__(self, api_client, mode: str = "editorial"):
+    def __init__(self, api_client, mode: str = "editorial", use_cache: bool = True, semantic_cache: bool = False,
+                 batch_mode: bool = False):
         self.api_client = api_client
         self.mode = mode
         self.prompt_system = ModularPromptSystem()
@@ -24,10 +121,44 @@ class SmartDocumentProcessor:
         self.target_paragraphs_per_block = 50  # Blocos MUITO maiores com GPT-4
         self.max_paragraphs_per_block = 100    # Aproveita janela de 128k tokens
         self.min_paragraphs_per_block = 20     # Mínimo maior também
+        self.max_prompt_tokens = 100000        # Acima disto o bloco vai um módulo por chamada
+        self.pack_tokens = 8000                # Blocos vizinhos pequenos vão juntos até este tamanho de texto
+        
+        # Blocos em andamento ao mesmo tempo (janela deslizante); o limite de
+        # requisições por minuto continua garantido pelo api_client
+        self.max_workers = 8
+        self.batch_mode = batch_mode  # Usa a Batch API: metade do custo, mas demora mais
+        self.pages_estimated = False  # Páginas do documento atual só pelas quebras manuais (sem a paginação do Word)
         
-        # Para processamento paralelo - reduzido para evitar sobrecarga
-        self.max_workers = 2  # Apenas 2 threads simultâneas para evitar erro do servidor
-        self.corrections_lock = Lock()
+        # Respostas de execuções anteriores, pelo hash do prompt final
+        self.response_cache = ResponseCache() if use_cache else None
+        
+        # Textos quase idênticos reaproveitam a resposta do vizinho - só com respostas determinísticas
+        self.semantic_cache = None
+        if semantic_cache and self.response_cache is not None and getattr(api_client, 'temperature', 1) == 0:
+            self.semantic_cache = SemanticPromptCache(self.response_cache)
+    
+    def process_documents(self, jobs: List[Tuple[str, str]], max_workers: int = None) -> List[str]:
+        """Processa vários documentos (entrada, saída), um por processo
+        
+        Cada processo abre e corrige o seu documento (a parte de lxml, que usa
+        CPU) enquanto as chamadas de cada um seguem concorrentes no seu event
+        loop; ao terminar, o sistema devolve de vez a memória da árvore.
+        """
+        workers = min(max_workers or os.cpu_count() or 1, len(jobs))
+        if workers < 2:
+            return [self.process_document(input_path, output_path) for input_path, output_path in jobs]
+        
+        settings = (self.api_client, self.mode, self.response_cache is not None,
+                    self.semantic_cache is not None, self.batch_mode)
+        try:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                                        initargs=settings) as executor:
+                return list(executor.map(_process_one, *zip(*jobs)))
+        except (OSError, concurrent.futures.process.BrokenProcessPool) as e:
+            # Ambientes sem multiprocessamento (ex.: executável congelado) - segue em série
+            self.logger.warning(f"Processamento paralelo indisponível, processando em série: {str(e)}")
+            return [self.process_document(input_path, output_path) for input_path, output_path in jobs]
     
     def process_document(self, input_path: str, output_path: str, callback=None):
         """Processa documento com velocidade máxima"""
@@ -35,20 +166,29 @@ class SmartDocumentProcessor:
             start_time = time.time()
             self.logger.info(f"**INICIANDO PROCESSAMENTO RÁPIDO**")
             
-            # 1. Copia o arquivo
+            # 1. Garante a pasta de saída (a saída só é gravada no fim)
             os.makedirs(os.path.dirname(output_path), exist_ok=True)
-            shutil.copy2(input_path, output_path)
             
-            # 2. Abre o documento
-            doc = Document(output_path)
+            # O .docx é lido do disco uma vez só: a extração e a aplicação das
+            # correções (ou a cópia, se não houver nenhuma) usam os mesmos bytes
+            with open(input_path, 'rb') as f:
+                source = f.read()
             
-            # 3. Extrai conteúdo
-            all_paragraphs = self._extract_all_content_fast(doc)
+            # 2-3. Extrai conteúdo direto do XML, em fluxo (só texto e posição: o
+            # documento só é montado de verdade para aplicar as correções)
+            all_paragraphs = self._extract_all_content_fast(io.BytesIO(source))
             total_paragraphs = len(all_paragraphs)
+            
+            # Sem a paginação gravada pelo Word as páginas saem só das quebras
+            # manuais: prompts, correções e relatório as marcam como estimadas
+            self.pages_estimated = not WordDocumentHandler.has_rendered_page_breaks(io.BytesIO(source))
+            if self.pages_estimated:
+                self.logger.warning("Documento sem a paginação do Word (nenhum <w:lastRenderedPageBreak/>): "
+                                    "as páginas são estimadas pelas quebras manuais")
             self.logger.info(f"Total de parágrafos: **{total_paragraphs}**")
             
             # 4. Cria blocos PEQUENOS para processamento rápido
-            blocks = self._create_fast_blocks(all_paragraphs)
+            blocks = self._pack_small_blocks(self._create_fast_blocks(all_paragraphs))
             total_blocks = len(blocks)
             self.logger.info(f"Dividido em **{total_blocks} blocos pequenos** para processamento paralelo")
             
@@ -64,40 +204,43 @@ class SmartDocumentProcessor:
             modules = self.prompt_system.get_prompt_sequence(self.mode)
             self.logger.info(f"Usando {len(modules)} módulos do modo '{self.mode}'")
             
+            # Todos os módulos num prompt só por bloco (o texto vai uma vez); só
+            # um bloco grande demais para a janela é dividido por módulo
             for block_idx, block in enumerate(blocks):
                 block_text = self._prepare_block_text_fast(block)
-                prompt = self.prompt_system.build_prompt(modules, block_text)
-                all_prompts.append((prompt, block_idx, block))
+                for prompt, module_name in self._build_block_prompts(modules, block_text):
+                    all_prompts.append((prompt, block_idx, block, block_text, module_name))
             
-            # 6. Processa em PARALELO para máxima velocidade
-            all_corrections = []
+            # 6. Processa em PARALELO: os blocos aguardam a API ao mesmo tempo
+            # num event loop, numa janela deslizante (ou vão todos num lote da Batch API)
+            if self.batch_mode:
+                block_results = self._process_blocks_bulk(all_prompts, callback)
+            else:
+                block_results = asyncio.run(self._process_blocks_async(all_prompts, callback))
             
-            with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-                # Submete todos os trabalhos
-                futures = []
-                for prompt, block_idx, block in all_prompts:
-                    future = executor.submit(self._process_single_block_fast, prompt, block_idx, block)
-                    futures.append(future)
-                
-                # Coleta resultados conforme ficam prontos
-                completed = 0
-                for future in concurrent.futures.as_completed(futures):
-                    completed += 1
-                    if callback:
-                        callback(completed, total_blocks, f"Processando {completed}/{total_blocks}")
-                    
-                    try:
-                        corrections = future.result()
-                        if corrections:
-                            all_corrections.extend(corrections)
-                    except Exception as e:
-                        self.logger.error(f"Erro em bloco: {str(e)}")
+            all_corrections = list(chain.from_iterable(corrections for corrections in block_results if corrections))
+            
+            # Os prompts (cabeçalho + texto de cada bloco) e os resultados por
+            # bloco não servem mais: não ficam na memória junto com a árvore do
+            # documento montada a seguir
+            del blocks, all_prompts, block_results
             
-            # 7. Aplica correções
+            # 7. Aplica correções sobre o original e grava a saída uma vez só
             if all_corrections:
-                self._apply_corrections_fast(doc, all_corrections)
+                doc = Document(io.BytesIO(source))
+                self._apply_corrections_fast(doc, all_corrections, all_paragraphs)
                 doc.save(output_path)
                 self.logger.info(f"Documento salvo com {len(all_corrections)} correções")
+                
+                # A árvore lxml segura muita memória mesmo depois de salva: solta e
+                # coleta já, para não acumular entre documentos processados em série
+                # (element.clear() com os proxies dos runs ainda vivos leva segundos)
+                del doc
+                gc.collect()
+            else:
+                # Nada a corrigir: a saída é o próprio original
+                with open(output_path, 'wb') as f:
+                    f.write(source)
             
             # Tempo total
             total_time = time.time() - start_time
@@ -113,108 +256,124 @@ class SmartDocumentProcessor:
             self.logger.error(f"Erro no processamento: {str(e)}")
             raise
     
-    def _extract_all_content_fast(self, doc: Document) -> List[Dict]:
-        """Extração com informação de página e detecção de conteúdo protegido"""
+    def _extract_all_content_fast(self, source) -> List[ParagraphRecord]:
+        """Extração com informação de página e detecção de conteúdo protegido
+        
+        Args:
+            source: Caminho do .docx ou arquivo aberto (ex.: BytesIO com o conteúdo)
+        """
         all_content = []
         para_num = 0
         
-        # Estima páginas (aproximadamente 30 parágrafos por página)
-        paragraphs_per_page = 30
+        # Texto e página de cada parágrafo do corpo (o texto é o mesmo de
+        # doc.paragraphs[i].text), lidos em fluxo sem montar a árvore do
+        # documento - só o texto, a página e a posição (doc_index) são guardados
+        texts, pages = [], []
+        for full_text, page in WordDocumentHandler.iter_paragraphs(source):
+            texts.append(full_text)
+            pages.append(page)
+        
+        # Marcadores de cada parágrafo numa varredura só (o parágrafo seguinte
+        # também é consultado, então todos são calculados antes)
+        flags = [_marker_flags(full_text) for full_text in texts]
+        previous_text = None  # Retorno da última proteção de texto com referência
         
-        for i, para in enumerate(doc.paragraphs):
-            if para.text.strip():
+        for i, full_text in enumerate(texts):
+            if full_text.strip():
                 para_num += 1
-                # Calcula página estimada
-                estimated_page = (i // paragraphs_per_page) + 1
                 
                 # Detecta se é conteúdo protegido
-                text = para.text.strip()
                 is_protected = False
                 
                 # Verifica se é citação/referência
-                if any(marker in text for marker in ['Fonte:', 'Referência:', 'Extraído de:', 
-                                                     'Adaptado de:', 'Wikipedia', '(Fonte', 
-                                                     'Disponível em:', 'Acesso em:']):
+                if flags[i] & _SOURCE:
                     is_protected = True
                 
                 # Verifica se o próximo parágrafo é uma fonte
-                if i < len(doc.paragraphs) - 1:
-                    next_text = doc.paragraphs[i + 1].text.strip()
-                    if any(marker in next_text for marker in ['Fonte:', 'Referência:', 'Wikipedia']):
-                        is_protected = True
+                if i < len(texts) - 1 and flags[i + 1] & _NEXT_SOURCE:
+                    is_protected = True
+                
+                all_content.append(ParagraphRecord(para_num, i, full_text, pages[i], is_protected, flags[i]))
                 
-                all_content.append({
-                    'index': para_num,
-                    'doc_index': i,
-                    'text': para.text,
-                    'paragraph_obj': para,
-                    'type': 'paragraph',
-                    'page': estimated_page,
-                    'location_text': f"Página {estimated_page}, Parágrafo {para_num}",
-                    'is_protected': is_protected
-                })
+                # Assinatura ou referência: marca TODO o texto acima (já extraído)
+                # como protegido, na mesma passada
+                if flags[i] & (_SIGNATURE | _REFERENCE):
+                    previous_text = self._protect_text_above(all_content, previous_text)
         
         return all_content
     
-    def _create_fast_blocks(self, paragraphs: List[Dict]) -> List[List[Dict]]:
-        """Cria blocos PEQUENOS para processamento rápido com proteção inteligente"""
+    @staticmethod
+    def _protect_text_above(paragraphs: List[ParagraphRecord], previous: Tuple[int, bool] = None) -> Tuple[int, bool]:
+        """Protege o texto que termina no último parágrafo (com referência/assinatura)
+        
+        Args:
+            previous: Retorno da chamada anterior na mesma lista - a volta para
+                ao chegar naquele parágrafo, porque dali para trás repetiria a
+                mesma busca (sem questões no caminho, cada referência varreria o
+                documento inteiro de novo)
         
-        # Primeiro, marca parágrafos que pertencem a textos com referência/assinatura
-        for i in range(len(paragraphs)):
-            # Verifica se é assinatura ou referência
-            text = paragraphs[i]['text'].strip()
+        Returns:
+            (posição do parágrafo, se a volta achou o início do texto)
+        """
+        i = len(paragraphs) - 1
+        
+        # Procura o início do texto (título ou após questão)
+        start_idx = i
+        found_start = False
+        
+        # Volta procurando o início do texto
+        for j in range(i-1, -1, -1):
+            para_text = paragraphs[j].text.strip()
             
-            # Padrões de assinatura/referência
-            is_signature = any(marker in text for marker in [
-                'Atenciosamente', 'Cordialmente', 'Um abraço', 'Abraços',
-                'Saudações', 'Respeitosamente', 'Grato', 'Obrigado'
-            ])
+            # Para se encontrar:
+            # - Questão numerada
+            # - Parágrafo vazio
+            # - Outro texto com referência
+            if (not para_text or 
+                _RE_QNUM.match(para_text) or
+                paragraphs[j].markers & _TEXT_START):
+                start_idx = j + 1
+                found_start = True
+                break
             
-            is_reference = any(marker in text for marker in [
-                'Disponível em:', 'Acesso em:', 'Fonte:', 'Referência:',
-                'Adaptado', 'Extraído de:', 'Retirado de:', 'https://', 'http://', 'www.'
-            ])
+            # Se encontrou possível título (linha curta sem ponto final)
+            if len(para_text) < 100 and not para_text.endswith('.'):
+                start_idx = j
+                found_start = True
             
-            # Se encontrou assinatura ou referência, marca TODO o texto acima como protegido
-            if is_signature or is_reference:
-                # Procura o início do texto (título ou após questão)
-                start_idx = i
-                
-                # Volta procurando o início do texto
-                for j in range(i-1, -1, -1):
-                    para_text = paragraphs[j]['text'].strip()
-                    
-                    # Para se encontrar:
-                    # - Questão numerada
-                    # - Parágrafo vazio
-                    # - Outro texto com referência
-                    if (not para_text or 
-                        re.match(r'^\d+[\.\)]', para_text) or
-                        any(m in para_text for m in ['Disponível em:', 'Fonte:'])):
-                        start_idx = j + 1
-                        break
-                    
-                    # Se encontrou possível título (linha curta sem ponto final)
-                    if len(para_text) < 100 and not para_text.endswith('.'):
-                        start_idx = j
-                
-                # Marca todos os parágrafos do texto como protegidos
-                for k in range(start_idx, i + 1):
-                    if k < len(paragraphs):
-                        paragraphs[k]['is_protected'] = True
-                        paragraphs[k]['protection_reason'] = 'texto_com_referencia'
+            # Fim do texto protegido antes: se aquela volta achou o início, ele
+            # vale para esta também (e o trecho até lá já está protegido); se
+            # não achou, mais para trás não há nada que mude o resultado
+            if previous is not None and j == previous[0]:
+                if previous[1]:
+                    start_idx = min(start_idx, j + 1)
+                    found_start = True
+                break
+        
+        # Marca todos os parágrafos do texto como protegidos
+        for k in range(start_idx, i + 1):
+            paragraphs[k].is_protected = True
+            paragraphs[k].protection_reason = 'texto_com_referencia'
         
-        # Agora cria os blocos, respeitando proteções
+        return i, found_start
+    
+    def _create_fast_blocks(self, paragraphs: List[ParagraphRecord]) -> List[List[ParagraphRecord]]:
+        """Cria blocos PEQUENOS para processamento rápido com proteção inteligente
+        
+        As proteções (inclusive a dos textos com referência/assinatura) já
+        vêm marcadas da extração.
+        """
+        # Cria os blocos, respeitando proteções
         blocks = []
         current_block = []
         
         for para in paragraphs:
             # Se é protegido, não inclui no bloco de processamento
-            if not para.get('is_protected', False):
+            if not para.is_protected:
                 current_block.append(para)
             
             # Quando atingir o tamanho do bloco ou encontrar um protegido, fecha o bloco
-            if len(current_block) >= self.target_paragraphs_per_block or para.get('is_protected', False):
+            if len(current_block) >= self.target_paragraphs_per_block or para.is_protected:
                 if current_block:
                     blocks.append(current_block)
                     current_block = []
@@ -225,7 +384,33 @@ class SmartDocumentProcessor:
         
         return blocks
     
-    def _prepare_block_text_fast(self, block: List[Dict]) -> str:
+    def _pack_small_blocks(self, blocks: List[List[ParagraphRecord]]) -> List[List[ParagraphRecord]]:
+        """Junta blocos vizinhos pequenos numa chamada só, até pack_tokens de texto
+        
+        Cada parágrafo protegido fecha um bloco, então documentos com muitas
+        citações geram blocos de poucos parágrafos - cada um pagando o prompt
+        inteiro e uma requisição. Como toda linha já leva a sua marca [P..],
+        os blocos juntos continuam identificáveis na resposta.
+        """
+        packed = []
+        current, current_tokens = [], 0
+        
+        for block in blocks:
+            # ~3 caracteres por token em português (mesma estimativa do prompt)
+            tokens = sum(len(para.text) for para in block) // 3
+            if current and (current_tokens + tokens > self.pack_tokens or
+                            len(current) + len(block) > self.max_paragraphs_per_block):
+                packed.append(current)
+                current, current_tokens = [], 0
+            current = current + block
+            current_tokens += tokens
+        
+        if current:
+            packed.append(current)
+        
+        return packed
+    
+    def _prepare_block_text_fast(self, block: List[ParagraphRecord]) -> str:
         """Prepara texto com informação de localização e identificação de questões"""
         lines = []
         
@@ -233,43 +418,35 @@ class SmartDocumentProcessor:
         has_questions = False
         gabarito_info = {}
         
-        # Primeiro, procura por gabaritos no bloco
+        # Primeiro, procura por gabaritos no bloco - numa passada só, lembrando
+        # a última questão numerada vista (a mais próxima acima do gabarito)
+        last_question = None
         for i, para in enumerate(block):
-            text = para['text'].strip()
-            # Detecta gabarito (várias formas comuns)
-            if any(marker in text.lower() for marker in ['gabarito:', 'resposta:', 'alternativa correta:', 'letra correta:']):
+            # Detecta gabarito (várias formas comuns); todas terminam em ':', e
+            # procurar um caractere é bem mais barato que a regex sem caixa
+            if ':' in para.text and _RE_ANSWER_KEY.search(para.text):
                 has_questions = True
-                # Extrai a letra do gabarito
-                import re
-                match = re.search(r'[:\s]([A-Ea-e])[)\s\.]', text)
-                if match:
-                    correct_letter = match.group(1).upper()
-                    # Procura a questão acima do gabarito
-                    for j in range(i-1, max(i-10, -1), -1):  # Procura até 10 parágrafos acima
-                        if j >= 0 and re.match(r'^\d+[\.\)]\s*', block[j]['text']):
-                            gabarito_info[j] = correct_letter
-                            break
-        
-        # Prepara o texto com marcações especiais
+                # Extrai a letra do gabarito (do texto sem os espaços das pontas)
+                match = _RE_ANSWER_LETTER.search(para.text.strip())
+                # A questão precisa estar até 9 parágrafos acima do gabarito
+                if match and last_question is not None and i - last_question <= 9:
+                    gabarito_info[last_question] = match.group(1).upper()
+            
+            if _RE_QNUM.match(para.text):
+                last_question = i
+        
+        # Prepara o texto com marcações especiais; a questão com gabarito mais
+        # próxima acima (até 5 parágrafos) vale para as alternativas seguintes
+        last_answered = None
         for i, para in enumerate(block):
-            text = para['text']
-            para_num = para['index']
-            page = para.get('page', '?')
+            text = para.text
+            para_num = para.index
+            page = f"~{para.page}" if self.pages_estimated else para.page
             
             # Se é uma alternativa de questão com gabarito conhecido
-            if has_questions and re.match(r'^[a-eA-E][\)\.]', text):
-                alt_letter = text[0].upper()
-                
-                # Procura o gabarito desta questão
-                question_idx = None
-                for j in range(i-1, max(i-6, -1), -1):
-                    if j in gabarito_info:
-                        question_idx = j
-                        break
-                
-                if question_idx is not None and question_idx in gabarito_info:
-                    correct_letter = gabarito_info[question_idx]
-                    if alt_letter == correct_letter:
+            if has_questions and _RE_ALTERNATIVE.match(text):
+                if last_answered is not None and i - last_answered <= 5:
+                    if text[0].upper() == gabarito_info[last_answered]:
                         lines.append(f"[P{para_num}][PÁG{page}][ALTERNATIVA_CORRETA] {text}")
                     else:
                         lines.append(f"[P{para_num}][PÁG{page}][ALTERNATIVA_INCORRETA] {text}")
@@ -277,89 +454,378 @@ class SmartDocumentProcessor:
                     lines.append(f"[P{para_num}][PÁG{page}] {text}")
             else:
                 lines.append(f"[P{para_num}][PÁG{page}] {text}")
+            
+            if i in gabarito_info:
+                last_answered = i
         
         return "\n".join(lines)
     
-    def _process_single_block_fast(self, prompt: str, block_idx: int, block: List[Dict]) -> List[Dict]:
+    def _build_block_prompts(self, modules: Tuple[PromptModule, ...], block_text: str) -> List[Tuple[str, str]]:
+        """Prompts do bloco: (prompt, nome do módulo ou None se são todos juntos)"""
+        prompt = self.prompt_system.build_prompt(modules, block_text)
+        
+        # ~3 caracteres por token em português (estimativa conservadora); a
+        # divisão dos módulos só é montada para os blocos que passam do limite
+        if len(prompt) // 3 <= self.max_prompt_tokens:
+            return [(prompt, None)]
+        
+        base = [module for module in modules if module.name in self.prompt_system.ALWAYS_ON]
+        extras = [module for module in modules if module.name not in self.prompt_system.ALWAYS_ON]
+        if len(extras) < 2:
+            return [(prompt, None)]
+        
+        self.logger.warning(f"Bloco grande demais para um prompt só - enviando {len(extras)} módulos separados")
+        
+        # Formato + proteções + texto formam um prefixo idêntico em todas as
+        # chamadas do bloco (cache de prefixo do provedor); só a instrução do
+        # módulo, no fim, muda
+        shared = self.prompt_system.build_prompt(base, block_text)
+        return [(f"{shared}\n\n{module.content}", module.name) for module in extras]
+    
+    async def _process_blocks_async(self, all_prompts: List[tuple], callback=None) -> List[List[Dict]]:
+        """Processa os blocos numa janela deslizante de blocos em andamento
+        
+        Assim que um bloco termina o próximo entra. O tamanho da janela começa
+        em max_workers (ou no último valor aprendido para o modelo) e o
+        ConcurrencyTuner o ajusta conforme a API responde ou pede rate limit.
+        
+        Args:
+            all_prompts: Lista de tuplas (prompt, índice do bloco, bloco, texto do bloco, módulo)
+        """
+        total = len(all_prompts)
+        results: List[List[Dict]] = [None] * total
+        pending = iter(enumerate(all_prompts))
+        running = {}
+        completed = 0
+        tuner = ConcurrencyTuner(getattr(self.api_client, 'model', 'padrao'), initial=self.max_workers,
+                                 maximum=max(16, self.max_workers),
+                                 throttles=getattr(self.api_client, 'throttle_count', 0))
+        
+        def start_next() -> bool:
+            item = next(pending, None)
+            if item is None:
+                return False
+            position, args = item
+            running[asyncio.ensure_future(self._process_single_block_async(*args, tuner=tuner))] = position
+            return True
+        
+        # Conexões HTTP abertas uma vez e reaproveitadas por todos os blocos
+        # (clientes sem pool, como os de teste, seguem sem)
+        connection_pool = getattr(self.api_client, 'connection_pool', None)
+        async with (connection_pool(tuner.maximum) if connection_pool else contextlib.nullcontext()):
+            while len(running) < tuner.limit and start_next():
+                pass
+            
+            while running:
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    results[running.pop(task)] = task.result()
+                    
+                    # Tudo roda na mesma thread do event loop: o contador dispensa lock
+                    completed += 1
+                    if callback:
+                        callback(completed, total, f"Processando {completed}/{total}")
+                
+                # O limite pode ter mudado: completa a janela até ele (se caiu, só
+                # para de repor até as tarefas em andamento ficarem abaixo dele)
+                while len(running) < tuner.limit and start_next():
+                    pass
+        
+        tuner.save()
+        self.logger.info(f"Concorrência ao final: {tuner.limit} blocos simultâneos")
+        return results
+    
+    async def _process_single_block_async(self, prompt: str, block_idx: int, block: List[ParagraphRecord],
+                                          block_text: str = None, module_name: str = None,
+                                          tuner: ConcurrencyTuner = None) -> List[Dict]:
         """Processa um único bloco rapidamente"""
         try:
-            # Chama API
-            corrections = self.api_client.identify_errors_precise(prompt, block_idx)
-            
-            # Mapeia correções para índices globais
-            if corrections:
-                for corr in corrections:
-                    para_num_in_block = corr.get('paragraph', 0)
-                    if 0 < para_num_in_block <= len(block):
-                        global_para_index = block[para_num_in_block - 1]['index']
-                        corr['paragraph'] = global_para_index
+            corrections = self._cached_corrections(prompt, block, block_text, module_name)
+            if corrections is None:
+                # Chama API
+                corrections = await self.api_client.identify_errors_precise_async(prompt, block_idx)
+                self._store_corrections(prompt, corrections, block, block_text, module_name)
+                
+                # Só chamadas reais contam para o ajuste (respostas do cache não dizem nada da API)
+                if tuner is not None:
+                    tuner.record(not isinstance(corrections, NoAnswer),
+                                 getattr(self.api_client, 'throttle_count', 0))
             
-            return corrections
+            return self._to_global_corrections(corrections, block, module_name)
             
         except Exception as e:
             self.logger.error(f"Erro no bloco {block_idx}: {str(e)}")
             return []
     
-    def _apply_corrections_fast(self, doc: Document, corrections: List[Dict]):
+    def _process_blocks_bulk(self, all_prompts: List[tuple], callback=None) -> List[List[Dict]]:
+        """Mesmo resultado de _process_blocks_async, mas pela Batch API (metade do custo, demora mais)
+        
+        Só os prompts sem resposta em cache vão no lote; o custom_id é a
+        posição em all_prompts, única mesmo quando um bloco foi dividido por módulo.
+        """
+        cached = [self._cached_corrections(prompt, block, block_text, module_name)
+                  for prompt, _, block, block_text, module_name in all_prompts]
+        pending = [(all_prompts[position][0], position) for position, corrections in enumerate(cached) if corrections is None]
+        
+        if pending:
+            self.logger.info(f"Enviando {len(pending)} prompts pela Batch API")
+            
+            def store(position: int, corrections: List[Dict]):
+                # Guardada assim que a linha do resultado é lida, como no caminho assíncrono
+                prompt, _, block, block_text, module_name = all_prompts[position]
+                self._store_corrections(prompt, corrections, block, block_text, module_name)
+            
+            fetched = self.api_client.identify_errors_bulk(pending, callback, on_result=store)
+            for (_, position), corrections in zip(pending, fetched):
+                cached[position] = corrections
+        
+        return [self._to_global_corrections(corrections, item[2], item[4])
+                for corrections, item in zip(cached, all_prompts)]
+    
+    def _cached_corrections(self, prompt: str, block: List[ParagraphRecord], block_text: str = None, module_name: str = None):
+        """Correções já conhecidas para o prompt (cache exato ou semântico), ou None"""
+        # Mesmo prompt já respondido antes (ex.: documento revisado de novo): não chama a API
+        if self.response_cache is not None:
+            corrections = self.response_cache.get(_prompt_cache_key(self.api_client.model, prompt))
+            if corrections is not None:
+                return corrections
+        
+        # Senão, a resposta de um bloco quase idêntico. Lá o parágrafo de cada
+        # correção é a posição no bloco (ver _block_positions), e o erro precisa
+        # estar no parágrafo da mesma posição deste bloco
+        if self.semantic_cache is not None and block_text and module_name is None:
+            similar = self.semantic_cache.lookup(self.mode, _RE_POSITION_TAG.sub('', block_text))
+            if similar:
+                reused = [
+                    corr for corr in similar
+                    if isinstance(corr.get('paragraph'), int) and 0 < corr['paragraph'] <= len(block)
+                    and corr.get('error') and corr['error'] in block[corr['paragraph'] - 1].text
+                ]
+                # Só vale se todas servirem: com uma a menos o bloco ficaria sem
+                # revisão (uma lista, mesmo vazia, não vai à API). Volta com o
+                # índice global, que _to_global_corrections reconhece sem ambiguidade
+                if len(reused) == len(similar):
+                    return [dict(corr, paragraph=block[corr['paragraph'] - 1].index) for corr in reused]
+        return None
+    
+    def _store_corrections(self, prompt: str, corrections: List[Dict], block: List[ParagraphRecord] = None,
+                           block_text: str = None, module_name: str = None):
+        """Guarda a resposta da API nos caches"""
+        # Falha da API não é guardada; "nenhuma correção" é, e o bloco não volta
+        # para a API quando o documento é retomado depois de uma interrupção
+        if isinstance(corrections, NoAnswer) or self.response_cache is None:
+            return
+        
+        cache_key = _prompt_cache_key(self.api_client.model, prompt)
+        self.response_cache.set(cache_key, corrections)
+        if corrections and self.semantic_cache is not None and block and block_text and module_name is None:
+            # O número que o modelo devolve (o da marca [P<n>]) não serve para
+            # outra cópia do texto: o cache semântico guarda, numa entrada à
+            # parte, as correções com a posição de cada uma no bloco
+            positioned = self._block_positions(corrections, block)
+            if positioned:
+                semantic_key = ResponseCache.key('semantico', cache_key)
+                self.response_cache.set(semantic_key, positioned)
+                # Sem as marcas de posição: o mesmo texto em outra página (ou em
+                # outro documento) é comparado só pelo conteúdo
+                self.semantic_cache.add(self.mode, _RE_POSITION_TAG.sub('', block_text), semantic_key)
+    
+    @staticmethod
+    def _block_positions(corrections: List[Dict], block: List[ParagraphRecord]):
+        """As correções com o parágrafo trocado pela posição no bloco (1, 2...), ou None
+        
+        O modelo costuma repetir o número da marca [P<n>] (o índice global),
+        mas pode responder com a posição no bloco: vale a leitura que aponta
+        para um parágrafo que contém o erro. None se alguma não for localizada.
+        """
+        by_index = {para.index: position for position, para in enumerate(block, 1)}
+        positioned = []
+        for corr in corrections:
+            position = SmartDocumentProcessor._locate(corr, block, by_index)
+            if position is None:
+                return None
+            positioned.append(dict(corr, paragraph=position))
+        return positioned
+    
+    @staticmethod
+    def _locate(corr: Dict, block: List[ParagraphRecord], by_index: Dict[int, int]):
+        """Posição no bloco (1, 2...) do parágrafo da correção, ou None
+        
+        Primeiro como índice global ([P<n>]), depois como posição no bloco;
+        só vale a leitura cujo parágrafo contém o erro. Blocos juntados por
+        _pack_small_blocks pulam os parágrafos protegidos, então um mesmo
+        número pode ser as duas coisas em parágrafos diferentes.
+        """
+        number = corr.get('paragraph')
+        error = corr.get('error')
+        if not isinstance(number, int) or not error:
+            return None
+        for position in (by_index.get(number), number if 0 < number <= len(block) else None):
+            if position and error in block[position - 1].text:
+                return position
+        return None
+    
+    def _to_global_corrections(self, corrections: List[Dict], block: List[ParagraphRecord], module_name: str = None) -> List[Dict]:
+        """Mapeia os números de parágrafo da resposta para índices globais"""
+        if corrections:
+            by_index = {para.index: position for position, para in enumerate(block, 1)}
+            for corr in corrections:
+                if module_name:
+                    corr['module'] = module_name
+                position = self._locate(corr, block, by_index)
+                if position is None:
+                    # Erro em nenhum dos dois: fica a marca ecoada, se for do bloco
+                    number = corr.get('paragraph', 0)
+                    position = by_index.get(number) or (number if isinstance(number, int) and 0 < number <= len(block) else None)
+                if position:
+                    corr['paragraph'] = block[position - 1].index
+        
+        return corrections
+    
+    def _apply_corrections_fast(self, doc: Document, corrections: List[Dict], all_paragraphs: List[ParagraphRecord]):
         """Aplicação otimizada com relatório por página"""
         # Agrupa por página primeiro
-        corrections_by_page = {}
-        
-        # Mapeia parágrafos com páginas
-        para_map = {}
-        para_counter = 0
-        paragraphs_per_page = 30
-        
-        for i, para in enumerate(doc.paragraphs):
-            if para.text.strip():
-                para_counter += 1
-                estimated_page = (i // paragraphs_per_page) + 1
-                para_map[para_counter] = {
-                    'paragraph': para,
-                    'page': estimated_page
-                }
-        
-        # Organiza correções por página
+        corrections_by_page = defaultdict(list)
+        by_paragraph = defaultdict(list)
+        
+        # A extração numera os parágrafos em sequência a partir de 1: o
+        # registro (página e posição no documento) sai direto pelo número
+        total_paragraphs = len(all_paragraphs)
+        
+        # Organiza correções por página e por parágrafo numa passada só
         for corr in corrections:
             para_num = corr.get('paragraph', 0)
-            if para_num in para_map:
-                page = para_map[para_num]['page']
-                if page not in corrections_by_page:
-                    corrections_by_page[page] = []
+            if 0 < para_num <= total_paragraphs:
+                page = all_paragraphs[para_num - 1].page
                 corr['page'] = page
-                corr['location'] = f"Página {page}, Parágrafo {para_num}"
+                if self.pages_estimated:
+                    corr['location'] = f"Página ~{page} (estimada), Parágrafo {para_num}"
+                else:
+                    corr['location'] = f"Página {page}, Parágrafo {para_num}"
                 corrections_by_page[page].append(corr)
+                by_paragraph[para_num].append(corr)
         
         # Log de correções por página
-        self.logger.info("**CORREÇÕES POR PÁGINA:**")
+        self.logger.info("**CORREÇÕES POR PÁGINA (ESTIMADA):**" if self.pages_estimated else "**CORREÇÕES POR PÁGINA:**")
         for page in sorted(corrections_by_page.keys()):
             self.logger.info(f"  Página {page}: {len(corrections_by_page[page])} correções")
         
-        # Aplica correções
+        # Aplica correções: todas as de um parágrafo numa passada só pelo texto;
+        # só os parágrafos corrigidos são procurados no documento reaberto
+        paragraphs = doc.paragraphs
         applied_count = 0
-        for corr in corrections:
-            para_num = corr.get('paragraph', 0)
-            if para_num in para_map:
-                paragraph = para_map[para_num]['paragraph']
-                current_text = paragraph.text
-                
-                error = corr.get('error', '')
-                correction = corr.get('correction', '')
-                
-                if error and correction and error in current_text:
-                    current_text = current_text.replace(error, correction, 1)
-                    paragraph.text = current_text
+        for para_num, para_corrections in by_paragraph.items():
+            paragraph = paragraphs[all_paragraphs[para_num - 1].doc_index]
+            runs = paragraph.runs
+            run_texts = [run.text for run in runs]
+            spans = self._find_correction_spans("".join(run_texts), para_corrections)  # O mesmo que paragraph.text
+            if spans:
+                self._apply_spans_to_runs(runs, run_texts, spans)
+                applied_count += len(spans)
         
         self.logger.info(f"Total de correções aplicadas: {applied_count}")
     
+    @staticmethod
+    def _apply_spans_to_runs(runs: list, run_texts: List[str], spans: List[Tuple[int, int, str]]):
+        """Substitui os trechos editando só os runs atingidos
+        
+        Diferente de paragraph.text = ..., que apaga todos os runs e cria um
+        só (perde negrito/itálico e recria o XML do parágrafo). A correção
+        entra no run onde o erro começa; se o erro atravessa runs, os do meio
+        ficam vazios e o último perde só a parte do erro.
+        
+        Uma passada só da esquerda para a direita: cada run junta suas partes
+        (trechos mantidos + correções) e é montado com um único join, em vez
+        de uma string nova a cada correção.
+        """
+        # Início (no texto original) de cada run
+        starts = []
+        position = 0
+        for run_text in run_texts:
+            starts.append(position)
+            position += len(run_text)
+        total = position
+        parts = [[] for _ in run_texts]
+        
+        def keep(begin: int, end: int):
+            """Copia o texto original de [begin, end) para as partes dos runs"""
+            i = max(bisect_right(starts, begin) - 1, 0)
+            while begin < end:
+                run_end = starts[i] + len(run_texts[i])
+                if run_end > begin:
+                    piece_end = min(end, run_end)
+                    parts[i].append(run_texts[i][begin - starts[i]:piece_end - starts[i]])
+                    begin = piece_end
+                i += 1
+        
+        cursor = 0
+        for start, end, correction in spans:
+            keep(cursor, start)
+            # Run onde o erro começa: o último que começa em start ou antes, com texto
+            owner = bisect_right(starts, start) - 1
+            while not run_texts[owner] or starts[owner] + len(run_texts[owner]) <= start:
+                owner += 1
+            parts[owner].append(correction)
+            cursor = end
+        keep(cursor, total)
+        
+        for run, run_text, run_parts in zip(runs, run_texts, parts):
+            new_text = "".join(run_parts)
+            if new_text != run_text:
+                run.text = new_text
+    
+    @staticmethod
+    def _find_correction_spans(text: str, corrections: List[Dict]) -> List[Tuple[int, int, str]]:
+        """Trechos (início, fim, correção) do texto a substituir, sem sobreposição
+        
+        Todos os erros são localizados numa varredura só (Aho-Corasick), em vez
+        de um replace por correção. A n-ésima ocorrência de um erro vai para a
+        n-ésima correção com esse erro; em conflito vale o trecho que começa
+        antes (e, no mesmo início, o mais longo).
+        """
+        queues = {}
+        for corr in corrections:
+            error = corr.get('error', '')
+            correction = corr.get('correction', '')
+            if error and correction:
+                queues.setdefault(error, deque()).append(correction)
+        if not queues:
+            return []
+        
+        if ahocorasick is not None:
+            automaton = ahocorasick.Automaton()
+            for error in queues:
+                automaton.add_word(error, error)
+            automaton.make_automaton()
+            matches = sorted(((end - len(error) + 1, -len(error), error) for end, error in automaton.iter(text)))
+        else:
+            # Sem o autômato: todas as ocorrências de cada erro, inclusive as
+            # sobrepostas e as mais curtas, como o automaton.iter devolve (uma
+            # alternância de regex pularia as que começam dentro de outra)
+            matches = []
+            for error in queues:
+                start = text.find(error)
+                while start >= 0:
+                    matches.append((start, -len(error), error))
+                    start = text.find(error, start + 1)
+            matches.sort()
+        
+        spans = []
+        position = 0
+        for start, negative_length, error in matches:
+            if start < position or not queues[error]:
+                continue
+            end = start - negative_length
+            spans.append((start, end, queues[error].popleft()))
+            position = end
+        return spans
+    
     def _save_page_report(self, output_path: str, corrections: List[Dict]):
         """Salva relatório organizado por páginas"""
         # Organiza por página
-        by_page = {}
+        by_page = defaultdict(list)
         for corr in corrections:
             page = corr.get('page', 0)
-            if page not in by_page:
-                by_page[page] = []
             by_page[page].append({
                 'paragrafo': corr.get('paragraph'),
                 'erro': corr.get('error'),
@@ -372,6 +838,7 @@ class SmartDocumentProcessor:
         report = {
             'total_correções': len(corrections),
             'total_páginas_com_correções': len(by_page),
+            'páginas_estimadas': self.pages_estimated,  # True: só pelas quebras manuais, sem a paginação do Word
             'correções_por_página': {}
         }
         
@@ -384,7 +851,20 @@ class SmartDocumentProcessor:
         
         # Salva JSON
         report_path = output_path.replace('.docx', '_relatorio_paginas.json')
-        with open(report_path, 'w', encoding='utf-8') as f:
-            json.dump(report, f, ensure_ascii=False, indent=2)
+        JSONHandler.save(report_path, report)
         
-        self.logger.info(f"Relatório salvo em: {report_path}")
\ No newline at end of file
+        self.logger.info(f"Relatório salvo em: {report_path}")
+
+
+# Processador de cada processo de trabalho (criado uma vez, no início do processo)
+_worker_processor = None
+
+def _init_worker(api_client, mode: str, use_cache: bool, semantic_cache: bool, batch_mode: bool):
+    """Inicializador do pool de documentos: cada processo tem o seu cache e event loop"""
+    global _worker_processor
+    _worker_processor = SmartDocumentProcessor(api_client, mode=mode, use_cache=use_cache,
+                                               semantic_cache=semantic_cache, batch_mode=batch_mode)
+
+def _process_one(input_path: str, output_path: str) -> str:
+    """Executado no pool de processos: revisa um documento inteiro"""
+    return _worker_processor.process_document(input_path, output_path)
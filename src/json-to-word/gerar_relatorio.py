@@ -2,76 +2,184 @@ import json
 import os
 import re
 import difflib
-from docx import Document
-from docx.shared import RGBColor, Pt
-from docx.enum.text import WD_ALIGN_PARAGRAPH
+import zipfile
+import concurrent.futures
+from xml.sax.saxutils import escape
+import docx
+
+try:
+    from rapidfuzz.distance import Indel
+except ImportError:  # Sem rapidfuzz: usa o difflib
+    Indel = None
+
+try:
+    import ijson
+except ImportError:  # Sem ijson: o JSON é carregado inteiro
+    ijson = None
+
+# Palavras e os separadores entre elas (juntos reconstroem o texto)
+_WORD_RE = re.compile(r'\w+|\W+')
+
+# O relatório usa as partes fixas (estilos, tema, seção) do modelo do python-docx
+_MODELO_DOCX = os.path.join(os.path.dirname(docx.__file__), 'templates', 'default.docx')
+_VERMELHO = 'FF0000'
+_VERDE = '008000'
+
+# Tab e quebras viram elementos próprios (como no add_run do python-docx);
+# os demais caracteres de controle não são válidos em XML
+_RE_CONTROLE = re.compile(r'([\t\n\r])|[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+def _run(texto, negrito=False, riscado=False, cor=None, tamanho=None):
+    """XML de um run (<w:r>) com a formatação pedida; tamanho em pontos"""
+    propriedades = []
+    if negrito:
+        propriedades.append('<w:b/>')
+    if riscado:
+        propriedades.append('<w:strike/>')
+    if cor:
+        propriedades.append(f'<w:color w:val="{cor}"/>')
+    if tamanho:
+        propriedades.append(f'<w:sz w:val="{tamanho * 2}"/>')
+    
+    partes = ['<w:r>']
+    if propriedades:
+        partes.append(f'<w:rPr>{"".join(propriedades)}</w:rPr>')
+    inicio = 0
+    for match in _RE_CONTROLE.finditer(texto):
+        if match.start() > inicio:
+            partes.append(f'<w:t xml:space="preserve">{escape(texto[inicio:match.start()])}</w:t>')
+        if match.group(1) == '\t':
+            partes.append('<w:tab/>')
+        elif match.group(1):
+            partes.append('<w:br/>')
+        inicio = match.end()
+    if inicio < len(texto):
+        partes.append(f'<w:t xml:space="preserve">{escape(texto[inicio:])}</w:t>')
+    partes.append('</w:r>')
+    return ''.join(partes)
+
+class RelatorioDocx:
+    """Relatório montado direto como XML, sem a árvore lxml do python-docx.
+    
+    Cada parágrafo vira um trecho de texto; no fim o corpo é inserido no
+    document.xml do modelo e gravado no zip junto com as demais partes dele.
+    """
+    
+    def __init__(self):
+        self.corpo = []
+    
+    def paragrafo(self, *runs, estilo=None, centralizado=False):
+        """Acrescenta um parágrafo com os runs (XML de _run)"""
+        propriedades = ''
+        if estilo or centralizado:
+            propriedades = '<w:pPr>'
+            if estilo:
+                propriedades += f'<w:pStyle w:val="{estilo}"/>'
+            if centralizado:
+                propriedades += '<w:jc w:val="center"/>'
+            propriedades += '</w:pPr>'
+        self.corpo.append(f'<w:p>{propriedades}{"".join(runs)}</w:p>')
+    
+    def titulo(self, texto, nivel):
+        """Título (nível 0) ou cabeçalho de seção (níveis 1 a 9)"""
+        self.paragrafo(_run(texto), estilo='Title' if nivel == 0 else f'Heading{nivel}')
+    
+    def salvar(self, caminho):
+        """Grava o .docx: as partes do modelo e o document.xml com o corpo"""
+        with zipfile.ZipFile(_MODELO_DOCX) as modelo, \
+                zipfile.ZipFile(caminho, 'w', zipfile.ZIP_DEFLATED) as saida:
+            for item in modelo.infolist():
+                conteudo = modelo.read(item.filename)
+                if item.filename == 'word/document.xml':
+                    # O corpo entra antes das configurações de seção, que fecham o <w:body>
+                    documento = conteudo.decode('utf-8')
+                    posicao = documento.index('<w:sectPr')
+                    conteudo = (documento[:posicao] + ''.join(self.corpo) + documento[posicao:]).encode('utf-8')
+                saida.writestr(item.filename, conteudo)
+
+def _opcodes_por_palavra(palavras_orig, palavras_rev):
+    """Opcodes no formato do difflib (tag, i1, i2, j1, j2)
+    
+    Com rapidfuzz o diff é feito em C++; remoção e inserção vizinhas viram um
+    replace só, como no SequenceMatcher.
+    """
+    if Indel is None:
+        return difflib.SequenceMatcher(None, palavras_orig, palavras_rev).get_opcodes()
+    
+    opcodes = []
+    for tag, i1, i2, j1, j2 in Indel.opcodes(palavras_orig, palavras_rev):
+        if tag != 'equal' and opcodes and opcodes[-1][0] != 'equal':
+            _, k1, _, l1, _ = opcodes[-1]
+            opcodes[-1] = ('replace', k1, i2, l1, j2)
+        else:
+            opcodes.append((tag, i1, i2, j1, j2))
+    return opcodes
 
 def adicionar_paragrafo_com_destaque_por_palavra(doc, texto_original, texto_revisado):
     """
     Adiciona um parágrafo ao documento, destacando as diferenças PALAVRA POR PALAVRA.
     """
-    p = doc.add_paragraph()
-    p.add_run("Resultado Visual: ").bold = True
+    runs = [_run("Resultado Visual: ", negrito=True)]
     
-    palavras_orig = re.findall(r'\w+|\W+', texto_original)
-    palavras_rev = re.findall(r'\w+|\W+', texto_revisado)
-
-    matcher = difflib.SequenceMatcher(None, palavras_orig, palavras_rev)
+    palavras_orig = _WORD_RE.findall(texto_original)
+    palavras_rev = _WORD_RE.findall(texto_revisado)
     
-    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+    for tag, i1, i2, j1, j2 in _opcodes_por_palavra(palavras_orig, palavras_rev):
         if tag == 'replace':
-            run_del = p.add_run("".join(palavras_orig[i1:i2]))
-            run_del.font.strike = True
-            run_del.font.color.rgb = RGBColor(0xFF, 0x00, 0x00)
-            
-            run_add = p.add_run("".join(palavras_rev[j1:j2]))
-            run_add.font.color.rgb = RGBColor(0x00, 0x80, 0x00)
-            run_add.font.bold = True
+            runs.append(_run("".join(palavras_orig[i1:i2]), riscado=True, cor=_VERMELHO))
+            runs.append(_run("".join(palavras_rev[j1:j2]), negrito=True, cor=_VERDE))
             
         elif tag == 'delete':
-            run_del = p.add_run("".join(palavras_orig[i1:i2]))
-            run_del.font.strike = True
-            run_del.font.color.rgb = RGBColor(0xFF, 0x00, 0x00)
+            runs.append(_run("".join(palavras_orig[i1:i2]), riscado=True, cor=_VERMELHO))
             
         elif tag == 'insert':
-            run_add = p.add_run("".join(palavras_rev[j1:j2]))
-            run_add.font.color.rgb = RGBColor(0x00, 0x80, 0x00)
-            run_add.font.bold = True
+            runs.append(_run("".join(palavras_rev[j1:j2]), negrito=True, cor=_VERDE))
             
         elif tag == 'equal':
-            p.add_run("".join(palavras_orig[i1:i2]))
+            runs.append(_run("".join(palavras_orig[i1:i2])))
+    
+    doc.paragrafo(*runs)
 
 def adicionar_separador(doc):
     """Adiciona um parágrafo de espaçamento e uma linha horizontal."""
-    doc.add_paragraph() # Espaço extra
-    separator_p = doc.add_paragraph()
-    run = separator_p.add_run('—' * 70)
-    run.font.size = Pt(8)
-    separator_p.alignment = WD_ALIGN_PARAGRAPH.CENTER
-    doc.add_paragraph() # Espaço extra
-
-def processar_formato_agrupado(data, doc):
-    """Processa o JSON no formato original (agrupado por página)."""
-    correcoes_por_pagina = data.get("correções_por_página", {})
+    doc.paragrafo() # Espaço extra
+    doc.paragrafo(_run('—' * 70, tamanho=8), centralizado=True)
+    doc.paragrafo() # Espaço extra
+
+def processar_formato_agrupado(paginas, doc):
+    """Processa o JSON no formato original (agrupado por página).
     
+    `paginas` são os pares (nome, dados) de 'correções_por_página', na ordem
+    do arquivo - podem vir de um dict ou ser lidos um a um (_paginas_em_fluxo).
+    """
     is_first_page_section = True
-    for nome_pagina, dados_pagina in sorted(correcoes_por_pagina.items()):
+    for nome_pagina, dados_pagina in paginas:
         if not is_first_page_section:
             adicionar_separador(doc)
         is_first_page_section = False
         
         numero_pagina = nome_pagina.split('_')[-1]
-        doc.add_heading(f'Correções na Página {numero_pagina}', level=1)
+        doc.titulo(f'Correções na Página {numero_pagina}', 1)
         
         for i, correcao in enumerate(dados_pagina.get("correções", [])):
             # ... (código do item de correção)
-            p_titulo = doc.add_paragraph()
-            p_titulo.add_run(f"Item de Correção {i+1} (Parágrafo: {correcao.get('paragrafo', 'N/A')})").bold = True
+            doc.paragrafo(_run(f"Item de Correção {i+1} (Parágrafo: {correcao.get('paragrafo', 'N/A')})", negrito=True))
             adicionar_paragrafo_com_destaque_por_palavra(doc, correcao.get("erro", ""), correcao.get("correcao", ""))
             
             # Adiciona um separador mais simples entre itens da mesma página
             if i < len(dados_pagina.get("correções", [])) - 1:
-                doc.add_paragraph('---' * 10)
+                doc.paragrafo(_run('---' * 10))
+
+def texto_integral(data, mudanca, chave):
+    """Resolve o texto integral de uma mudança ('original' ou 'revised').
+
+    Relatórios novos guardam os textos uma única vez em 'textos' e cada mudança
+    aponta para eles por índice; relatórios antigos trazem '<chave>_full'.
+    """
+    indice = mudanca.get(f"{chave}_idx")
+    if indice is not None:
+        return data.get("textos", [])[indice]
+    return mudanca.get(f"{chave}_full", "")
 
 def processar_formato_lista(data, doc):
     """Processa o JSON no novo formato (lista plana de 'todas_mudancas')."""
@@ -89,18 +197,30 @@ def processar_formato_lista(data, doc):
             adicionar_separador(doc)
         is_first_page_section = False
 
-        doc.add_heading(f'Correções na Página {pagina}', level=1)
+        doc.titulo(f'Correções na Página {pagina}', 1)
         correcoes_da_pagina = mudancas_agrupadas[pagina]
 
         for i, correcao in enumerate(correcoes_da_pagina):
             # ... (código do item de correção)
-            p_titulo = doc.add_paragraph()
-            p_titulo.add_run(f"Item de Correção {i+1} (Parágrafo: {correcao.get('paragraph_number', 'N/A')})").bold = True
-            adicionar_paragrafo_com_destaque_por_palavra(doc, correcao.get("original_full", ""), correcao.get("revised_full", ""))
+            doc.paragrafo(_run(f"Item de Correção {i+1} (Parágrafo: {correcao.get('paragraph_number', 'N/A')})", negrito=True))
+            adicionar_paragrafo_com_destaque_por_palavra(doc, texto_integral(data, correcao, "original"), texto_integral(data, correcao, "revised"))
 
             # Adiciona um separador mais simples entre itens da mesma página
             if i < len(correcoes_da_pagina) - 1:
-                 doc.add_paragraph('---' * 10)
+                 doc.paragrafo(_run('---' * 10))
+
+def _detectar_formato(json_file):
+    """Chave de topo que indica o formato ('correções_por_página' ou 'todas_mudancas'), lida em fluxo"""
+    with open(json_file, 'rb') as f:
+        for prefixo, evento, valor in ijson.parse(f):
+            if prefixo == '' and evento == 'map_key' and valor in ('correções_por_página', 'todas_mudancas'):
+                return valor
+    return None
+
+def _paginas_em_fluxo(json_file):
+    """(nome, dados) de cada página do formato agrupado, uma de cada vez na memória"""
+    with open(json_file, 'rb') as f:
+        yield from ijson.kvitems(f, 'correções_por_página')
 
 def criar_relatorio_de_arquivo(json_file):
     """Função principal que detecta o formato do JSON e gera o relatório."""
@@ -108,21 +228,34 @@ def criar_relatorio_de_arquivo(json_file):
     nome_base = os.path.splitext(json_file)[0]
     output_docx = f'relatorio_{nome_base}.docx'
 
+    # Com ijson o formato agrupado é lido página a página enquanto o relatório
+    # é montado; o formato de lista precisa do arquivo inteiro (os textos
+    # ficam em 'textos', que pode vir depois das mudanças)
+    data = None
     try:
-        with open(json_file, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        if ijson is not None:
+            formato = _detectar_formato(json_file)
+        if ijson is None or formato == 'todas_mudancas':
+            with open(json_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            formato = next((chave for chave in ('correções_por_página', 'todas_mudancas') if chave in data), None)
     except Exception as e:
         print(f"ERRO: Não foi possível ler ou decodificar o arquivo '{json_file}'. Detalhes: {e}")
         return
 
-    doc = Document()
-    doc.add_heading('Relatório de Correções do Livro', level=0)
-    doc.add_paragraph(f"Arquivo de origem: {json_file}\n")
+    doc = RelatorioDocx()
+    doc.titulo('Relatório de Correções do Livro', 0)
+    doc.paragrafo(_run(f"Arquivo de origem: {json_file}\n"))
 
-    if 'correções_por_página' in data:
+    if formato == 'correções_por_página':
         print(f"Detectado formato 'Agrupado por Página'. Gerando relatório...")
-        processar_formato_agrupado(data, doc)
-    elif 'todas_mudancas' in data:
+        paginas = data['correções_por_página'].items() if data is not None else _paginas_em_fluxo(json_file)
+        try:
+            processar_formato_agrupado(paginas, doc)
+        except Exception as e:
+            print(f"ERRO: Não foi possível ler ou decodificar o arquivo '{json_file}'. Detalhes: {e}")
+            return
+    elif formato == 'todas_mudancas':
         print(f"Detectado formato 'Lista de Mudanças'. Gerando relatório...")
         processar_formato_lista(data, doc)
     else:
@@ -130,11 +263,41 @@ def criar_relatorio_de_arquivo(json_file):
         return
 
     try:
-        doc.save(output_docx)
+        doc.salvar(output_docx)
         print(f"SUCESSO: Relatório '{output_docx}' foi criado.")
     except Exception as e:
         print(f"ERRO: Ocorreu um erro ao salvar o arquivo Word '{output_docx}'. Detalhes: {e}")
 
+def processar_arquivos(arquivos_json):
+    """Gera os relatórios de todos os arquivos, um processo por arquivo.
+    
+    Cada arquivo é independente e o trabalho é de CPU (diff + montagem do
+    docx), então threads não ajudariam; sem multiprocessamento segue em série.
+    """
+    workers = min(os.cpu_count() or 1, len(arquivos_json))
+    pendentes = dict.fromkeys(arquivos_json)  # Ainda sem relatório, na ordem original
+    if workers > 1:
+        futuros = {}
+        try:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+                futuros = {executor.submit(criar_relatorio_de_arquivo, nome): nome for nome in arquivos_json}
+                for futuro in concurrent.futures.as_completed(futuros):
+                    futuro.result()
+                    del pendentes[futuros[futuro]]
+                    print("-" * 50)
+            return
+        except (OSError, concurrent.futures.process.BrokenProcessPool) as e:
+            # Os que terminaram antes da quebra não são refeitos em série
+            for futuro, nome in futuros.items():
+                if nome in pendentes and futuro.done() and not futuro.cancelled() and futuro.exception() is None:
+                    del pendentes[nome]
+                    print("-" * 50)
+            print(f"AVISO: Processamento paralelo indisponível, seguindo em série com {len(pendentes)} arquivo(s). Detalhes: {e}")
+    
+    for nome_do_arquivo in pendentes:
+        criar_relatorio_de_arquivo(nome_do_arquivo)
+        print("-" * 50)
+
 # --- INÍCIO DA EXECUÇÃO ---
 if __name__ == "__main__":
     arquivos_json = [f for f in os.listdir('.') if f.endswith('.json')]
@@ -143,8 +306,6 @@ if __name__ == "__main__":
         print("Nenhum arquivo .json foi encontrado na pasta.")
     else:
         print(f"Encontrados {len(arquivos_json)} arquivos JSON. Iniciando processamento...\n")
-        for nome_do_arquivo in arquivos_json:
-            criar_relatorio_de_arquivo(nome_do_arquivo)
-            print("-" * 50)
+        processar_arquivos(arquivos_json)
     
     print("\nProcessamento de todos os arquivos concluído.")
\ No newline at end of file
@@ -1,9 +1,130 @@
 import openai
+import aiohttp
+import requests
 import time
+import random
+import threading
+import asyncio
 import logging
-import json
 import re
+import io
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from itertools import count
 from typing import List, Dict
+from openai.api_resources.abstract import CreateableAPIResource
+from .json_utils import JSONHandler
+
+try:
+    import tiktoken
+except ImportError:  # Sem tiktoken: estima ~3 caracteres por token
+    tiktoken = None
+
+class NoAnswer(list):
+    """Lista vazia de uma chamada sem resposta válida (falha da API ou JSON inválido)
+    
+    Para quem só lê as correções é um [] comum; os caches usam o tipo para não
+    gravar uma falha como se fosse "nenhuma correção".
+    """
+
+# Duração nos cabeçalhos x-ratelimit-reset-* ("1s", "6m0s", "20ms")
+_RE_DURATION_PART = re.compile(r'(\d+(?:\.\d+)?)(ms|h|m|s)')
+_DURATION_UNITS = {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600}
+
+# Objeto JSON no meio de uma resposta com texto em volta
+_RE_JSON_OBJECT = re.compile(r'\{.*\}', re.DOTALL)
+
+@lru_cache(maxsize=None)
+def _encoding_for(model: str):
+    """Tokenizador do modelo, ou None (sem tiktoken, modelo desconhecido ou sem o arquivo do tokenizador)"""
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except Exception:  # KeyError para modelo desconhecido; erro de rede se o arquivo não está baixado
+        return None
+
+def _count_tokens(model: str, text: str) -> int:
+    """Tokens do texto no modelo (~3 caracteres por token em português sem o tiktoken)"""
+    encoding = _encoding_for(model)
+    if encoding is None:
+        return len(text) // 3
+    return len(encoding.encode(text, disallowed_special=()))
+
+class _RateLimits:
+    """Cota de requisições e de tokens informada pela própria API
+    
+    Cada resposta traz nos cabeçalhos x-ratelimit-* quanto resta da cota por
+    minuto (requisições e tokens) e em quanto tempo ela se recompõe. Com
+    isso a chamada só espera quando a cota acabou, em vez de um intervalo
+    fixo entre todas. Um valor só vale até o seu reset; sem nenhum, a cota
+    é desconhecida.
+    """
+    
+    def __init__(self):
+        self.requests = None
+        self.tokens = None
+        self.requests_reset_at = 0.0
+        self.tokens_reset_at = 0.0
+    
+    def update(self, headers):
+        """Atualiza a cota com os cabeçalhos de uma resposta"""
+        now = time.monotonic()
+        requests = headers.get('x-ratelimit-remaining-requests')
+        if requests is not None:
+            self.requests = int(requests)
+            self.requests_reset_at = now + _parse_duration(headers.get('x-ratelimit-reset-requests', ''))
+        tokens = headers.get('x-ratelimit-remaining-tokens')
+        if tokens is not None:
+            self.tokens = int(tokens)
+            self.tokens_reset_at = now + _parse_duration(headers.get('x-ratelimit-reset-tokens', ''))
+    
+    def known(self) -> bool:
+        now = time.monotonic()
+        return now < self.requests_reset_at or now < self.tokens_reset_at
+    
+    async def acquire(self, tokens: int):
+        """Espera até haver cota para uma requisição de `tokens` e a desconta"""
+        while True:
+            now = time.monotonic()
+            wait = 0.0
+            if self.requests is not None and self.requests < 1 and now < self.requests_reset_at:
+                wait = self.requests_reset_at - now
+            if self.tokens is not None and self.tokens < tokens and now < self.tokens_reset_at:
+                wait = max(wait, self.tokens_reset_at - now)
+            if wait <= 0:
+                break
+            await asyncio.sleep(wait)
+        
+        # Desconta já, para as outras tarefas não contarem com a mesma cota
+        if self.requests is not None:
+            self.requests -= 1
+        if self.tokens is not None:
+            self.tokens -= tokens
+
+def _parse_duration(value: str) -> float:
+    """Segundos de uma duração como "6m0s" (0 se vazia ou inválida)"""
+    return sum(float(number) * _DURATION_UNITS[unit] for number, unit in _RE_DURATION_PART.findall(value))
+
+# Modelos que aceitam response_format={"type": "json_object"} (o gpt-4
+# original recusa o parâmetro)
+_JSON_MODE_MODELS = ('gpt-4.1', 'gpt-4o', 'gpt-4-turbo', 'gpt-5')
+
+def _install_requests_session(pool_size: int = 16):
+    """Uma sessão HTTP do processo para as chamadas síncronas do openai
+    
+    Sem ela o openai 0.28 mantém uma sessão por thread e a recria a cada
+    3 minutos (conexão TCP + TLS nova), com o pool padrão de 10 conexões.
+    Com uma sessão só, as threads reaproveitam as mesmas conexões.
+    """
+    if openai.requestssession is None:
+        session = requests.Session()
+        session.mount('https://', requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+        openai.requestssession = session
+
+class Batch(CreateableAPIResource):
+    """Batch API (/v1/batches) - o openai 0.28 não traz este recurso"""
+    OBJECT_NAME = "batches"
 
 class OpenAIClient:
     """Cliente para API OpenAI - Versão Otimizada com Retry"""
@@ -11,6 +132,7 @@ class OpenAIClient:
     def __init__(self, api_key: str, model: str = "gpt-4.1"):
         self.api_key = api_key  
         openai.api_key = api_key
+        _install_requests_session()
         # Usa GPT-4.1 como solicitado
         self.model = model  # Agora respeita o parâmetro, mas o padrão é gpt-4.1
         self.logger = logging.getLogger(__name__)
@@ -18,165 +140,457 @@ class OpenAIClient:
         # Configurações otimizadas para GPT-4.1
         self.temperature = 0  # Mais determinístico
         self.max_tokens = 4000  # Aumentado para processar mais correções por vez
+        self.min_completion_tokens = 256  # Piso do limite de resposta calculado por prompt
+        self.json_mode = True  # Desligado na primeira vez que a API recusar response_format
         
         # Rate limit para GPT-4 (muito menor que gpt-3.5)
         self.requests_per_minute = 60  # Limite mais baixo do GPT-4
         self.last_request_time = 0
         self.min_time_between_requests = 60.0 / self.requests_per_minute
-        self.retry_delays = [2, 5, 10, 20]  # Delays maiores para GPT-4
+        self._slot_lock = threading.Lock()  # Horários de chamada entre threads
+        
+        # Novas tentativas: esperas sorteadas entre retry_base e o triplo da
+        # anterior (até retry_cap), até retry_budget segundos desde a primeira
+        self.retry_base = 2.0
+        self.retry_cap = 60.0
+        self.retry_budget = 120.0
+        self._random = random.Random()
+        self.throttle_count = 0  # Rate limits recebidos (o ajuste de concorrência acompanha)
+        self.rate_limits = _RateLimits()  # Cota informada pela API (chamadas assíncronas)
+        self.last_batch_id = None  # Último lote da Batch API (para retomar com identify_errors_bulk)
+    
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_slot_lock']  # Lock não atravessa processos; o outro cria o seu
+        return state
+    
+    def __setstate__(self, state):
+        # Recebido por outro processo (pool de documentos): a chave global do
+        # openai e a sessão HTTP do processo vêm junto
+        self.__dict__.update(state)
+        self._slot_lock = threading.Lock()
+        openai.api_key = self.api_key
+        _install_requests_session()
+    
+    def _reserve_slot(self) -> float:
+        """Reserva o próximo horário de chamada e retorna quanto falta esperar
+        
+        Com o lock, threads (ou tarefas) concorrentes recebem horários
+        distintos em vez de passarem todas pela verificação ao mesmo tempo.
+        """
+        with self._slot_lock:
+            now = time.time()
+            wait = max(0.0, self.last_request_time + self.min_time_between_requests - now)
+            self.last_request_time = now + wait
+            return wait
     
     def identify_errors_precise(self, prompt: str, block_index: int = 0) -> List[Dict]:
         """
         Versão otimizada com retry e backoff exponencial
         """
         
-        # Controle de rate limit mais conservador
-        current_time = time.time()
-        time_since_last = current_time - self.last_request_time
-        if time_since_last < self.min_time_between_requests:
-            time.sleep(self.min_time_between_requests - time_since_last)
-        
-        self.last_request_time = time.time()
+        # Controle de rate limit mais conservador (seguro entre threads)
+        wait = self._reserve_slot()
+        if wait:
+            time.sleep(wait)
         
-        # Tentativas com retry
-        for attempt in range(len(self.retry_delays)):
+        # Tentativas com retry, até o prazo
+        max_tokens = self._completion_limit(prompt)
+        deadline = time.monotonic() + self.retry_budget
+        delay = None
+        for attempt in count():
             try:
-                # Prompt mais curto e direto
-                messages = [
-                    {
-                        "role": "system", 
-                        "content": "Você é um corretor. Responda APENAS com JSON válido."
-                    },
-                    {
-                        "role": "user", 
-                        "content": prompt
-                    }
-                ]
-                
                 # Chamada otimizada
                 start_time = time.time()
-                response = openai.ChatCompletion.create(
-                    model=self.model,
-                    messages=messages,
-                    temperature=0,
-                    max_tokens=self.max_tokens,
-                    top_p=1,  # Sem penalidades = mais rápido
-                    frequency_penalty=0,
-                    presence_penalty=0,
-                    n=1,  # Uma resposta só
-                    stream=False,  # Sem streaming
-                    request_timeout=120  # Timeout de 120 segundos para GPT-4.1
-                )
+                response = openai.ChatCompletion.create(**self._request_params(prompt, max_tokens))
                 
                 api_time = time.time() - start_time
                 self.logger.debug(f"Bloco {block_index}: API respondeu em {api_time:.2f}s")
                 
-                result = response.choices[0].message.content.strip()
+                if self._truncated(response, max_tokens, block_index):
+                    max_tokens = self.max_tokens
+                    continue
+                return self._parse_corrections(response.choices[0].message.content, block_index)
+            
+            except Exception as e:
+                delay = self._retry_delay(e, attempt, delay, deadline, block_index)
+                if delay is None:
+                    return NoAnswer()
+                time.sleep(delay)
+    
+    @asynccontextmanager
+    async def connection_pool(self, size: int = 16):
+        """Sessão HTTP compartilhada pelas chamadas assíncronas feitas dentro do bloco
+        
+        Sem ela o openai 0.28 abre uma sessão aiohttp (conexão TCP + TLS nova)
+        a cada acreate; com ela até `size` conexões ficam abertas (keep-alive)
+        e são reaproveitadas pelos blocos seguintes.
+        """
+        # A sessão também lê os cabeçalhos x-ratelimit-* de cada resposta, que
+        # o openai 0.28 descarta
+        trace = aiohttp.TraceConfig()
+        trace.on_request_end.append(self._on_request_end)
+        async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=size),
+                                         trace_configs=[trace]) as session:
+            token = openai.aiosession.set(session)
+            try:
+                yield session
+            finally:
+                openai.aiosession.reset(token)
+    
+    async def _on_request_end(self, session, context, params):
+        self.rate_limits.update(params.response.headers)
+    
+    async def identify_errors_precise_async(self, prompt: str, block_index: int = 0) -> List[Dict]:
+        """
+        Mesmo que identify_errors_precise, mas sem bloquear o event loop
+        
+        Permite disparar vários blocos ao mesmo tempo (asyncio.gather). Dentro
+        de connection_pool a espera segue a cota informada pela API (_RateLimits);
+        sem ela, o intervalo mínimo entre requisições continua sendo respeitado.
+        """
+        prompt_tokens = _count_tokens(self.model, prompt)
+        max_tokens = self._completion_limit(prompt, prompt_tokens)
+        deadline = time.monotonic() + self.retry_budget
+        delay = None
+        for attempt in count():
+            # Cada tentativa (inclusive as repetidas) passa pela cota
+            if self.rate_limits.known():
+                # Cota conhecida (cabeçalhos da última resposta): só espera se ela
+                # acabou; o pedido conta o prompt e o máximo da resposta, como a
+                # API reserva
+                await self.rate_limits.acquire(prompt_tokens + max_tokens)
+            else:
+                # Antes da primeira resposta: reserva o próximo horário livre antes
+                # de esperar, para que tarefas concorrentes não saiam todas no mesmo instante
+                wait = self._reserve_slot()
+                if wait:
+                    await asyncio.sleep(wait)
+            
+            try:
+                start_time = time.time()
+                response = await openai.ChatCompletion.acreate(**self._request_params(prompt, max_tokens))
+                
+                api_time = time.time() - start_time
+                self.logger.debug(f"Bloco {block_index}: API respondeu em {api_time:.2f}s")
                 
-                # Parse rápido do JSON
-                try:
-                    # Tenta direto primeiro (mais rápido)
-                    if result.startswith('{') and result.endswith('}'):
-                        data = json.loads(result)
-                    else:
-                        # Fallback com regex se necessário
-                        json_match = re.search(r'\{.*\}', result, re.DOTALL)
-                        if json_match:
-                            data = json.loads(json_match.group())
-                        else:
-                            return []
-                    
-                    corrections = data.get('corrections', [])
-                    
-                    # Validação mínima e rápida
-                    valid_corrections = []
-                    for corr in corrections:
-                        # Validação super básica
-                        if (corr.get('paragraph') and 
-                            corr.get('error') and 
-                            corr.get('correction') and 
-                            corr.get('error') != corr.get('correction')):
-                            corr['block_index'] = block_index
-                            valid_corrections.append(corr)
-                    
-                    return valid_corrections
-                    
-                except:
-                    return []
-                    
-            except (openai.error.APIError, openai.error.ServiceUnavailableError, openai.error.APIConnectionError) as e:
-                # Erro de servidor - faz retry com backoff
-                if attempt < len(self.retry_delays) - 1:
-                    delay = self.retry_delays[attempt]
-                    self.logger.warning(f"Erro de servidor no bloco {block_index}, tentativa {attempt + 1}. Aguardando {delay}s...")
-                    time.sleep(delay)
+                if self._truncated(response, max_tokens, block_index):
+                    max_tokens = self.max_tokens
                     continue
+                return self._parse_corrections(response.choices[0].message.content, block_index)
+            
+            except Exception as e:
+                delay = self._retry_delay(e, attempt, delay, deadline, block_index)
+                if delay is None:
+                    return NoAnswer()
+                await asyncio.sleep(delay)
+    
+    def _completion_limit(self, prompt: str, prompt_tokens: int = None) -> int:
+        """max_tokens da chamada: metade do prompt, entre min_completion_tokens e max_tokens
+        
+        A API desconta prompt + max_tokens da cota de tokens por minuto (TPM)
+        no envio, use a resposta ou não. As correções crescem com o texto do
+        bloco, então reservar sempre o máximo esgotava a cota bem antes do
+        necessário e gerava rate limits.
+        """
+        if prompt_tokens is None:
+            prompt_tokens = _count_tokens(self.model, prompt)
+        return min(self.max_tokens, max(self.min_completion_tokens, prompt_tokens // 2))
+    
+    def _truncated(self, response, max_tokens: int, block_index: int) -> bool:
+        """Se a resposta foi cortada pelo limite e ainda dá para repetir com o limite cheio"""
+        if response.choices[0].get('finish_reason') != 'length' or max_tokens >= self.max_tokens:
+            return False
+        self.logger.warning(f"Resposta do bloco {block_index} cortada em {max_tokens} tokens; repetindo com {self.max_tokens}")
+        return True
+    
+    def _request_params(self, prompt: str, max_tokens: int = None) -> Dict:
+        """Parâmetros da chamada ao ChatCompletion (max_tokens padrão: self.max_tokens)"""
+        # Prompt mais curto e direto
+        messages = [
+            {
+                "role": "system", 
+                "content": "Você é um corretor. Responda APENAS com JSON válido."
+            },
+            {
+                "role": "user", 
+                "content": prompt
+            }
+        ]
+        
+        params = dict(
+            model=self.model,
+            messages=messages,
+            temperature=0,
+            max_tokens=max_tokens or self.max_tokens,
+            top_p=1,  # Sem penalidades = mais rápido
+            frequency_penalty=0,
+            presence_penalty=0,
+            n=1,  # Uma resposta só
+            stream=False,  # Sem streaming
+            request_timeout=120  # Timeout de 120 segundos para GPT-4.1
+        )
+        
+        # Modo JSON: a resposta é sempre um objeto JSON válido, então o parse
+        # direto de _parse_corrections basta (sem cercas ```json nem texto em
+        # volta) e uma resposta malformada não desperdiça a chamada
+        if self.json_mode and self.model.startswith(_JSON_MODE_MODELS):
+            params['response_format'] = {"type": "json_object"}
+        return params
+    
+    def _parse_corrections(self, content: str, block_index: int) -> List[Dict]:
+        """Extrai as correções válidas do texto respondido pela API"""
+        result = content.strip()
+        
+        # Parse rápido do JSON
+        try:
+            # Tenta direto primeiro (mais rápido)
+            if result.startswith('{') and result.endswith('}'):
+                data = JSONHandler.loads(result)
+            else:
+                # Fallback com regex se necessário
+                json_match = _RE_JSON_OBJECT.search(result)
+                if json_match:
+                    data = JSONHandler.loads(json_match.group())
                 else:
-                    self.logger.error(f"Erro no bloco {block_index} após {attempt + 1} tentativas: {str(e)}")
-                    return []
-                    
-            except openai.error.RateLimitError as e:
-                # Rate limit - espera mais
-                if attempt < len(self.retry_delays) - 1:
-                    delay = self.retry_delays[attempt] * 2  # Dobra o delay para rate limit
-                    self.logger.warning(f"Rate limit no bloco {block_index}. Aguardando {delay}s...")
-                    time.sleep(delay)
+                    return NoAnswer()
+            
+            corrections = data.get('corrections', [])
+            
+            # Validação mínima e rápida
+            valid_corrections = []
+            for corr in corrections:
+                if self._validate_correction(corr):
+                    corr['block_index'] = block_index
+                    valid_corrections.append(corr)
+            
+            return valid_corrections
+        
+        except:
+            return NoAnswer()
+    
+    def _retry_delay(self, error: Exception, attempt: int, previous: float, deadline: float, block_index: int):
+        """Segundos a aguardar antes de tentar de novo, ou None para desistir
+        
+        Backoff exponencial com jitter descorrelacionado: a espera é sorteada
+        entre retry_base e o triplo da anterior (`previous`), então blocos que
+        falharam juntos não tentam de novo todos no mesmo instante. Desiste
+        quando a espera passaria do prazo (`deadline`, em time.monotonic()).
+        """
+        jittered = self._random.uniform(self.retry_base, min(self.retry_cap, (previous or self.retry_base) * 3))
+        
+        if isinstance(error, (openai.error.APIError, openai.error.ServiceUnavailableError, openai.error.APIConnectionError)):
+            # Erro de servidor - faz retry com backoff
+            delay = jittered
+            if time.monotonic() + delay <= deadline:
+                self.logger.warning(f"Erro de servidor no bloco {block_index}, tentativa {attempt + 1}. Aguardando {delay:.1f}s...")
+                return delay
+            self.logger.error(f"Erro no bloco {block_index} após {attempt + 1} tentativas: {str(error)}")
+            return None
+        
+        if (isinstance(error, openai.error.InvalidRequestError) and self.json_mode
+                and (error.param == 'response_format' or 'response_format' in str(error))):
+            # Modelo (ou implantação) sem modo JSON: desliga para as próximas
+            # chamadas e repete já; a resposta volta a passar pela extração por regex
+            self.json_mode = False
+            self.logger.warning(f"O modelo {self.model} não aceita response_format; seguindo sem modo JSON")
+            return 0.0
+        
+        if isinstance(error, openai.error.RateLimitError):
+            # Rate limit - espera mais
+            self.throttle_count += 1
+            
+            # A API diz quanto esperar (Retry-After); sem isso, dobra o delay
+            retry_after = (error.headers or {}).get('retry-after')
+            try:
+                delay = float(retry_after)
+            except (TypeError, ValueError):
+                delay = min(self.retry_cap, jittered * 2)
+            if time.monotonic() + delay <= deadline:
+                self.logger.warning(f"Rate limit no bloco {block_index}. Aguardando {delay:.1f}s...")
+                return delay
+            return None
+        
+        # Captura erros genéricos incluindo "server overloaded" e timeout
+        error_msg = str(error).lower()
+        if "overloaded" in error_msg or "server" in error_msg or "timeout" in error_msg:
+            delay = jittered
+            if time.monotonic() + delay <= deadline:
+                self.logger.warning(f"Timeout/Servidor sobrecarregado no bloco {block_index}. Aguardando {delay:.1f}s...")
+                return delay
+        
+        self.logger.error(f"Erro inesperado no bloco {block_index}: {str(error)}")
+        return None
+    
+    def identify_errors_bulk(self, prompts: List[tuple], callback=None, poll_interval: int = 30,
+                             batch_id: str = None, on_result=None) -> List[List[Dict]]:
+        """
+        Envia todos os blocos de uma vez pela Batch API (metade do custo)
+        
+        Troca latência por custo: o lote pode levar minutos ou horas, então
+        serve para processamentos não interativos. O id do lote fica em
+        last_batch_id (e no log): se a execução cair, chamar de novo com
+        `batch_id` e os mesmos prompts retoma a espera sem pagar o lote outra vez.
+        
+        Args:
+            prompts: Lista de tuplas (prompt, block_index)
+            callback: Recebe (concluídos, total, mensagem) a cada consulta
+            batch_id: Lote já criado para estes prompts (só acompanha e lê o resultado)
+            on_result: Recebe (block_index, correções) de cada bloco assim que é lido
+        
+        Returns:
+            Lista de listas de correções, na ordem de `prompts`
+        """
+        if batch_id is None:
+            batch = self._create_batch(prompts)
+            self.logger.info(f"Lote {batch.id} criado com {len(prompts)} blocos")
+        else:
+            batch = self._with_retries(Batch.retrieve, batch_id, label=f"lote {batch_id}")
+            self.logger.info(f"Retomando o lote {batch.id} ({batch.status})")
+        self.last_batch_id = batch.id
+        
+        # Aguarda o processamento do lote; uma falha passageira na consulta
+        # (conexão, erro 5xx, rate limit) não abandona um lote já pago
+        while batch.status not in ('completed', 'failed', 'expired', 'cancelled'):
+            time.sleep(poll_interval)
+            try:
+                batch = self._with_retries(Batch.retrieve, batch.id, label=f"lote {batch.id}")
+            except Exception:
+                self.logger.error(f"Consulta ao lote {batch.id} falhou; retome com batch_id='{batch.id}'")
+                raise
+            
+            counts = batch.get('request_counts') or {}
+            if callback:
+                callback(counts.get('completed', 0), len(prompts),
+                         f"Lote {batch.status}: {counts.get('completed', 0)}/{len(prompts)} blocos")
+        
+        results = {}
+        if batch.get('output_file_id'):
+            # Linhas em bytes: o parser lê direto, sem decodificar o arquivo inteiro
+            output = self._with_retries(openai.File.download, batch.output_file_id, label=f"lote {batch.id}")
+            for line in output.splitlines():
+                if not line.strip():
+                    continue
+                item = JSONHandler.loads(line)
+                response = item.get('response') or {}
+                if response.get('status_code') != 200:
                     continue
-                else:
-                    return []
-                    
-            except Exception as e:
-                # Captura erros genéricos incluindo "server overloaded" e timeout
-                error_msg = str(e).lower()
-                if "overloaded" in error_msg or "server" in error_msg or "timeout" in error_msg:
-                    if attempt < len(self.retry_delays) - 1:
-                        delay = self.retry_delays[attempt]
-                        self.logger.warning(f"Timeout/Servidor sobrecarregado no bloco {block_index}. Aguardando {delay}s...")
-                        time.sleep(delay)
-                        continue
                 
-                self.logger.error(f"Erro inesperado no bloco {block_index}: {str(e)}")
-                return []
+                block_idx = int(item['custom_id'].split('_', 1)[1])
+                content = response['body']['choices'][0]['message']['content']
+                results[block_idx] = self._parse_corrections(content, block_idx)
+                if on_result:
+                    on_result(block_idx, results[block_idx])
+        
+        if batch.status != 'completed' or len(results) < len(prompts):
+            self.logger.warning(f"Lote {batch.id} terminou como '{batch.status}' com {len(results)}/{len(prompts)} blocos respondidos")
         
-        return []
+        return [results.get(block_idx, NoAnswer()) for _, block_idx in prompts]
+    
+    def _create_batch(self, prompts: List[tuple]):
+        """Sobe o JSONL dos prompts e cria o lote na Batch API"""
+        # Uma linha JSONL por bloco; custom_id liga a resposta de volta ao bloco
+        lines = []
+        for prompt, block_idx in prompts:
+            body = self._request_params(prompt)
+            del body['request_timeout'], body['stream']  # Só valem para chamadas diretas
+            lines.append(JSONHandler.dumps({
+                "custom_id": f"block_{block_idx}",
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": body
+            }))
+        
+        input_file = openai.File.create(
+            file=io.BytesIO('\n'.join(lines).encode('utf-8')),
+            purpose="batch",
+            user_provided_filename="input.jsonl"
+        )
+        return Batch.create(
+            input_file_id=input_file.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h"
+        )
+    
+    def _with_retries(self, call, *args, label: str = ''):
+        """call(*args), repetida pela política de _retry_delay até retry_budget segundos"""
+        deadline = time.monotonic() + self.retry_budget
+        delay = None
+        for attempt in count():
+            try:
+                return call(*args)
+            except Exception as e:
+                delay = self._retry_delay(e, attempt, delay, deadline, label)
+                if delay is None:
+                    raise
+                time.sleep(delay)
     
-    def identify_errors_batch(self, prompts: List[tuple]) -> List[List[Dict]]:
+    def identify_errors_batch(self, prompts: List[tuple], concurrency: int = 10) -> List[List[Dict]]:
         """
         Processa múltiplos blocos em paralelo para máxima velocidade
         
+        Até `concurrency` requisições ficam em andamento ao mesmo tempo, numa
+        sessão HTTP compartilhada; o intervalo mínimo entre requisições
+        continua sendo respeitado por identify_errors_precise_async. Prompts
+        repetidos vão à API uma vez só.
+        
         Args:
             prompts: Lista de tuplas (prompt, block_index)
-            
+            concurrency: Máximo de requisições simultâneas
+        
         Returns:
-            Lista de listas de correções
+            Lista de listas de correções, na ordem dos prompts
         """
-        results = []
+        return asyncio.run(self._identify_errors_batch_async(prompts, concurrency))
+    
+    async def _identify_errors_batch_async(self, prompts: List[tuple], concurrency: int) -> List[List[Dict]]:
+        semaphore = asyncio.Semaphore(concurrency)
+        completed = 0
         
-        # Processa em lotes de 10 para não sobrecarregar
-        batch_size = 10
-        for i in range(0, len(prompts), batch_size):
-            batch = prompts[i:i+batch_size]
-            batch_results = []
-            
-            for prompt, block_idx in batch:
-                result = self.identify_errors_precise(prompt, block_idx)
-                batch_results.append(result)
-            
-            results.extend(batch_results)
+        # Texto padrão e blocos reenviados repetem o prompt: uma chamada por
+        # prompt distinto, com o índice do primeiro bloco que o trouxe
+        unique = {}
+        for prompt, block_idx in prompts:
+            unique.setdefault(prompt, block_idx)
+        if len(unique) < len(prompts):
+            self.logger.info(f"{len(prompts) - len(unique)} prompts repetidos reaproveitados")
+        
+        async def identify(prompt: str, block_idx: int) -> List[Dict]:
+            nonlocal completed
+            async with semaphore:
+                result = await self.identify_errors_precise_async(prompt, block_idx)
             
-            # Log de progresso
-            self.logger.info(f"Processados {min(i+batch_size, len(prompts))}/{len(prompts)} blocos")
+            # Log de progresso (a cada 10 blocos, como nos lotes de antes)
+            completed += 1
+            if completed % 10 == 0 or completed == len(unique):
+                self.logger.info(f"Processados {completed}/{len(unique)} blocos")
+            return result
+        
+        async with self.connection_pool(concurrency):
+            answers = dict(zip(unique, await asyncio.gather(*(identify(prompt, block_idx)
+                                                              for prompt, block_idx in unique.items()))))
         
+        # Cada repetição recebe uma cópia das correções com o próprio block_index
+        # (NoAnswer continua NoAnswer)
+        results = []
+        answered = set()
+        for prompt, block_idx in prompts:
+            result = answers[prompt]
+            if prompt in answered:
+                result = type(result)(dict(corr, block_index=block_idx) for corr in result)
+            answered.add(prompt)
+            results.append(result)
         return results
     
     def _validate_correction(self, correction: Dict) -> bool:
-        """Validação mínima para velocidade"""
-        return bool(
-            correction.get('paragraph') and 
-            correction.get('error') and 
-            correction.get('correction') and
-            correction['error'] != correction['correction']
-        )
+        """Validação mínima para velocidade
+        
+        Cada campo é lido uma vez só; o erro vem primeiro, por ser o que mais
+        falta (ou repete a correção).
+        """
+        error = correction.get('error')
+        fix = correction.get('correction')
+        return bool(error and fix and error != fix and correction.get('paragraph'))
     
     # Métodos removidos ou simplificados para velocidade
     
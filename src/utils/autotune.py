@@ -0,0 +1,78 @@
+import os
+import time
+from collections import deque
+from .json_utils import JSONHandler
+
+class ConcurrencyTuner:
+    """Ajusta quantos blocos vão à API ao mesmo tempo conforme ela responde (AIMD)
+    
+    Sobe um a cada rodada inteira de blocos sem erro (uma rodada = o limite
+    atual); cai pela metade a cada rate limit e fica sem subir por `cooldown`
+    segundos. O valor final é guardado por chave (ex.: o modelo) e a próxima
+    execução começa dele, em vez de sempre do valor fixo.
+    """
+    
+    def __init__(self, key: str, initial: int = 8, minimum: int = 1, maximum: int = 16,
+                 cooldown: float = 30.0, throttles: int = 0, path: str = None):
+        if path is None:
+            # Mesma pasta do cache de respostas (.revisor_cache na raiz do projeto)
+            base_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+            path = os.path.join(base_dir, ".revisor_cache", "autotune.json")
+        
+        self.path = path
+        self.key = key
+        self.minimum = minimum
+        self.maximum = maximum
+        self.cooldown = cooldown
+        self.limit = max(minimum, min(maximum, int(self._load().get(key, initial))))
+        
+        self._outcomes = deque(maxlen=100)  # Últimos resultados (True = respondeu sem erro)
+        self._successes = 0                 # Sucessos seguidos desde o último ajuste
+        self._hold_until = 0.0
+        self._throttles = throttles         # Contador de rate limits do cliente no último registro
+    
+    def record(self, ok: bool, throttles: int = 0):
+        """Registra o resultado de um bloco e ajusta o limite
+        
+        Args:
+            ok: A API respondeu (sem NoAnswer)
+            throttles: Contador acumulado de rate limits do cliente; se subiu
+                desde o último registro, conta como pedido para desacelerar
+        """
+        now = time.monotonic()
+        throttled = throttles > self._throttles
+        self._throttles = max(self._throttles, throttles)
+        self._outcomes.append(ok and not throttled)
+        
+        if throttled:
+            # Diminuição multiplicativa: a API pediu para ir mais devagar
+            self.limit = max(self.minimum, self.limit // 2)
+            self._hold_until = now + self.cooldown
+            self._successes = 0
+            return
+        if not ok:
+            self._successes = 0
+            return
+        
+        # Aumento aditivo: uma rodada inteira sem erro, fora da espera e com
+        # menos de 2% de falhas recentes
+        self._successes += 1
+        error_rate = self._outcomes.count(False) / len(self._outcomes)
+        if (self._successes >= self.limit and error_rate < 0.02
+                and now >= self._hold_until and self.limit < self.maximum):
+            self.limit += 1
+            self._successes = 0
+    
+    def save(self):
+        """Guarda o limite atual para a próxima execução"""
+        data = self._load()
+        data[self.key] = self.limit
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        JSONHandler.save(self.path, data)
+    
+    def _load(self) -> dict:
+        try:
+            with open(self.path, 'rb') as f:
+                return JSONHandler.loads(f.read())
+        except (OSError, ValueError):
+            return {}
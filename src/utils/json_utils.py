@@ -0,0 +1,38 @@
+import json
+
+try:
+    import orjson
+except ImportError:  # Sem orjson: usa o json da biblioteca padrão
+    orjson = None
+
+class JSONHandler:
+    """Leitura e gravação de JSON - usa orjson (C) quando disponível"""
+    
+    @staticmethod
+    def loads(data):
+        """Decodifica JSON de str ou bytes (bytes vão direto, sem decodificar antes)"""
+        if orjson is not None:
+            return orjson.loads(data)
+        return json.loads(data)
+    
+    @staticmethod
+    def dumps(data) -> str:
+        """JSON compacto em str, sem escapar acentos"""
+        if orjson is not None:
+            return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS).decode('utf-8')
+        return json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+    
+    @staticmethod
+    def save(path: str, data, indent: bool = True):
+        """Grava `data` em UTF-8 sem escapar acentos"""
+        if orjson is not None:
+            option = orjson.OPT_NON_STR_KEYS
+            if indent:
+                option |= orjson.OPT_INDENT_2
+            
+            # Serializa direto para bytes e grava de uma vez
+            with open(path, 'wb') as f:
+                f.write(orjson.dumps(data, option=option))
+        else:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=2 if indent else None)
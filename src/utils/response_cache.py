@@ -0,0 +1,120 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from .json_utils import JSONHandler
+
+try:
+    from rapidfuzz import fuzz, process
+except ImportError:  # Sem rapidfuzz: o cache semântico fica desligado
+    fuzz = process = None
+
+class ResponseCache:
+    """Cache em disco das respostas da API, indexado pelo hash do prompt
+    
+    Reprocessar o mesmo documento (ou blocos repetidos entre documentos) não
+    paga a API de novo. Usa SQLite da biblioteca padrão: um arquivo só, seguro
+    para acesso de várias threads com o lock.
+    """
+    
+    def __init__(self, path: str = None, max_age: float = None):
+        if path is None:
+            # Pasta .revisor_cache na raiz do projeto (2 níveis acima de utils/)
+            base_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+            path = os.path.join(base_dir, ".revisor_cache", "respostas.sqlite3")
+        
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.max_age = max_age  # Segundos de validade de cada resposta (None = não expira)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        
+        # WAL: gravações (uma por bloco, logo que a resposta chega) não bloqueiam
+        # leituras e sobrevivem a uma interrupção - a próxima execução retoma dali
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS respostas (chave TEXT PRIMARY KEY, valor TEXT NOT NULL, ts INTEGER NOT NULL DEFAULT 0)")
+        
+        # Caches criados antes da coluna ts: acrescenta (entradas antigas ficam com ts 0)
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(respostas)")]
+        if "ts" not in columns:
+            self._conn.execute("ALTER TABLE respostas ADD COLUMN ts INTEGER NOT NULL DEFAULT 0")
+        self._conn.commit()
+    
+    @staticmethod
+    def key(*parts: str) -> str:
+        """Chave estável para as partes (modelo, prompt...)"""
+        return hashlib.sha256("|".join(parts).encode('utf-8')).hexdigest()
+    
+    def get(self, key: str):
+        """Valor guardado para a chave, ou None (também se já passou de max_age)"""
+        with self._lock:
+            row = self._conn.execute("SELECT valor, ts FROM respostas WHERE chave = ?", (key,)).fetchone()
+        if row is None or (self.max_age is not None and row[1] < time.time() - self.max_age):
+            return None
+        return JSONHandler.loads(row[0])
+    
+    def set(self, key: str, value):
+        """Guarda (ou substitui) o valor da chave"""
+        data = JSONHandler.dumps(value)
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO respostas (chave, valor, ts) VALUES (?, ?, ?)",
+                               (key, data, int(time.time())))
+            self._conn.commit()
+    
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+class SemanticPromptCache:
+    """Reaproveita a resposta de um texto quase idêntico a outro já revisado
+    
+    Complementa o ResponseCache (hash exato): textos repetidos com pequenas
+    diferenças (cabeçalhos, enunciados padrão) encontram a resposta do vizinho
+    mais parecido do mesmo modo, se a similaridade passar do limiar. Só faz
+    sentido com temperature=0 - quem chama decide.
+    """
+    
+    def __init__(self, responses: ResponseCache, threshold: float = 0.98):
+        self.responses = responses
+        self.threshold = threshold
+        
+        # Mesma conexão (e lock) do cache de respostas
+        with responses._lock:
+            responses._conn.execute(
+                "CREATE TABLE IF NOT EXISTS semantico (chave TEXT PRIMARY KEY, modo TEXT NOT NULL, "
+                "tamanho INTEGER NOT NULL, texto TEXT NOT NULL)"
+            )
+            responses._conn.execute("CREATE INDEX IF NOT EXISTS semantico_modo ON semantico (modo, tamanho)")
+            responses._conn.commit()
+    
+    def add(self, mode: str, text: str, key: str):
+        """Registra o texto cuja resposta está no ResponseCache sob `key`"""
+        with self.responses._lock:
+            self.responses._conn.execute(
+                "INSERT OR REPLACE INTO semantico (chave, modo, tamanho, texto) VALUES (?, ?, ?, ?)",
+                (key, mode, len(text), text)
+            )
+            self.responses._conn.commit()
+    
+    def lookup(self, mode: str, text: str):
+        """Resposta do texto mais parecido do mesmo modo, ou None"""
+        if process is None:
+            return None
+        
+        # Acima do limiar o tamanho quase não muda: só compara textos de tamanho próximo
+        margin = int(len(text) * (1 - self.threshold)) + 1
+        with self.responses._lock:
+            rows = self.responses._conn.execute(
+                "SELECT texto, chave FROM semantico WHERE modo = ? AND tamanho BETWEEN ? AND ?",
+                (mode, len(text) - margin, len(text) + margin)
+            ).fetchall()
+        if not rows:
+            return None
+        
+        best = process.extractOne(text, [row[0] for row in rows], scorer=fuzz.ratio,
+                                  score_cutoff=self.threshold * 100)
+        if best is None:
+            return None
+        return self.responses.get(rows[best[2]][1])
@@ -1,11 +1,53 @@
 from docx import Document
 from docx.shared import RGBColor, Pt
 from docx.enum.text import WD_ALIGN_PARAGRAPH
-from docx.oxml.ns import qn
+from docx.oxml import element_class_lookup, parse_xml
+from docx.oxml.ns import nsdecls, qn
+from docx.opc.constants import RELATIONSHIP_TYPE as RT
+from docx.styles.styles import Styles
 from docx.text.paragraph import Paragraph
 from docx.table import Table
 import re
+import zipfile
+import posixpath
 from copy import deepcopy
+from lxml import etree
+
+# Tags do WordprocessingML usadas na leitura em fluxo
+_BODY = qn('w:body')
+_P = qn('w:p')
+_TBL = qn('w:tbl')
+_R = qn('w:r')
+_T = qn('w:t')
+_TAB = qn('w:tab')
+_BR = qn('w:br')
+_BREAKS = (_BR, qn('w:cr'))
+_BR_TYPE = qn('w:type')
+_VAL = qn('w:val')
+_LAST_RENDERED_PAGE_BREAK = qn('w:lastRenderedPageBreak')
+_PAGE_BREAK_BEFORE = qn('w:pageBreakBefore')
+
+# Com grupo: o split em _apply_runs_to_paragraph mantém as URLs nas partes
+_RE_URL = re.compile(r'(https?://[^\s]+)')
+_OFFICE_DOCUMENT = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument'
+_PACKAGE_RELS = '{http://schemas.openxmlformats.org/package/2006/relationships}Relationship'
+
+class _StylesOnly:
+    """Pai mínimo dos objetos do python-docx na leitura em fluxo: só resolve estilos
+    
+    Paragraph/Table chegam à parte do documento por parent.part apenas para
+    buscar estilos (get_style); aqui isso vem de um Styles lido à parte.
+    """
+    
+    def __init__(self, styles: Styles):
+        self.styles = styles
+    
+    @property
+    def part(self):
+        return self
+    
+    def get_style(self, style_id, style_type):
+        return self.styles.get_by_id(style_id, style_type)
 
 class WordDocumentHandler:
     """Classe para manipulação de documentos Word preservando formatação"""
@@ -17,48 +59,203 @@ class WordDocumentHandler:
         content = []
         
         for element in doc.element.body:
-            if element.tag.endswith('p'):  # Parágrafo
-                para = Paragraph(element, doc)
-                content.append({
-                    'type': 'paragraph',
-                    'text': para.text,
-                    'style': para.style.name if para.style else None,
-                    'alignment': para.alignment,
-                    'runs': WordDocumentHandler._extract_runs(para),
-                    'element': element
-                })
-            elif element.tag.endswith('tbl'):  # Tabela
-                table = Table(element, doc)
-                content.append({
-                    'type': 'table',
-                    'data': WordDocumentHandler._extract_table_data(table),
-                    'element': element
-                })
+            item = WordDocumentHandler._element_data(element, doc)
+            if item is not None:
+                item['element'] = element
+                content.append(item)
         
         return content
     
+    @staticmethod
+    def iter_document_complete(doc_path):
+        """O mesmo conteúdo de read_document_complete, em fluxo
+        
+        Lê o XML principal com iterparse e libera cada parágrafo ou tabela logo
+        depois de entregue: a memória fica no tamanho do elemento atual, não do
+        documento inteiro. Por isso os itens não têm a chave 'element'.
+        """
+        with zipfile.ZipFile(doc_path) as package:
+            main_part = WordDocumentHandler._main_part_name(package)
+            parent = _StylesOnly(WordDocumentHandler._read_styles(package, main_part))
+            for element in WordDocumentHandler._iter_body(package, main_part, element_class_lookup):
+                item = WordDocumentHandler._element_data(element, parent)
+                if item is not None:
+                    yield item
+    
+    @staticmethod
+    def _element_data(element, parent):
+        """Dados de um filho do corpo (parágrafo ou tabela); None para os demais"""
+        # Tag completa com namespace, comparada direto (sem endswith a cada elemento)
+        tag = element.tag
+        if tag == _P:  # Parágrafo
+            para = Paragraph(element, parent)
+            runs = WordDocumentHandler._extract_runs(para)
+            return {
+                'type': 'paragraph',
+                'text': ''.join(run['text'] for run in runs),  # = para.text, sem reler os runs
+                'style': para.style.name if para.style else None,
+                'alignment': para.alignment,
+                'runs': runs
+            }
+        if tag == _TBL:  # Tabela
+            return {
+                'type': 'table',
+                'data': WordDocumentHandler._extract_table_data(Table(element, parent))
+            }
+        return None
+    
+    @staticmethod
+    def iter_paragraphs(doc_path):
+        """(texto, página) de cada parágrafo do corpo, na ordem de doc.paragraphs, sem abrir o documento
+        
+        `doc_path` pode ser o caminho ou um arquivo aberto (como aceita o zipfile).
+        
+        Lê o XML principal em fluxo (iterparse) e descarta cada elemento do
+        corpo logo depois de lido: a memória fica no tamanho de um parágrafo
+        (ou tabela), não da árvore inteira. O texto é o mesmo de paragraph.text.
+        
+        A página vem das quebras gravadas no arquivo: <w:lastRenderedPageBreak/>
+        (onde o Word quebrou a página da última vez que abriu o documento) e as
+        quebras manuais. Uma quebra logo depois de outra, sem texto entre elas,
+        é a mesma; um documento sem nenhuma fica todo na página 1.
+        """
+        page = 1
+        after_break = True  # Nenhum texto desde a última quebra contada
+        with zipfile.ZipFile(doc_path) as package:
+            for element in WordDocumentHandler._iter_body(package, WordDocumentHandler._main_part_name(package)):
+                # Quebras de página em ordem (também dentro de tabelas); o
+                # parágrafo fica na página onde começa o seu texto
+                start_page = None
+                for node in element.iter(_T, _BR, _LAST_RENDERED_PAGE_BREAK, _PAGE_BREAK_BEFORE):
+                    if node.tag == _T:
+                        if node.text:
+                            after_break = False
+                            if start_page is None:
+                                start_page = page
+                    elif WordDocumentHandler._is_page_break(node) and not after_break:
+                        page += 1
+                        after_break = True
+                
+                if element.tag == _P:
+                    yield (''.join(WordDocumentHandler._run_text(run) for run in element.iterchildren(_R)),
+                           start_page or page)
+    
+    @staticmethod
+    def _iter_body(package: zipfile.ZipFile, part_name: str, lookup=None):
+        """Filhos do <w:body> da parte, em fluxo (iterparse)
+        
+        Cada elemento é liberado, com os irmãos anteriores, quando o próximo é
+        pedido. `lookup` troca as classes dos elementos (ex.: as do python-docx,
+        para montar Paragraph/Table sobre eles).
+        """
+        with package.open(part_name) as xml:
+            events = etree.iterparse(xml, events=('end',), resolve_entities=False)
+            if lookup is not None:
+                events.set_element_class_lookup(lookup)
+            for _, element in events:
+                parent = element.getparent()
+                if parent is None or parent.tag != _BODY:
+                    continue
+                
+                yield element
+                
+                # Libera o elemento e os irmãos anteriores, já processados
+                element.clear()
+                while element.getprevious() is not None:
+                    del parent[0]
+    
+    @staticmethod
+    def _read_styles(package: zipfile.ZipFile, part_name: str) -> Styles:
+        """Estilos ligados à parte principal (vazio se o pacote não tiver)"""
+        folder, name = posixpath.split(part_name)
+        rels_name = posixpath.join(folder, '_rels', name + '.rels')
+        if rels_name in package.namelist():
+            for rel in etree.fromstring(package.read(rels_name)).iter(_PACKAGE_RELS):
+                if rel.get('Type') == RT.STYLES and rel.get('TargetMode') != 'External':
+                    target = rel.get('Target')
+                    target = target.lstrip('/') if target.startswith('/') else posixpath.normpath(posixpath.join(folder, target))
+                    return Styles(parse_xml(package.read(target)))
+        return Styles(parse_xml('<w:styles %s/>' % nsdecls('w')))
+    
+    @staticmethod
+    def has_rendered_page_breaks(doc_path) -> bool:
+        """Se o Word já paginou o documento (há <w:lastRenderedPageBreak/> na parte principal)
+        
+        Sem nenhuma (arquivo gerado por outro programa e nunca salvo pelo Word)
+        as páginas de iter_paragraphs vêm só das quebras manuais: são uma
+        estimativa, não as páginas reais. Procura os bytes, sem montar o XML,
+        e para na primeira ocorrência.
+        """
+        marker = b'lastRenderedPageBreak'
+        tail = b''
+        with zipfile.ZipFile(doc_path) as package:
+            with package.open(WordDocumentHandler._main_part_name(package)) as xml:
+                for chunk in iter(lambda: xml.read(1 << 20), b''):
+                    data = tail + chunk
+                    if marker in data:
+                        return True
+                    tail = data[1 - len(marker):]  # A marca pode estar dividida entre dois pedaços
+        return False
+    
+    @staticmethod
+    def _is_page_break(node) -> bool:
+        """Se o nó (<w:br>, <w:lastRenderedPageBreak> ou <w:pageBreakBefore>) quebra a página"""
+        if node.tag == _BR:
+            return node.get(_BR_TYPE) == 'page'
+        if node.tag == _PAGE_BREAK_BEFORE:
+            return node.get(_VAL, 'true') not in ('0', 'false', 'off')
+        return True
+    
+    @staticmethod
+    def _main_part_name(package: zipfile.ZipFile) -> str:
+        """Caminho, dentro do pacote, da parte principal (normalmente word/document.xml)"""
+        rels = etree.fromstring(package.read('_rels/.rels'))
+        for rel in rels.iter(_PACKAGE_RELS):
+            if rel.get('Type') == _OFFICE_DOCUMENT:
+                return rel.get('Target').lstrip('/')
+        return 'word/document.xml'
+    
+    @staticmethod
+    def _run_text(run) -> str:
+        """Texto de um <w:r>, como Run.text do python-docx (tab e quebras viram \\t e \\n)"""
+        parts = []
+        for child in run:
+            if child.tag == _T:
+                parts.append(child.text or '')
+            elif child.tag == _TAB:
+                parts.append('\t')
+            elif child.tag in _BREAKS:
+                parts.append('\n')
+        return ''.join(parts)
+    
     @staticmethod
     def _extract_runs(paragraph):
         """Extrai runs com formatação detalhada"""
         runs_data = []
         for run in paragraph.runs:
+            # Cada acesso a run.font (e a font.color) monta um objeto novo e
+            # cada run.text percorre o XML: lê uma vez só
+            text = run.text
+            font = run.font
+            size = font.size
             run_data = {
-                'text': run.text,
-                'bold': run.bold,
-                'italic': run.italic,
-                'underline': run.underline,
-                'font_name': run.font.name,
-                'font_size': run.font.size.pt if run.font.size else None,
+                'text': text,
+                'bold': font.bold,
+                'italic': font.italic,
+                'underline': font.underline,
+                'font_name': font.name,
+                'font_size': size.pt if size else None,
                 'color': None
             }
             
             # Verifica se é um link
-            if WordDocumentHandler._is_hyperlink(run):
+            if _RE_URL.search(text):
                 run_data['is_link'] = True
             
             # Cor do texto
-            if run.font.color and run.font.color.rgb:
-                run_data['color'] = str(run.font.color.rgb)
+            rgb = font.color.rgb
+            if rgb:
+                run_data['color'] = str(rgb)
             
             runs_data.append(run_data)
         
@@ -68,22 +265,26 @@ class WordDocumentHandler:
     def _is_hyperlink(run):
         """Verifica se o run contém um hyperlink"""
         # Verificação simplificada por padrão de URL
-        url_pattern = r'https?://[^\s]+'
-        return bool(re.search(url_pattern, run.text))
+        return bool(_RE_URL.search(run.text))
     
     @staticmethod
     def _extract_table_data(table):
         """Extrai dados da tabela preservando formatação"""
         table_data = []
-        for row in table.rows:
+        # row.cells remonta a grade da tabela inteira a cada linha: monta a
+        # grade uma vez e fatia por linha (células mescladas continuam repetidas)
+        grid = table._cells
+        col_count = table._column_count
+        for r_idx in range(len(table.rows)):
             row_data = []
-            for cell in row.cells:
+            for cell in grid[r_idx * col_count:(r_idx + 1) * col_count]:
                 cell_content = []
                 for paragraph in cell.paragraphs:
+                    runs = WordDocumentHandler._extract_runs(paragraph)
                     cell_content.append({
-                        'text': paragraph.text,
+                        'text': ''.join(run['text'] for run in runs),
                         'style': paragraph.style.name if paragraph.style else None,
-                        'runs': WordDocumentHandler._extract_runs(paragraph)
+                        'runs': runs
                     })
                 row_data.append(cell_content)
             table_data.append(row_data)
@@ -93,10 +294,10 @@ class WordDocumentHandler:
     def apply_correction_preserving_format(paragraph, error_text, correction_text):
         """Aplica correção preservando ABSOLUTAMENTE TODA a formatação"""
         
-        # Verifica se o erro existe no parágrafo
-        full_text = ""
-        for run in paragraph.runs:
-            full_text += run.text
+        # Verifica se o erro existe no parágrafo (runs e textos lidos uma vez)
+        runs = paragraph.runs
+        texts = [run.text for run in runs]
+        full_text = "".join(texts)
         
         if error_text not in full_text:
             return False
@@ -108,9 +309,9 @@ class WordDocumentHandler:
         current_pos = 0
         correction_applied = False
         
-        for run in paragraph.runs:
+        for run, text in zip(runs, texts):
             run_start = current_pos
-            run_end = current_pos + len(run.text)
+            run_end = current_pos + len(text)
             
             # Se este run contém parte do erro
             if run_start < error_end and run_end > error_pos:
@@ -119,12 +320,12 @@ class WordDocumentHandler:
                 # Início do texto a manter (antes do erro)
                 keep_start = ""
                 if run_start < error_pos:
-                    keep_start = run.text[:error_pos - run_start]
+                    keep_start = text[:error_pos - run_start]
                 
                 # Fim do texto a manter (depois do erro)
                 keep_end = ""
                 if run_end > error_end:
-                    keep_end = run.text[error_end - run_start:]
+                    keep_end = text[error_end - run_start:]
                 
                 # Parte da correção que vai neste run
                 correction_part = ""
@@ -143,7 +344,8 @@ class WordDocumentHandler:
                 # Este run está completamente dentro do erro - limpa ele
                 run.text = ""
             
-            current_pos += len(run.text)
+            # Posições contadas no texto original (o run pode ter acabado de mudar)
+            current_pos = run_end
         
         return correction_applied
     
@@ -156,8 +358,16 @@ class WordDocumentHandler:
             return
         
         # Detecta e preserva links
-        url_pattern = r'(https?://[^\s]+)'
-        parts = re.split(url_pattern, new_text)
+        parts = _RE_URL.split(new_text)
+        
+        # Cor do primeiro run (a base de todas as partes), convertida uma vez só
+        color = None
+        color_hex = original_runs[0].get('color')
+        if isinstance(color_hex, str) and len(color_hex) == 6:
+            try:
+                color = RGBColor(*bytes.fromhex(color_hex))
+            except ValueError:
+                pass
         
         current_pos = 0
         for part in parts:
@@ -167,7 +377,8 @@ class WordDocumentHandler:
             run = paragraph.add_run(part)
             
             # Se é URL, aplica formatação de link
-            if re.match(url_pattern, part):
+            is_url = _RE_URL.match(part) is not None
+            if is_url:
                 run.font.color.rgb = RGBColor(0, 0, 255)
                 run.underline = True
             else:
@@ -179,23 +390,14 @@ class WordDocumentHandler:
                         run.bold = True
                     if orig_run.get('italic'):
                         run.italic = True
-                    if orig_run.get('underline') and not re.match(url_pattern, part):
+                    if orig_run.get('underline') and not is_url:
                         run.underline = True
                     if orig_run.get('font_name'):
                         run.font.name = orig_run['font_name']
                     if orig_run.get('font_size'):
                         run.font.size = Pt(orig_run['font_size'])
-                    if orig_run.get('color') and not re.match(url_pattern, part):
-                        try:
-                            color_hex = orig_run['color']
-                            if isinstance(color_hex, str) and len(color_hex) == 6:
-                                run.font.color.rgb = RGBColor(
-                                    int(color_hex[0:2], 16),
-                                    int(color_hex[2:4], 16),
-                                    int(color_hex[4:6], 16)
-                                )
-                        except:
-                            pass
+                    if color is not None and not is_url:
+                        run.font.color.rgb = color
     
     @staticmethod
     def extract_images_info(doc_path):
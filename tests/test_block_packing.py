@@ -0,0 +1,49 @@
+import asyncio
+import unittest
+
+from src.core.smart_document_processor import SmartDocumentProcessor, ParagraphRecord
+from tests.test_semantic_cache import EchoClient
+
+class PackedBlockTest(unittest.TestCase):
+    """Blocos juntados por cima de um parágrafo protegido não têm marcas contíguas"""
+
+    def setUp(self):
+        self.client = EchoClient()
+        self.processor = SmartDocumentProcessor(self.client, use_cache=False)
+
+    def _paragraphs(self):
+        paragraphs = []
+        for index in range(1, 41):
+            if index == 10:
+                text, protected = 'Fonte: IBGE, 2020.', True
+            elif index % 3 == 0:
+                text, protected = f'Ele vai concerteza chegar cedo no dia {index}.', False
+            else:
+                text, protected = f'Parágrafo comum número {index} com texto de exemplo.', False
+            paragraphs.append(ParagraphRecord(index, index - 1, text, 1, protected, 0))
+        return paragraphs
+
+    def test_corrections_keep_their_paragraph_across_the_gap(self):
+        paragraphs = self._paragraphs()
+        blocks = self.processor._pack_small_blocks(self.processor._create_fast_blocks(paragraphs))
+        self.assertEqual(len(blocks), 1)
+        block = blocks[0]
+        self.assertEqual((block[0].index, len(block)), (1, 39))
+
+        block_text = self.processor._prepare_block_text_fast(block)
+        modules = self.processor.prompt_system.get_prompt_sequence(self.processor.mode)
+        prompt = self.processor.prompt_system.build_prompt(modules, block_text)
+        corrections = asyncio.run(self.processor._process_single_block_async(prompt, 0, block, block_text))
+
+        expected = [para.index for para in paragraphs if 'concerteza' in para.text]
+        self.assertEqual([corr['paragraph'] for corr in corrections], expected)
+
+    def test_block_position_answer_still_maps(self):
+        block = [para for para in self._paragraphs() if not para.is_protected]
+        # Resposta pela posição no bloco: P12 é o 11º parágrafo
+        corrections = [{'paragraph': 11, 'error': 'concerteza', 'correction': 'com certeza'}]
+
+        self.assertEqual(self.processor._to_global_corrections(corrections, block)[0]['paragraph'], 12)
+
+if __name__ == '__main__':
+    unittest.main()
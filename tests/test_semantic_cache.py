@@ -0,0 +1,82 @@
+import asyncio
+import os
+import re
+import tempfile
+import unittest
+
+from src.core.smart_document_processor import SmartDocumentProcessor, ParagraphRecord
+from src.utils.response_cache import ResponseCache, SemanticPromptCache, process
+
+class EchoClient:
+    """Cliente falso que responde com o número da marca [P<n>], como o modelo"""
+    model = 'teste'
+    temperature = 0
+
+    def __init__(self):
+        self.calls = 0
+
+    async def identify_errors_precise_async(self, prompt, block_index=0):
+        self.calls += 1
+        corrections = []
+        for line in prompt.split('\n'):
+            match = re.match(r'\[P(\d+)\]', line)
+            if match and 'concerteza' in line:
+                corrections.append({'paragraph': int(match.group(1)), 'error': 'concerteza',
+                                    'correction': 'com certeza', 'type': 'ortografia'})
+        return corrections
+
+@unittest.skipIf(process is None, "cache semântico precisa do rapidfuzz")
+class SemanticCacheShiftTest(unittest.TestCase):
+    """Um bloco repetido em outra posição do documento reaproveita as correções"""
+
+    def setUp(self):
+        self.client = EchoClient()
+        self.processor = SmartDocumentProcessor(self.client, use_cache=False)
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        self.processor.response_cache = ResponseCache(os.path.join(folder.name, 'respostas.sqlite3'))
+        # Registrado depois, roda antes: o banco fecha antes de a pasta sumir
+        self.addCleanup(self.processor.response_cache.close)
+        self.processor.semantic_cache = SemanticPromptCache(self.processor.response_cache)
+
+    def _block(self, start, error_text='Ele vai concerteza chegar cedo hoje.', gap=None):
+        """40 parágrafos a partir de P<start>, o erro no 6º; gap pula um índice (parágrafo protegido)"""
+        indices = [index for index in range(start, start + 41) if index != gap][:40]
+        return [ParagraphRecord(index, index,
+                                error_text if k == 5 else f'Parágrafo comum número {k} com texto de exemplo.',
+                                1, False, 0)
+                for k, index in enumerate(indices)]
+
+    def _revise(self, block):
+        block_text = self.processor._prepare_block_text_fast(block)
+        modules = self.processor.prompt_system.get_prompt_sequence(self.processor.mode)
+        prompt = self.processor.prompt_system.build_prompt(modules, block_text)
+        return asyncio.run(self.processor._process_single_block_async(prompt, 0, block, block_text))
+
+    def test_shifted_copy_gets_its_corrections(self):
+        first = self._revise(self._block(100))
+        copy = self._revise(self._block(500))
+
+        self.assertEqual([corr['paragraph'] for corr in first], [105])
+        self.assertEqual([corr['paragraph'] for corr in copy], [505])
+        self.assertEqual(self.client.calls, 1)  # A cópia veio do cache
+
+    def test_low_start_with_gap(self):
+        # Começando em P1 e sem o P3, a marca do erro (P7) é também uma posição
+        # válida no bloco - só que de outro parágrafo
+        first = self._revise(self._block(1, gap=3))
+        copy = self._revise(self._block(500))
+
+        self.assertEqual([corr['paragraph'] for corr in first], [7])
+        self.assertEqual([corr['paragraph'] for corr in copy], [505])
+        self.assertEqual(self.client.calls, 1)
+
+    def test_copy_without_the_error_goes_to_api(self):
+        self._revise(self._block(100))
+        copy = self._revise(self._block(500, 'Ele vai com certeza chegar cedo hoje.'))
+
+        self.assertEqual(copy, [])
+        self.assertEqual(self.client.calls, 2)
+
+if __name__ == '__main__':
+    unittest.main()